@@ -1,139 +1,141 @@
 import streamlit as st
-import msal
-import requests
+import copy
+import jwt
 import os
 from urllib.parse import urlencode
 
-# Configuração do Azure AD
-class MSALConfig:
-    def __init__(self):
-        self.CLIENT_ID = st.secrets["oauth"]["client_id"]
-        self.CLIENT_SECRET = st.secrets["oauth"]["client_secret"]
-        self.TENANT_ID = st.secrets["oauth"]["tenant_id"]
-        self.AUTHORITY = f"https://login.microsoftonline.com/{self.TENANT_ID}"
-        self.REDIRECT_URI ="https://5015d77f4d00.ngrok-free.app"
-        self.SCOPE = ["User.Read", "Group.Read.All", "GroupMember.Read.All"]
+from audit_log import FAILURE, GRANT, LOGIN, PERMISSIONS, audit
+from auth_utils import ensure_group_directory, get_permissions, grant_temporary, logout
+from graph_cache import cached_call, get_session_cache
+from graph_async import fetch_parallel
+from graph_client import fetch_all_pages, make_graph_request, with_query
+from group_directory import get_group_directory
+from instrumentation import span, timed
+from member_browser import get_member_pages
+from msal_client import (
+    account_key,
+    acquire_token_by_code,
+    get_config,
+    get_home_account_id,
+    get_msal_app,
+    tenant_for_login,
+)
+from roles import get_role_index
+from session_store import destroy_session, flush_session_cookie, persist_session, restore_session
+from token_refresh import get_token_scheduler, sync_session_token
+from token_validation import (
+    groups_from_claims,
+    has_group_overage,
+    user_info_from_claims,
+    validate_id_token,
+)
 
-def init_msal_app():
-    config = MSALConfig()
-    return msal.ConfidentialClientApplication(
-        client_id=config.CLIENT_ID,
-        client_credential=config.CLIENT_SECRET,
-        authority=config.AUTHORITY
-    )
+def init_msal_app(tenant_id=None):
+    """Obter a aplicação MSAL do tenant, compartilhada pelo processo"""
+    return get_msal_app(tenant_id)
 
-def get_auth_url():
-    config = MSALConfig()
-    msal_app = init_msal_app()
+def get_auth_url(login_hint=None):
+    config = get_config()
+    tenant_id = tenant_for_login(login_hint)
+    msal_app = init_msal_app(tenant_id)
     
+    # O tenant volta no `state` para o código ser trocado pela aplicação do mesmo tenant
     auth_url = msal_app.get_authorization_request_url(
         scopes=config.SCOPE,
-        redirect_uri=config.REDIRECT_URI
+        redirect_uri=config.REDIRECT_URI,
+        state=tenant_id,
+        login_hint=login_hint or None
     )
     return auth_url
 
-def get_token_from_code(auth_code):
-    config = MSALConfig()
-    msal_app = init_msal_app()
-    
-    result = msal_app.acquire_token_by_authorization_code(
-        code=auth_code,
-        scopes=config.SCOPE,
-        redirect_uri=config.REDIRECT_URI
-    )
-    return result
+def get_token_from_code(auth_code, tenant_id=None):
+    return acquire_token_by_code(auth_code, tenant_id)
 
-def make_graph_request(access_token, endpoint):
-    """Fazer requisição para Microsoft Graph API com tratamento de erro"""
-    try:
-        headers = {'Authorization': f'Bearer {access_token}'}
-        response = requests.get(f'https://graph.microsoft.com/v1.0{endpoint}', headers=headers)
-        
-        if response.status_code == 200:
-            return response.json()
-        elif response.status_code == 403:
-            st.warning(f"⚠️ Permissão insuficiente para acessar: {endpoint}")
-            return None
-        else:
-            st.error(f"Erro na API: {response.status_code} - {response.text}")
-            return None
-    except Exception as e:
-        st.error(f"Erro ao fazer requisição: {str(e)}")
-        return None
+def cached_graph_request(access_token, endpoint, ttl=None):
+    """Requisição ao Graph memorizada no cache da sessão (reruns não voltam à rede)"""
+    return cached_call(endpoint, lambda: make_graph_request(access_token, endpoint), ttl)
+
+def cached_graph_collection(access_token, endpoint, top=None, select=None, ttl=None):
+    """Coleção completa do Graph (todas as páginas) memorizada no cache da sessão"""
+    key = with_query(endpoint, top=top, select=select)
+    return cached_call(key, lambda: fetch_all_pages(access_token, endpoint, top=top, select=select), ttl)
+
+# Tamanho de página usado nas listagens do Graph
+GRAPH_PAGE_SIZE = 999
+GROUPS_PAGE_SIZE = 100
+GROUP_FIELDS = ['id', 'displayName', 'description', 'groupTypes', 'mail']
 
 def get_user_info(access_token):
-    return make_graph_request(access_token, '/me')
+    return cached_graph_request(access_token, '/me')
 
 def get_user_groups(access_token):
     """Obter grupos do usuário atual"""
-    return make_graph_request(access_token, '/me/memberOf')
+    return cached_graph_collection(access_token, '/me/memberOf', top=GRAPH_PAGE_SIZE)
 
 def get_all_groups(access_token):
     """Obter todos os grupos do Azure AD"""
-    return make_graph_request(access_token, '/groups')
+    return cached_graph_collection(access_token, '/groups', top=GRAPH_PAGE_SIZE, select=GROUP_FIELDS)
+
+def get_groups_page(access_token, page_link=None):
+    """Obter uma página do diretório de grupos (page_link é o @odata.nextLink da anterior)"""
+    endpoint = page_link or with_query('/groups', top=GROUPS_PAGE_SIZE, select=GROUP_FIELDS)
+    return cached_graph_request(access_token, endpoint)
 
-def get_group_members(access_token, group_id):
-    """Obter membros de um grupo específico"""
-    return make_graph_request(access_token, f'/groups/{group_id}/members')
+def prefetch_first_render(access_token, claims=None):
+    """Buscar em paralelo /me, /me/memberOf e a primeira página de grupos
 
-def check_user_permissions(user_groups, user_info):
+    Apenas o que ainda não está no cache da sessão é buscado; falhas são
+    ignoradas aqui e tratadas depois pelo caminho síncrono, que exibe os erros.
+    Com claims válidas, /me e /me/memberOf (sem overage) não são necessários.
+    """
+    cache = get_session_cache()
+    endpoints = {}
+    if not claims:
+        endpoints['/me'] = '/me'
+    if not claims or has_group_overage(claims):
+        member_of = with_query('/me/memberOf', top=GRAPH_PAGE_SIZE)
+        endpoints[member_of] = member_of
+    if not get_group_directory(st.session_state.get("tenant_id")).is_ready():
+        first_groups_page = with_query('/groups', top=GROUPS_PAGE_SIZE, select=GROUP_FIELDS)
+        endpoints[first_groups_page] = first_groups_page
+    endpoints = {key: endpoint for key, endpoint in endpoints.items() if key not in cache}
+    if len(endpoints) < 2:
+        return
+    collections = {key for key in endpoints if key.startswith('/me/memberOf')}
+    for key, result in fetch_parallel(access_token, endpoints, collections).items():
+        if not isinstance(result, Exception):
+            cache.set(key, result)
+
+def claims_for_authorization():
+    """Claims validadas do ID token, se bastarem para autorizar sem o Graph
+
+    Grupos chegam nas claims apenas como IDs; se as regras de papéis só
+    reconhecem nomes de grupo (e não há app roles), é preciso usar o Graph.
+    """
+    claims = st.session_state.get("id_token_claims")
+    if not claims:
+        return None
+    if not (get_role_index().group_roles or claims.get('roles')):
+        return None
+    return claims
+
+@timed("app.check_user_permissions")
+def check_user_permissions(user_groups, user_info, app_roles=()):
     """Definir permissões baseadas nos grupos do usuário"""
-    permissions = {
-        'admin': False,
-        'manager': False,
-        'user': False,
-        'pages_access': []
-    }
-    
-    # Lista de emails de administradores (fallback)
-    admin_emails = [
-        "@outlook.com",  # Substitua pelo seu email real
-        "admin@example.com"
-    ]
+    role_index = get_role_index()
+    user_email = user_info.get('userPrincipalName', '').lower()
     
     # Verificar se é admin por email (fallback se não há grupos)
-    user_email = user_info.get('userPrincipalName', '').lower()
-    if user_email in [email.lower() for email in admin_emails]:
-        permissions['admin'] = True
-        permissions['pages_access'].extend(['dashboard', 'users', 'reports', 'settings'])
+    if role_index.role_for_email(user_email) == 'admin':
         st.info(f"🔴 Acesso de administrador concedido para: {user_email}")
     
-    # Verificar se user_groups é válido
-    if not user_groups or not user_groups.get('value'):
-        # Se não há grupos mas é admin por email, manter as permissões de admin
-        if not permissions['admin']:
-            permissions['user'] = True
-            permissions['pages_access'] = ['dashboard']
-        return permissions
-    
-    for group in user_groups.get('value', []):
-        # Verificar se o grupo tem displayName válido
-        display_name = group.get('displayName')
-        if not display_name:
-            continue
-            
-        group_name = display_name.lower()
-        
-        # Definir permissões baseadas no nome do grupo
-        if any(word in group_name for word in ['admin', 'administrador', 'administrator']):
-            permissions['admin'] = True
-            permissions['pages_access'].extend(['dashboard', 'users', 'reports', 'settings'])
-        elif any(word in group_name for word in ['manager', 'gerente', 'gestor']):
-            permissions['manager'] = True
-            permissions['pages_access'].extend(['dashboard', 'reports'])
-        elif any(word in group_name for word in ['user', 'usuario', 'usuário']):
-            permissions['user'] = True
-            permissions['pages_access'].extend(['dashboard'])
-    
-    # Se nenhuma permissão foi definida e não é admin por email, dar acesso básico
-    if not any([permissions['admin'], permissions['manager'], permissions['user']]):
-        permissions['user'] = True
-        permissions['pages_access'] = ['dashboard']
-    
-    # Remover duplicatas
-    permissions['pages_access'] = list(set(permissions['pages_access']))
-    
-    return permissions
+    groups = (user_groups.get('value') or []) if user_groups else []
+    # Papéis herdados de grupos que contêm os grupos do usuário (aninhamento)
+    directory = get_group_directory(st.session_state.get("tenant_id"))
+    inherited_roles = ()
+    if directory.is_ready():
+        inherited_roles = directory.membership.effective_roles(group.get('id') for group in groups)
+    return role_index.resolve(groups, user_email, app_roles, inherited_roles)
 
 # Interface Streamlit
 def main():
@@ -141,41 +143,98 @@ def main():
     
     st.title("🔐 Sistema de Login com Azure AD")
     
+    # Restaurar uma sessão salva (refresh, nova aba ou reinício) sem novo login
+    if not st.session_state.get("authenticated", False):
+        restore_session()
+    
     # Verificar se há código de autorização na URL
-    if "code" in st.query_params:
+    if "code" in st.query_params and not st.session_state.get("authenticated", False):
         auth_code = st.query_params["code"]
+        tenant_id = st.query_params.get("state") or get_config().TENANT_ID
+        if tenant_id not in get_config().TENANT_IDS:
+            audit(LOGIN, FAILURE, f"Tenant não configurado: {tenant_id}", user="anônimo", tenant=tenant_id)
+            st.query_params.clear()
+            st.error("❌ Organização não reconhecida. Faça login novamente.")
+            st.stop()
         
         with st.spinner("Autenticando..."):
-            token_result = get_token_from_code(auth_code)
+            token_result = get_token_from_code(auth_code, tenant_id)
             
             if "access_token" in token_result:
+                # Validar o ID token localmente; suas claims dispensam /me e /me/memberOf
+                try:
+                    st.session_state["id_token_claims"] = validate_id_token(token_result["id_token"], tenant_id)
+                except jwt.PyJWKClientError:
+                    # Chaves indisponíveis: seguir sem claims, consultando o Graph
+                    st.session_state["id_token_claims"] = None
+                except (jwt.InvalidTokenError, KeyError):
+                    st.error("❌ ID token inválido. Faça login novamente.")
+                    st.stop()
                 st.session_state["access_token"] = token_result["access_token"]
+                st.session_state["tenant_id"] = tenant_id
+                st.session_state["home_account_id"] = get_home_account_id(token_result)
+                st.session_state["account_id"] = account_key(tenant_id, st.session_state["home_account_id"])
+                # Agendar a renovação antes de expires_in
+                get_token_scheduler().track(st.session_state["account_id"], token_result)
                 st.session_state["authenticated"] = True
+                msal_claims = token_result.get("id_token_claims") or {}
+                audit(LOGIN, user=msal_claims.get("preferred_username") or st.session_state["home_account_id"])
+                # O código de autorização só pode ser usado uma vez
+                st.query_params.clear()
                 st.rerun()
+            else:
+                audit(LOGIN, FAILURE, token_result.get("error_description") or token_result.get("error"),
+                      user="anônimo", tenant=tenant_id)
     
     # Verificar se usuário já está autenticado
     if st.session_state.get("authenticated", False):
-        access_token = st.session_state.get("access_token")
+        # Token renovado em segundo plano antes de expirar (sem chamada ao Azure AD no rerun)
+        access_token = sync_session_token()
+        
+        # Diretório de grupos (papéis herdados por grupos aninhados) carregando antes de resolver os papéis
+        directory = ensure_group_directory(access_token)
         
-        # Obter informações do usuário
-        user_info = get_user_info(access_token)
+        # Primeira renderização: buscar os dados do Graph em paralelo
+        claims = claims_for_authorization()
+        prefetch_first_render(access_token, claims)
+        
+        # Obter informações do usuário (das claims do ID token, quando possível)
+        user_info = user_info_from_claims(claims) if claims else get_user_info(access_token)
         
         if not user_info:
             st.error("❌ Erro ao obter informações do usuário")
+            # Apagar também a sessão salva: senão o cookie a restaura e o erro se repete a cada rerun
+            destroy_session()
             st.session_state.clear()
             st.rerun()
             
-        user_groups = get_user_groups(access_token)
+        if claims and not has_group_overage(claims):
+            user_groups = groups_from_claims(claims, directory if directory.is_ready() else None)
+        else:
+            user_groups = get_user_groups(access_token)
         
         # user_groups pode ser None se não há permissão para ler grupos
         if user_groups is None:
             st.warning("⚠️ Não foi possível obter grupos do usuário. Aplicando permissões básicas.")
             user_groups = {'value': []}
         
-        # Verificar permissões do usuário
-        permissions = check_user_permissions(user_groups, user_info)
+        # Verificar permissões do usuário (recalculadas quando o cache expira ou o grafo de grupos muda)
+        app_roles = claims.get('roles', []) if claims else []
+        permissions_key = f"permissions:{directory.version}.{directory.membership.version}"
+        # Cópia: o dict em cache não pode ser alterado pela sessão
+        permissions = copy.deepcopy(
+            cached_call(permissions_key, lambda: check_user_permissions(user_groups, user_info, app_roles)))
+        roles_changed = st.session_state.get("permissions") != permissions
         st.session_state["permissions"] = permissions
         st.session_state["user_name"] = user_info.get("displayName", "Usuário")
+        st.session_state["user_email"] = user_info.get("userPrincipalName", "").lower()
+        if roles_changed:
+            granted = [role for role in get_role_index().roles if permissions.get(role)]
+            audit(PERMISSIONS, detail=", ".join(granted) or "nenhum papel")
+        persist_session()
+        flush_session_cookie()
+        # Exibição com a concessão temporária, que não é persistida
+        permissions = get_permissions()
             
             # Interface com abas
         tab1, tab2, tab3 = st.tabs(["👤 Perfil", "👥 Meus Grupos", "🏢 Gerenciar Grupos"])
@@ -212,6 +271,9 @@ def main():
                     st.json(permissions)
                     st.write(f"**Email do usuário:** {user_info.get('userPrincipalName', 'N/A')}")
                 
+                with st.expander("🔍 Debug - Cache do Graph"):
+                    st.json(get_session_cache().stats())
+                
                 # Páginas acessíveis
                 if permissions['pages_access']:
                     st.subheader("Páginas Acessíveis")
@@ -220,9 +282,8 @@ def main():
                 
                 # Botão para forçar permissão de admin (temporário)
                 if st.button("🔑 Conceder Acesso Admin (Temporário)"):
-                    st.session_state["permissions"]['admin'] = True
-                    st.session_state["permissions"]['pages_access'].extend(['dashboard', 'users', 'reports', 'settings'])
-                    st.session_state["permissions"]['pages_access'] = list(set(st.session_state["permissions"]['pages_access']))
+                    audit(GRANT, detail="admin (temporário, pelo próprio usuário)")
+                    grant_temporary(['admin'], ['dashboard', 'users', 'reports', 'settings'])
                     st.success("Permissões de admin concedidas!")
                     st.rerun()
             
@@ -252,61 +313,112 @@ def main():
                 st.subheader("Gerenciamento de Grupos")
                 
                 
-                    # Obter todos os grupos
-                all_groups = get_all_groups(access_token)
+                # Diretório de grupos compartilhado entre as sessões (atualizado em segundo plano);
+                # de novo aqui para a sessão admin emprestar seu token já nesta execução
+                directory = ensure_group_directory(access_token)
                 
-                if all_groups and all_groups.get('value'):
-                    st.write(f"**Total de grupos:** {len(all_groups['value'])}")
+                if directory.is_ready():
+                    # Busca e filtro no índice colunar do diretório; só a página visível é formatada
+                    from group_index import KIND_LABELS
+                    index = directory.index()
+                    col_search, col_kind = st.columns([3, 1])
+                    with col_search:
+                        group_search = st.text_input("🔍 Buscar grupo (nome, e-mail ou ID):", key="groups_search")
+                    with col_kind:
+                        kind_label = st.selectbox("Tipo", ("Todos",) + KIND_LABELS, key="groups_kind")
+                    kind = None if kind_label == "Todos" else KIND_LABELS.index(kind_label)
+                    if st.session_state.get("groups_query") != (group_search, kind):
+                        st.session_state["groups_query"] = (group_search, kind)
+                        st.session_state["groups_page"] = 0
+                    
+                    matches = index.search(group_search, kind)
+                    page_count = max(1, -(-len(matches) // GROUPS_PAGE_SIZE))
+                    page = min(st.session_state.get("groups_page", 0), page_count - 1)
+                    page_rows = matches[page * GROUPS_PAGE_SIZE:(page + 1) * GROUPS_PAGE_SIZE]
+                    groups = [{'id': index.ids[row], 'displayName': index.names[row]} for row in page_rows]
+                    st.write(f"**Grupos encontrados:** {len(matches)} de {len(index)} (página {page + 1} de {page_count})")
                     
+                    col_prev, col_next = st.columns(2)
+                    with col_prev:
+                        if st.button("⬅️ Página anterior", disabled=page == 0):
+                            st.session_state["groups_page"] = page - 1
+                            st.rerun()
+                    with col_next:
+                        if st.button("Próxima página ➡️", disabled=page >= page_count - 1):
+                            st.session_state["groups_page"] = page + 1
+                            st.rerun()
+                else:
+                    # Enquanto o diretório carrega, mostrar a primeira página direto do Graph
+                    groups_page = get_groups_page(access_token)
+                    groups = groups_page.get('value', []) if groups_page else []
+                    st.info("⏳ Carregando o diretório completo de grupos em segundo plano...")
+                
+                if groups:
                     # Seletor de grupo
                     group_names = [f"{group.get('displayName', 'Sem nome')} ({group.get('id')})" 
-                                    for group in all_groups['value']]
+                                    for group in groups]
                     
                     selected_group = st.selectbox("Selecione um grupo para ver os membros:", 
                                                 options=range(len(group_names)),
                                                 format_func=lambda x: group_names[x])
                         
+                    group_id = groups[selected_group].get('id')
+                    group_name = groups[selected_group].get('displayName')
                     if st.button("📋 Listar Membros"):
-                        group_id = all_groups['value'][selected_group].get('id')
-                        group_name = all_groups['value'][selected_group].get('displayName')
+                        st.session_state["members_group"] = group_id
+                    
+                    if st.session_state.get("members_group") == group_id:
+                        # Apenas a página visível é buscada no Graph e enviada ao navegador
+                        search = st.text_input("🔍 Buscar membro (nome ou email):", key="members_search")
+                        browser = get_member_pages(st.session_state, group_id, search)
+                        members_page = st.session_state.get("members_page", 0)
                         
                         with st.spinner(f"Carregando membros do grupo {group_name}..."):
-                            members = get_group_members(access_token, group_id)
+                            members_frame = browser.page(access_token, members_page)
+                        
+                        if members_frame is not None and len(members_frame):
+                            total = browser.total if browser.total is not None else "?"
+                            st.write(f"**Membros do grupo '{group_name}':** {total} "
+                                     f"(página {members_page + 1} de {browser.page_count})")
+                            
+                            with span("app.render.members"):
+                                st.dataframe(members_frame, use_container_width=True, hide_index=True)
                             
-                            if members and members.get('value'):
-                                st.write(f"**Membros do grupo '{group_name}':**")
-                                
-                                # Tabela de membros
-                                member_data = []
-                                for member in members['value']:
-                                    member_data.append({
-                                        'Nome': member.get('displayName', 'N/A'),
-                                        'Email': member.get('userPrincipalName', 'N/A'),
-                                        'Tipo': member.get('@odata.type', 'N/A').replace('#microsoft.graph.', '')
-                                    })
-                                
-                                st.dataframe(member_data, use_container_width=True)
-                            else:
-                                st.info("Este grupo não possui membros ou você não tem permissão para visualizá-los.")
-                    else:
-                        st.warning("Não foi possível carregar os grupos.")
+                            col_prev, col_next = st.columns(2)
+                            with col_prev:
+                                if st.button("⬅️ Membros anteriores", disabled=members_page == 0):
+                                    st.session_state["members_page"] = members_page - 1
+                                    st.rerun()
+                            with col_next:
+                                if st.button("Próximos membros ➡️", disabled=not browser.has_next(members_page)):
+                                    st.session_state["members_page"] = members_page + 1
+                                    st.rerun()
+                        elif search:
+                            st.info("Nenhum membro encontrado para a busca.")
+                        else:
+                            st.info("Este grupo não possui membros ou você não tem permissão para visualizá-los.")
                 else:
                     st.warning("⚠️ Acesso restrito: Apenas administradores podem visualizar esta seção.")
             
             # Botão de logout
         st.divider()
         if st.button("🚪 Logout", type="secondary"):
-                st.session_state.clear()
-                st.rerun()
+                logout()
     
     else:
         # Tela de login
         st.write("### Faça login com sua conta Microsoft")
         st.write("Clique no botão abaixo para se autenticar:")
         
+        # Com vários tenants, o domínio do e-mail indica em qual deles entrar
+        login_hint = None
+        if get_config().TENANTS:
+            login_hint = st.text_input("E-mail corporativo:", key="login_hint").strip()
+        
         if st.button("🔑 Entrar com Azure AD", type="primary"):
-            auth_url = get_auth_url()
+            auth_url = get_auth_url(login_hint)
             st.link_button("🔑 Clique aqui para fazer login", auth_url)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    with span("app.rerun"):
+        main()
\ No newline at end of file
@@ -0,0 +1,351 @@
+import atexit
+import csv
+import datetime
+import io
+import os
+import queue
+import re
+import sqlite3
+import threading
+import time
+
+import streamlit as st
+
+from instrumentation import register_collector
+
+# Ações registradas (coluna "Ação" da aba de logs)
+LOGIN = "Login"
+LOGOUT = "Logout"
+PERMISSIONS = "Permissões definidas"
+GRANT = "Concessão de permissão"
+ACCESS_DENIED = "Acesso negado"
+ADMIN_ACTION = "Ação administrativa"
+ACTIONS = (LOGIN, LOGOUT, PERMISSIONS, GRANT, ACCESS_DENIED, ADMIN_ACTION)
+
+SUCCESS = "Sucesso"
+FAILURE = "Falha"
+DENIED = "Negado"
+
+# Eventos por gravação, espera máxima (segundos) para completar um lote e tamanho da fila
+BATCH_SIZE = 500
+FLUSH_INTERVAL = 1.0
+MAX_QUEUE = 10000
+# Um arquivo SQLite por mês (UTC); os mais antigos que a retenção são apagados
+RETENTION_MONTHS = 12
+SEGMENT_PATTERN = re.compile(r'^audit-(\d{4}-\d{2})\.sqlite3$')
+# Linhas lidas por vez ao exportar
+EXPORT_CHUNK = 1000
+
+COLUMNS = ('ts', 'user', 'action', 'status', 'detail', 'tenant')
+CSV_HEADER = ('Timestamp', 'Usuário', 'Ação', 'Status', 'Detalhe')
+
+_STOP = object()
+
+
+class AuditConfig:
+    """Configuração do log de auditoria (seção [audit] opcional em secrets.toml)"""
+
+    def __init__(self):
+        try:
+            settings = st.secrets.get("audit", {})
+        except FileNotFoundError:
+            settings = {}
+        self.ENABLED = bool(settings.get("enabled", True))
+        self.DIRECTORY = settings.get("directory", os.path.join(".streamlit", "audit"))
+        self.RETENTION_MONTHS = int(settings.get("retention_months", RETENTION_MONTHS))
+        self.BATCH_SIZE = int(settings.get("batch_size", BATCH_SIZE))
+        self.FLUSH_INTERVAL = float(settings.get("flush_interval", FLUSH_INTERVAL))
+        self.MAX_QUEUE = int(settings.get("max_queue", MAX_QUEUE))
+
+
+def segment_of(ts):
+    return time.strftime('%Y-%m', time.gmtime(ts))
+
+
+def date_window(first_day, last_day):
+    """Intervalo [início, fim) em epoch cobrindo os dias (datas locais) de first_day a last_day"""
+    start = time.mktime(first_day.timetuple())
+    end = time.mktime((last_day + datetime.timedelta(days=1)).timetuple())
+    return start, end
+
+
+class AuditStore:
+    """Eventos de auditoria em arquivos SQLite mensais, apenas com inserções
+
+    Cada mês (UTC) tem seu arquivo `audit-AAAA-MM.sqlite3`, com índice pelo
+    horário; consultas por intervalo abrem só os meses envolvidos. Gatilhos
+    impedem UPDATE e DELETE nas linhas: a única remoção é a de arquivos
+    inteiros além de `retention_months`. Cada evento guarda o tenant da
+    sessão; consultas e exportações com `tenant` só enxergam os dele.
+    """
+
+    def __init__(self, directory, retention_months=RETENTION_MONTHS):
+        self.directory = directory
+        self.retention_months = retention_months
+        os.makedirs(directory, exist_ok=True)
+        self._writer = None
+        self._writer_segment = None
+
+    def path(self, segment):
+        return os.path.join(self.directory, f'audit-{segment}.sqlite3')
+
+    def segments(self):
+        """Meses com arquivo no diretório, do mais antigo ao mais recente"""
+        found = []
+        for name in os.listdir(self.directory):
+            match = SEGMENT_PATTERN.match(name)
+            if match:
+                found.append(match.group(1))
+        return sorted(found)
+
+    def _open_writer(self, segment):
+        if self._writer_segment == segment:
+            return self._writer
+        if self._writer is not None:
+            self._writer.close()
+        path = self.path(segment)
+        created = not os.path.exists(path)
+        conn = sqlite3.connect(path, timeout=5, check_same_thread=False)
+        with conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS events ("
+                " id INTEGER PRIMARY KEY, ts REAL NOT NULL, user TEXT, action TEXT NOT NULL,"
+                " status TEXT, detail TEXT, tenant TEXT)"
+            )
+            if not self._has_tenant(conn):
+                # Arquivo de antes da coluna tenant: os eventos antigos ficam sem tenant
+                conn.execute("ALTER TABLE events ADD COLUMN tenant TEXT")
+            conn.execute("CREATE INDEX IF NOT EXISTS events_ts ON events (ts)")
+            conn.execute(
+                "CREATE TRIGGER IF NOT EXISTS events_no_update BEFORE UPDATE ON events"
+                " BEGIN SELECT RAISE(ABORT, 'log de auditoria é somente inserção'); END"
+            )
+            conn.execute(
+                "CREATE TRIGGER IF NOT EXISTS events_no_delete BEFORE DELETE ON events"
+                " BEGIN SELECT RAISE(ABORT, 'log de auditoria é somente inserção'); END"
+            )
+        if created:
+            # Os eventos trazem e-mails de usuários: restringir ao usuário do processo
+            os.chmod(path, 0o600)
+            self._prune()
+        self._writer, self._writer_segment = conn, segment
+        return conn
+
+    @staticmethod
+    def _has_tenant(conn):
+        return any(column[1] == 'tenant' for column in conn.execute("PRAGMA table_info(events)"))
+
+    def _prune(self):
+        for segment in self.segments()[:-max(1, self.retention_months)]:
+            for suffix in ('', '-wal', '-shm'):
+                try:
+                    os.remove(self.path(segment) + suffix)
+                except FileNotFoundError:
+                    pass
+
+    def append(self, events):
+        """Gravar um lote de eventos (tuplas na ordem de COLUMNS), uma transação por mês"""
+        by_segment = {}
+        for event in events:
+            by_segment.setdefault(segment_of(event[0]), []).append(event)
+        for segment, rows in sorted(by_segment.items()):
+            conn = self._open_writer(segment)
+            with conn:
+                conn.executemany(
+                    "INSERT INTO events (ts, user, action, status, detail, tenant) VALUES (?, ?, ?, ?, ?, ?)",
+                    rows)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer, self._writer_segment = None, None
+
+    def _segments_between(self, start, end):
+        first, last = segment_of(start), segment_of(end)
+        return [segment for segment in self.segments() if first <= segment <= last]
+
+    def _select(self, segment, start, end, user=None, actions=None, tenant=None, order='DESC', limit=None):
+        # Leitura por conexão própria, somente leitura: não disputa o lock do gravador
+        conn = sqlite3.connect(f'file:{self.path(segment)}?mode=ro', uri=True, timeout=5)
+        sql = "SELECT ts, user, action, status, detail FROM events WHERE ts >= ? AND ts < ?"
+        params = [start, end]
+        if tenant is not None:
+            if self._has_tenant(conn):
+                sql += " AND tenant = ?"
+                params.append(tenant)
+            else:
+                # Mês anterior à coluna tenant (ainda não migrado): nenhum evento é do tenant
+                sql += " AND 0"
+        if user:
+            sql += " AND user LIKE ?"
+            params.append(f'%{user}%')
+        if actions:
+            sql += f" AND action IN ({', '.join('?' for _ in actions)})"
+            params.extend(actions)
+        sql += f" ORDER BY ts {order}"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return conn, conn.execute(sql, params)
+
+    def query(self, start, end, user=None, actions=None, limit=1000, tenant=None):
+        """Eventos em [start, end) (epoch), do mais recente ao mais antigo"""
+        rows = []
+        for segment in reversed(self._segments_between(start, end)):
+            conn, cursor = self._select(segment, start, end, user, actions, tenant, limit=limit - len(rows))
+            try:
+                rows.extend(cursor.fetchall())
+            finally:
+                conn.close()
+            if len(rows) >= limit:
+                break
+        return rows
+
+    def iter_rows(self, start, end, user=None, actions=None, tenant=None, chunk_size=EXPORT_CHUNK):
+        """Eventos em [start, end) em ordem cronológica, lidos em blocos de `chunk_size`"""
+        for segment in self._segments_between(start, end):
+            conn, cursor = self._select(segment, start, end, user, actions, tenant, order='ASC')
+            try:
+                while True:
+                    chunk = cursor.fetchmany(chunk_size)
+                    if not chunk:
+                        break
+                    yield chunk
+            finally:
+                conn.close()
+
+    def iter_csv(self, start, end, user=None, actions=None, tenant=None, chunk_size=EXPORT_CHUNK):
+        """CSV dos eventos em pedaços de texto (cabeçalho e um pedaço por bloco de linhas)"""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(CSV_HEADER)
+        for chunk in self.iter_rows(start, end, user, actions, tenant, chunk_size):
+            for ts, user_name, action, status, detail in chunk:
+                timestamp = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(ts))
+                writer.writerow((timestamp, user_name, action, status, detail))
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue()
+
+
+class AuditLog:
+    """Fila de eventos de auditoria gravados em lotes por uma thread de fundo
+
+    `record` apenas enfileira (sem I/O no rerun); a thread agrupa até
+    `batch_size` eventos ou `flush_interval` segundos e grava o lote no
+    AuditStore. Com a fila cheia, o evento é descartado e contado.
+    """
+
+    def __init__(self, store, batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL, max_queue=MAX_QUEUE):
+        self.store = store
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._counters = {'recorded': 0, 'written': 0, 'dropped': 0, 'batches': 0, 'errors': 0}
+        self.last_error = None
+        self._thread = threading.Thread(target=self._run, name="audit-log", daemon=True)
+        self._thread.start()
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._counters[name] += amount
+
+    def record(self, action, user=None, status=SUCCESS, detail=None, ts=None, tenant=None):
+        try:
+            self._queue.put_nowait((ts or time.time(), user, action, status, detail, tenant))
+        except queue.Full:
+            self._count('dropped')
+            return False
+        self._count('recorded')
+        return True
+
+    def _next_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size and batch[-1] is not _STOP:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            events = [event for event in batch if event is not _STOP]
+            try:
+                if events:
+                    self.store.append(events)
+                    self._count('written', len(events))
+                    self._count('batches')
+            except sqlite3.Error as error:
+                # Lote perdido: registrar o erro sem derrubar a thread
+                self._count('errors')
+                self.last_error = str(error)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+            if len(events) < len(batch):
+                self.store.close()
+                return
+
+    def flush(self, timeout=5.0):
+        """Aguardar a gravação dos eventos já enfileirados (ex.: antes de exportar)"""
+        condition = self._queue.all_tasks_done
+        with condition:
+            return condition.wait_for(lambda: not self._queue.unfinished_tasks, timeout)
+
+    def close(self, timeout=5.0):
+        if self._thread.is_alive():
+            try:
+                self._queue.put(_STOP, timeout=timeout)
+            except queue.Full:
+                return
+            self._thread.join(timeout)
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self._counters)
+        counters['queued'] = self._queue.qsize()
+        return counters
+
+
+_audit_lock = threading.Lock()
+_audit_log = None
+_audit_loaded = False
+
+
+def get_audit_log():
+    """Obter o log de auditoria do processo, ou None se estiver desativado"""
+    global _audit_log, _audit_loaded
+    if not _audit_loaded:
+        with _audit_lock:
+            if not _audit_loaded:
+                config = AuditConfig()
+                if config.ENABLED:
+                    store = AuditStore(config.DIRECTORY, config.RETENTION_MONTHS)
+                    _audit_log = AuditLog(store, config.BATCH_SIZE, config.FLUSH_INTERVAL, config.MAX_QUEUE)
+                    register_collector('audit_log', _audit_log.stats)
+                    # Gravar o que ainda estiver na fila quando o processo terminar
+                    atexit.register(_audit_log.close)
+                _audit_loaded = True
+    return _audit_log
+
+
+def audit(action, status=SUCCESS, detail=None, user=None, tenant=None):
+    """Registrar um evento da sessão atual (usuário e tenant da sessão, se não informados)"""
+    audit_log = get_audit_log()
+    if audit_log is None:
+        return
+    if user is None:
+        user = st.session_state.get("user_email") or st.session_state.get("user_name") or "anônimo"
+    if tenant is None:
+        tenant = st.session_state.get("tenant_id")
+    audit_log.record(action, user, status, detail, tenant=tenant)
@@ -1,19 +1,73 @@
 import streamlit as st
 
+from audit_log import ACCESS_DENIED, DENIED, LOGOUT, audit
+from graph_cache import invalidate_session_cache
+from group_directory import get_group_directory
+from msal_client import remove_account
+from session_store import destroy_session, restore_session
+from token_refresh import get_token_scheduler, sync_session_token
+
+def logout():
+    """Encerrar a sessão, removendo também os tokens do cache do processo"""
+    audit(LOGOUT)
+    get_group_directory(st.session_state.get("tenant_id")).forget_token(st.session_state.get("account_id"))
+    get_token_scheduler().forget(st.session_state.get("account_id"))
+    remove_account(st.session_state.get("account_id"))
+    invalidate_session_cache()
+    destroy_session()
+    st.session_state.clear()
+    st.rerun()
+
 def require_auth():
-    """Verificar se o usuário está autenticado"""
-    if not st.session_state.get("authenticated", False):
+    """Verificar se o usuário está autenticado (restaurando a sessão salva, se houver)"""
+    if not st.session_state.get("authenticated", False) and not restore_session():
+        audit(ACCESS_DENIED, DENIED, "Sessão não autenticada")
         st.error("🔒 Acesso negado. Faça login primeiro.")
         st.stop()
+    # Usar o token já renovado em segundo plano, se houver
+    sync_session_token()
+
+# Concessão temporária feita na própria sessão: aplicada sobre as permissões calculadas, nunca persistida
+OVERRIDE_KEY = "permissions_override"
+
+def grant_temporary(roles, pages):
+    """Conceder papéis e páginas até o fim da sessão, sem alterar as permissões calculadas"""
+    st.session_state[OVERRIDE_KEY] = {'roles': list(roles), 'pages_access': list(pages)}
+
+def get_permissions():
+    """Permissões da sessão, com a concessão temporária (se houver) aplicada por cima"""
+    permissions = st.session_state.get("permissions") or {}
+    override = st.session_state.get(OVERRIDE_KEY)
+    if not override:
+        return permissions
+    merged = dict(permissions)
+    merged.update({role: True for role in override['roles']})
+    merged['pages_access'] = list(dict.fromkeys([*permissions.get('pages_access', []), *override['pages_access']]))
+    return merged
+
+def ensure_group_directory(access_token):
+    """Diretório de grupos do tenant da sessão, com a carga inicial e o refresher de fundo ativos
+
+    O token delegado só é emprestado à sincronização de fundo por sessões
+    com papel admin calculado (não pela concessão temporária); as demais
+    dependem do token de aplicação.
+    """
+    directory = get_group_directory(st.session_state.get("tenant_id"))
+    if (st.session_state.get("permissions") or {}).get("admin"):
+        directory.ensure_loaded(access_token, st.session_state.get("account_id"))
+    else:
+        directory.ensure_loaded()
+    return directory
 
 def require_permission(required_page):
     """Verificar se o usuário tem permissão para acessar a página"""
     require_auth()
     
-    permissions = st.session_state.get("permissions", {})
+    permissions = get_permissions()
     pages_access = permissions.get("pages_access", [])
     
     if required_page not in pages_access:
+        audit(ACCESS_DENIED, DENIED, f"Página '{required_page}'")
         st.error(f"⚠️ Acesso negado. Você não tem permissão para acessar a página '{required_page}'.")
         st.info("Páginas disponíveis para você:")
         for page in pages_access:
@@ -24,8 +78,9 @@ def require_admin():
     """Verificar se o usuário é administrador"""
     require_auth()
     
-    permissions = st.session_state.get("permissions", {})
+    permissions = get_permissions()
     if not permissions.get("admin", False):
+        audit(ACCESS_DENIED, DENIED, "Requer papel admin")
         st.error("🔴 Acesso restrito: Apenas administradores podem acessar esta página.")
         st.stop()
 
@@ -33,14 +88,15 @@ def require_manager_or_admin():
     """Verificar se o usuário é gerente ou administrador"""
     require_auth()
     
-    permissions = st.session_state.get("permissions", {})
+    permissions = get_permissions()
     if not (permissions.get("admin", False) or permissions.get("manager", False)):
+        audit(ACCESS_DENIED, DENIED, "Requer papel manager ou admin")
         st.error("🟡 Acesso restrito: Apenas gerentes ou administradores podem acessar esta página.")
         st.stop()
 
 def get_user_role():
     """Obter o papel do usuário"""
-    permissions = st.session_state.get("permissions", {})
+    permissions = get_permissions()
     
     if permissions.get("admin", False):
         return "admin"
@@ -61,5 +117,4 @@ def show_user_info():
         st.sidebar.info(f"🏷️ Papel: {user_role.title()}")
         
         if st.sidebar.button("🚪 Logout"):
-            st.session_state.clear()
-            st.rerun()
\ No newline at end of file
+            logout()
\ No newline at end of file
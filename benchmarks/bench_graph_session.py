@@ -0,0 +1,71 @@
+"""Compara requests.get sem pool com a sessão HTTP compartilhada de graph_client
+
+Uso (a partir da raiz do projeto):
+    python benchmarks/bench_graph_session.py [--requests 2000] [--threads 8]
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import graph_client
+from stub_graph import StubGraphServer
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def bare_request(base_url):
+    # Caminho antigo: nova conexão TCP a cada chamada e sem timeout
+    response = requests.get(f"{base_url}/me", headers={"Authorization": "Bearer stub"})
+    return response.json()
+
+
+def pooled_request(base_url):
+    return graph_client.make_graph_request("stub", "/me")
+
+
+def run(label, func, base_url, total, threads):
+    latencies = []
+
+    def timed(_):
+        start = time.perf_counter()
+        func(base_url)
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(timed, range(total)))
+    elapsed = time.perf_counter() - start
+
+    print(f"{label:<22} {total / elapsed:>10.0f} req/s"
+          f"   p50 {percentile(latencies, 50) * 1000:7.2f} ms"
+          f"   p99 {percentile(latencies, 99) * 1000:7.2f} ms"
+          f"   média {statistics.mean(latencies) * 1000:7.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="latência simulada do servidor, em segundos")
+    args = parser.parse_args()
+
+    with StubGraphServer(latency=args.latency) as server:
+        graph_client.get_graph_config().BASE_URL = server.url
+        print(f"Stub Graph em {server.url} - {args.requests} requisições, {args.threads} threads")
+        run("requests.get (atual)", bare_request, server.url, args.requests, args.threads)
+        run("sessão compartilhada", pooled_request, server.url, args.requests, args.threads)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""Mede o GroupGraph (papéis herdados por grupos aninhados) contra uma busca em largura por consulta
+
+Cenários: DAG aleatório, cadeias profundas e ciclos. Para cada um, mede a
+montagem completa, uma atualização incremental (delta com poucas arestas) e
+a consulta dos papéis de um usuário, conferindo o resultado com a BFS.
+
+Uso (a partir da raiz do projeto):
+    python benchmarks/bench_group_graph.py [--groups 50000] [--queries 2000]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from collections import deque
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from group_graph import GroupGraph
+
+ROLES = ('admin', 'editor', 'viewer')
+
+
+def random_dag(count, rng, max_parents=3):
+    # Pais sempre com ID menor: sem ciclos
+    return [(f'g{child}', f'g{rng.randrange(child)}')
+            for child in range(1, count) for _ in range(rng.randint(1, max_parents))]
+
+
+def chains(count, rng, length=500):
+    return [(f'g{i}', f'g{i - 1}') for i in range(1, count) if i % length]
+
+
+def with_cycles(count, rng):
+    edges = random_dag(count, rng, max_parents=2)
+    # Arestas "para trás" fecham ciclos de vários tamanhos
+    edges += [(f'g{rng.randrange(count // 2)}', f'g{rng.randrange(count // 2, count)}')
+              for _ in range(count // 50)]
+    return edges
+
+
+def own_masks(count, rng, graph):
+    # Poucos grupos concedem papéis diretamente, como nos diretórios reais
+    return {f'g{i}': graph.role_bit(rng.choice(ROLES)) for i in rng.sample(range(count), count // 500 or 1)}
+
+
+def naive_roles(parents, own, group_ids):
+    """Caminho sem cache: BFS pelos pais de cada grupo do usuário a cada consulta"""
+    seen, queue, mask = set(group_ids), deque(group_ids), 0
+    while queue:
+        group_id = queue.popleft()
+        mask |= own.get(group_id, 0)
+        for parent in parents.get(group_id, ()):
+            if parent not in seen:
+                seen.add(parent)
+                queue.append(parent)
+    return mask
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return result, (time.perf_counter() - start) * 1000
+
+
+def run(label, count, edges, rng, queries):
+    graph = GroupGraph(ROLES)
+    own = own_masks(count, rng, graph)
+    _, build_ms = timed(lambda: graph.update(added=edges, own_masks=own))
+
+    # Delta típico: algumas arestas novas, algumas removidas e um papel alterado
+    removed = rng.sample(edges, 5)
+    added = [(f'g{rng.randrange(count)}', f'g{rng.randrange(count)}') for _ in range(5)]
+    changed = {f'g{rng.randrange(count)}': graph.role_bit('admin')}
+    affected, delta_ms = timed(lambda: graph.update(added, removed, changed))
+    edges = [edge for edge in edges if edge not in set(removed)] + added
+    own.update(changed)
+
+    parents = {}
+    for child, parent in edges:
+        if child != parent:
+            parents.setdefault(child, set()).add(parent)
+    users = [[f'g{rng.randrange(count)}' for _ in range(rng.randint(1, 20))] for _ in range(queries)]
+    expected, naive_ms = timed(lambda: [naive_roles(parents, own, groups) for groups in users])
+    got, graph_ms = timed(lambda: [graph.mask_for(groups) for groups in users])
+    status = "ok" if got == expected else "DIVERGENTE"
+
+    print(f"{label:<14} montagem {build_ms:7.0f} ms   delta {delta_ms:7.2f} ms ({affected} grupos)"
+          f"   consulta BFS {naive_ms / queries * 1000:8.1f} µs   grafo {graph_ms / queries * 1000:6.1f} µs"
+          f"   [{status}]")
+    return got == expected
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--groups", type=int, default=50000)
+    parser.add_argument("--queries", type=int, default=2000)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    ok = all([
+        run("DAG aleatório", args.groups, random_dag(args.groups, rng), rng, args.queries),
+        run("cadeias", args.groups, chains(args.groups, rng), rng, args.queries),
+        run("ciclos", args.groups, with_cycles(args.groups, rng), rng, args.queries),
+    ])
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""Mede a montagem e as buscas do GroupIndex contra a lista de grupos formatada a cada rerun
+
+Uso (a partir da raiz do projeto):
+    python benchmarks/bench_group_index.py [--groups 50000] [--repeat 200]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from group_index import GroupIndex
+
+WORDS = ['financeiro', 'vendas', 'ti', 'rh', 'marketing', 'juridico', 'compras', 'logistica',
+         'suporte', 'projetos', 'diretoria', 'operacoes', 'qualidade', 'engenharia']
+
+
+def make_directory(count, seed=42):
+    rng = random.Random(seed)
+    groups = []
+    for i in range(count):
+        name = f"{rng.choice(WORDS).title()} {rng.choice(WORDS).title()} {i}"
+        groups.append({
+            'id': f'{i:08x}-0000-4000-8000-{rng.getrandbits(48):012x}',
+            'displayName': name,
+            'mail': f"{name.lower().replace(' ', '.')}@example.com" if i % 3 else None,
+            'description': None,
+            'groupTypes': ['Unified'] if i % 4 == 0 else []
+        })
+    return groups
+
+
+def per_call(func, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--groups", type=int, default=50000)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    groups = make_directory(args.groups)
+
+    # Caminho antigo: rótulos de todos os grupos a cada rerun e filtro em Python
+    def naive(term):
+        labels = [f"{g.get('displayName', 'Sem nome')} ({g.get('id')})" for g in groups]
+        return [label for label in labels if term in label.lower()]
+
+    start = time.perf_counter()
+    index = GroupIndex(groups)
+    build = (time.perf_counter() - start) * 1000
+
+    print(f"{args.groups} grupos; montagem do índice (uma vez por snapshot): {build:.0f} ms")
+    queries = [("prefixo", "vendas ti"), ("trecho raro", "s 4242"), ("duas letras", "rh"),
+               ("e-mail", "@example.com"), ("sem busca", "")]
+    for label, term in queries:
+        naive_ms = per_call(lambda: naive(term), max(1, args.repeat // 50))
+        # Primeira busca (sem memorização) e rerun com a mesma busca
+        index._searches.clear()
+        first_ms = per_call(lambda: (index._searches.clear(), index.search(term)), args.repeat)
+        memo_ms = per_call(lambda: index.search(term), args.repeat)
+        page_ms = per_call(lambda: index.labels(index.search(term)[:100]), args.repeat)
+        print(f"{label:<13} {len(index.search(term)):6d} grupos   lista formatada {naive_ms:8.2f} ms"
+              f"   índice {first_ms:7.3f} ms   memorizada {memo_ms:6.3f} ms   página+rótulos {page_ms:6.3f} ms")
+
+    kind_ms = per_call(lambda: (index._searches.clear(), index.search("vendas", kind=1)), args.repeat)
+    print(f"filtro por tipo (Microsoft 365) + busca: {kind_ms:.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""Compara a busca sequencial de membros com get_members_bulk (/$batch + threads)
+
+Uso (a partir da raiz do projeto):
+    python benchmarks/bench_members_batch.py [--groups 400] [--latency 0.02]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import graph_client
+from stub_graph import StubGraphServer, default_routes, make_users, paged_collection
+
+MEMBER_FIELDS = ['id', 'displayName', 'userPrincipalName']
+
+
+def failing_members(every):
+    """Rota de membros em que um a cada `every` grupos responde 404"""
+    members = paged_collection(make_users(30))
+
+    def handler(request, path, query):
+        group_id = path.split("/")[2]
+        if int(group_id.split("-")[1]) % every == 0:
+            return 404, {"error": {"code": "Request_ResourceNotFound",
+                                   "message": f"Group {group_id} not found"}}
+        return members(request, path, query)
+    return handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--groups", type=int, default=400)
+    parser.add_argument("--latency", type=float, default=0.02,
+                        help="latência simulada por requisição, em segundos")
+    parser.add_argument("--workers", type=int, default=graph_client.BATCH_WORKERS)
+    parser.add_argument("--fail-every", type=int, default=50,
+                        help="simular falha (404) em um a cada N grupos")
+    args = parser.parse_args()
+
+    routes = default_routes()
+    routes["/groups/{id}/members"] = failing_members(args.fail_every)
+    group_ids = [f"group-{i}" for i in range(args.groups)]
+
+    with StubGraphServer(routes=routes, latency=args.latency) as server:
+        graph_client.get_graph_config().BASE_URL = server.url
+
+        start = time.perf_counter()
+        sequential_ok = 0
+        for group_id in group_ids:
+            if graph_client.fetch_all_pages("stub", f"/groups/{group_id}/members",
+                                            top=999, select=MEMBER_FIELDS):
+                sequential_ok += 1
+        sequential = time.perf_counter() - start
+        sequential_calls = sum(server.request_counts.values())
+        server.request_counts.clear()
+
+        start = time.perf_counter()
+        members, errors = graph_client.get_members_bulk(
+            "stub", group_ids, select=MEMBER_FIELDS, max_workers=args.workers)
+        bulk = time.perf_counter() - start
+        bulk_calls = sum(server.request_counts.values())
+
+    print(f"{args.groups} grupos, latência simulada {args.latency * 1000:.0f} ms")
+    print(f"sequencial        {sequential:7.2f} s   {sequential_calls:5d} chamadas   {sequential_ok} grupos ok")
+    print(f"$batch + threads  {bulk:7.2f} s   {bulk_calls:5d} chamadas   "
+          f"{len(members)} grupos ok, {len(errors)} falhas por item")
+    print(f"ganho: {sequential / bulk:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""Mede o ReportEngine (rollups pré-calculados) contra agregar as linhas brutas a cada rerun
+
+Gera arquivos Parquet sintéticos de vendas, mede a montagem inicial dos
+rollups, a atualização incremental quando um arquivo novo chega e os
+relatórios por papel (admin vê tudo; gerente, dois departamentos), com e
+sem memorização, conferindo os totais com o pandas sobre as linhas brutas.
+
+Uso (a partir da raiz do projeto):
+    python benchmarks/bench_reports.py [--rows 5000000] [--files 10] [--repeat 50]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from report_engine import ALL_DEPARTMENTS, ReportEngine
+
+PRODUCTS = [f'Produto {chr(65 + i)}' for i in range(20)]
+DEPARTMENTS = ['Vendas', 'Marketing', 'TI', 'RH', 'Financeiro', 'Operações', 'Logística', 'Jurídico']
+MANAGER_SCOPE = ('Marketing', 'Vendas')
+
+
+def write_sales(path, rows, seed):
+    rng = np.random.default_rng(seed)
+    start = np.datetime64('2024-01-01')
+    table = pa.table({
+        'date': pa.array(start + rng.integers(0, 730, rows).astype('timedelta64[D]'), pa.date32()),
+        'product': pa.array(np.array(PRODUCTS)[rng.integers(0, len(PRODUCTS), rows)]).dictionary_encode(),
+        'department': pa.array(np.array(DEPARTMENTS)[rng.integers(0, len(DEPARTMENTS), rows)]).dictionary_encode(),
+        'amount': rng.uniform(10, 5000, rows).round(2),
+        'profit': rng.uniform(1, 1000, rows).round(2),
+        'quantity': rng.integers(1, 20, rows),
+    })
+    pq.write_table(table, path, row_group_size=256 * 1024)
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return result, (time.perf_counter() - start) * 1000
+
+
+def per_call(func, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=5000000)
+    parser.add_argument("--files", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        per_file = args.rows // args.files
+        for index in range(args.files):
+            write_sales(os.path.join(directory, f'vendas-{index:03d}.parquet'), per_file, index)
+
+        engine = ReportEngine(directory)
+        _, build_ms = timed(engine.refresh)
+        print(f"{per_file * args.files} linhas em {args.files} arquivos; rollup inicial {build_ms:.0f} ms"
+              f" ({engine.stats()['rollup_rows']} linhas de rollup)")
+
+        write_sales(os.path.join(directory, 'vendas-novo.parquet'), per_file, 999)
+        _, delta_ms = timed(engine.refresh)
+        print(f"arquivo novo ({per_file} linhas): atualização incremental {delta_ms:.0f} ms")
+
+        # Caminho sem rollup: ler as linhas e agregar a cada rerun
+        raw, read_ms = timed(lambda: pd.read_parquet(directory))
+        raw['department'] = raw['department'].astype(str)
+        raw['product'] = raw['product'].astype(str)
+
+        def naive(scope):
+            rows = raw if scope is ALL_DEPARTMENTS else raw[raw['department'].isin(scope)]
+            return rows.groupby('product')[['amount', 'profit', 'quantity']].sum()
+
+        print(f"leitura das linhas brutas: {read_ms:.0f} ms (não incluída abaixo)")
+        for label, scope in (("admin", ALL_DEPARTMENTS), ("gerente", MANAGER_SCOPE)):
+            naive_ms = per_call(lambda: naive(scope), max(1, args.repeat // 10))
+            first_ms = per_call(lambda: (engine._results.clear(), engine.report('by_product', scope)), args.repeat)
+            cached_ms = per_call(lambda: engine.report('by_product', scope), args.repeat)
+            dashboard_ms = per_call(lambda: (engine.report('totals', scope), engine.report('monthly', scope)),
+                                    args.repeat)
+            expected = naive(scope)['amount'].sum()
+            got = engine.report('by_product', scope)['Vendas'].sum()
+            status = "ok" if np.isclose(expected, got) else "DIVERGENTE"
+            print(f"{label:<8} por produto: linhas brutas {naive_ms:8.1f} ms   rollup {first_ms:6.2f} ms"
+                  f"   memorizado {cached_ms:6.3f} ms   dashboard {dashboard_ms:6.3f} ms   [{status}]")
+
+
+if __name__ == "__main__":
+    main()
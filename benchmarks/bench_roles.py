@@ -0,0 +1,76 @@
+"""Micro-benchmark da resolução de papéis: varredura por substring x RoleIndex
+
+Uso (a partir da raiz do projeto):
+    python benchmarks/bench_roles.py
+"""
+import os
+import sys
+import timeit
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from roles import ROLE_CONFIG, RoleIndex
+
+
+def legacy_check_user_permissions(user_groups, user_info):
+    """Implementação anterior de check_user_permissions (sem os avisos do Streamlit)"""
+    permissions = {'admin': False, 'manager': False, 'user': False, 'pages_access': []}
+    admin_emails = ["@outlook.com", "admin@example.com"]
+    user_email = user_info.get('userPrincipalName', '').lower()
+    if user_email in [email.lower() for email in admin_emails]:
+        permissions['admin'] = True
+        permissions['pages_access'].extend(['dashboard', 'users', 'reports', 'settings'])
+    if not user_groups or not user_groups.get('value'):
+        if not permissions['admin']:
+            permissions['user'] = True
+            permissions['pages_access'] = ['dashboard']
+        return permissions
+    for group in user_groups.get('value', []):
+        display_name = group.get('displayName')
+        if not display_name:
+            continue
+        group_name = display_name.lower()
+        if any(word in group_name for word in ['admin', 'administrador', 'administrator']):
+            permissions['admin'] = True
+            permissions['pages_access'].extend(['dashboard', 'users', 'reports', 'settings'])
+        elif any(word in group_name for word in ['manager', 'gerente', 'gestor']):
+            permissions['manager'] = True
+            permissions['pages_access'].extend(['dashboard', 'reports'])
+        elif any(word in group_name for word in ['user', 'usuario', 'usuário']):
+            permissions['user'] = True
+            permissions['pages_access'].extend(['dashboard'])
+    if not any([permissions['admin'], permissions['manager'], permissions['user']]):
+        permissions['user'] = True
+        permissions['pages_access'] = ['dashboard']
+    permissions['pages_access'] = list(set(permissions['pages_access']))
+    return permissions
+
+
+def make_groups(count):
+    # Nomes sem papel, com um grupo de gerentes no final (pior caso da varredura)
+    groups = [{'id': f'group-{i}', 'displayName': f'Equipe de Projetos {i}'} for i in range(count - 1)]
+    groups.append({'id': f'group-{count}', 'displayName': 'Gerentes Regionais'})
+    return groups
+
+
+def main():
+    user_info = {'userPrincipalName': 'maria@empresa.com'}
+    index = RoleIndex(ROLE_CONFIG)
+    print(f"{'grupos':>8} {'substring':>14} {'RoleIndex':>14} {'ganho':>7}")
+    for count in (10, 1000, 10000):
+        groups = {'value': make_groups(count)}
+        expected = legacy_check_user_permissions(groups, user_info)
+        result = index.resolve(groups['value'], user_info['userPrincipalName'])
+        assert {k: v for k, v in result.items() if k != 'pages_access'} == \
+            {k: v for k, v in expected.items() if k != 'pages_access'}
+        assert set(result['pages_access']) == set(expected['pages_access'])
+
+        number = max(1, 20000 // count)
+        legacy = min(timeit.repeat(lambda: legacy_check_user_permissions(groups, user_info),
+                                   number=number, repeat=5)) / number
+        indexed = min(timeit.repeat(lambda: index.resolve(groups['value'], user_info['userPrincipalName']),
+                                    number=number, repeat=5)) / number
+        print(f"{count:>8} {legacy * 1e6:>11.1f} µs {indexed * 1e6:>11.1f} µs {legacy / indexed:>6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""Mede quantas chamadas ao Graph o single-flight economiza com sessões simultâneas
+
+Várias sessões (usuários distintos do mesmo tenant, com o mesmo escopo) abrem
+a aba de grupos ao mesmo tempo: /me, /groups completo e os membros de um grupo.
+Só as páginas de /groups (iguais para todo o tenant) são compartilhadas entre
+usuários; /me e os membros (que o Graph pode negar a um usuário) seguem uma
+chamada por usuário.
+
+Uso (a partir da raiz do projeto):
+    python benchmarks/bench_singleflight.py [--sessions 50] [--waves 5] [--latency 0.05]
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import jwt
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import graph_client
+from stub_graph import StubGraphServer, default_routes
+
+GROUP_FIELDS = ['id', 'displayName', 'description', 'groupTypes']
+
+
+def user_token(index):
+    # Tokens com claims realistas; o stub não verifica a assinatura
+    claims = {'tid': 'tenant-1', 'oid': f'user-{index}', 'appid': 'app-1',
+              'scp': 'User.Read Group.Read.All GroupMember.Read.All'}
+    return jwt.encode(claims, 'stub-signing-key-only-for-local-benchmarks', algorithm='HS256')
+
+
+def open_groups_tab(token):
+    graph_client.make_graph_request(token, '/me')
+    graph_client.fetch_all_pages(token, '/groups', top=100, select=GROUP_FIELDS)
+    graph_client.fetch_all_pages(token, '/groups/group-1/members', top=999)
+
+
+def run(server, tokens, waves, single_flight):
+    graph_client.get_graph_config().SINGLE_FLIGHT = single_flight
+    server.request_counts.clear()
+    barrier = threading.Barrier(len(tokens))
+
+    def session(token):
+        for _ in range(waves):
+            barrier.wait()
+            open_groups_tab(token)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=len(tokens)) as pool:
+        list(pool.map(session, tokens))
+    return time.perf_counter() - start, sum(server.request_counts.values())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sessions", type=int, default=50)
+    parser.add_argument("--waves", type=int, default=5,
+                        help="quantas vezes todas as sessões abrem a aba juntas")
+    parser.add_argument("--latency", type=float, default=0.05,
+                        help="latência simulada por requisição, em segundos")
+    args = parser.parse_args()
+
+    config = graph_client.get_graph_config()
+    # Sem limitador de taxa: medir apenas o efeito do agrupamento
+    config.RATE_LIMIT = config.RATE_BURST = 1e6
+    tokens = [user_token(i) for i in range(args.sessions)]
+
+    with StubGraphServer(routes=default_routes(), latency=args.latency) as server:
+        config.BASE_URL = server.url
+        plain_time, plain_calls = run(server, tokens, args.waves, single_flight=False)
+        shared_time, shared_calls = run(server, tokens, args.waves, single_flight=True)
+
+    print(f"{args.sessions} sessões x {args.waves} ondas, latência simulada {args.latency * 1000:.0f} ms")
+    print(f"sem single-flight  {plain_time:7.2f} s   {plain_calls:6d} chamadas ao Graph")
+    print(f"com single-flight  {shared_time:7.2f} s   {shared_calls:6d} chamadas ao Graph")
+    print(f"chamadas economizadas: {plain_calls - shared_calls} "
+          f"({(plain_calls - shared_calls) / plain_calls:.0%})")
+    print(f"contadores: {graph_client.single_flight.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""Mede o custo de inicialização: tempo de import dos módulos e tempo até a primeira renderização por página
+
+Cada medição "fria" roda em um processo Python novo, como o primeiro acesso
+após iniciar o servidor. As páginas são executadas com o AppTest do
+Streamlit e uma sessão já autenticada (admin); "rerun" é a mediana das
+execuções seguintes no mesmo processo, como as interações do usuário.
+
+Uso (a partir da raiz do projeto):
+    python benchmarks/bench_startup.py [--runs 5] [--reruns 10]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODULES = ['auth_utils', 'page_bootstrap', 'group_directory', 'member_browser', 'app']
+PAGES = ['pages/1_Dashboard.py', 'pages/2_Reports.py', 'pages/3_Admin.py']
+HEAVY_MODULES = ('numpy', 'pandas')
+
+
+def measure_import(module):
+    start = time.perf_counter()
+    __import__(module)
+    elapsed = time.perf_counter() - start
+    return {'ms': elapsed * 1000, 'heavy': [name for name in HEAVY_MODULES if name in sys.modules]}
+
+
+def measure_page(page, reruns):
+    from streamlit.testing.v1 import AppTest
+
+    start = time.perf_counter()
+    at = AppTest.from_file(os.path.join(ROOT, page), default_timeout=60)
+    at.session_state["authenticated"] = True
+    at.session_state["user_name"] = "Usuário de Teste"
+    at.session_state["permissions"] = {'admin': True, 'manager': False, 'user': False,
+                                       'pages_access': ['dashboard', 'users', 'reports', 'settings']}
+    at.run()
+    first = time.perf_counter() - start
+    samples = []
+    for _ in range(reruns):
+        start = time.perf_counter()
+        at.run()
+        samples.append(time.perf_counter() - start)
+    failures = [str(exception.value) for exception in at.exception]
+    return {'first_ms': first * 1000, 'rerun_ms': statistics.median(samples) * 1000 if samples else 0.0,
+            'failures': failures}
+
+
+def in_fresh_process(kind, target, reruns=0):
+    env = dict(os.environ, STREAMLIT_LOGGER_LEVEL="error")
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--child", kind, target, "--reruns", str(reruns)],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=5, help="processos novos por medição")
+    parser.add_argument("--reruns", type=int, default=10)
+    parser.add_argument("--child", nargs=2, metavar=("TIPO", "ALVO"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        sys.path.insert(0, ROOT)
+        kind, target = args.child
+        result = measure_import(target) if kind == "import" else measure_page(target, args.reruns)
+        print(json.dumps(result))
+        return
+
+    print("Import a frio (processo novo):")
+    for module in MODULES:
+        results = [in_fresh_process("import", module) for _ in range(args.runs)]
+        heavy = ", ".join(results[0]['heavy']) or "nenhum"
+        print(f"  {module:<16} mediana {statistics.median(r['ms'] for r in results):7.1f} ms"
+              f"   carrega: {heavy}")
+
+    print("Páginas (sessão admin autenticada):")
+    for page in PAGES:
+        results = [in_fresh_process("page", page, args.reruns) for _ in range(args.runs)]
+        failures = results[0]['failures']
+        print(f"  {page:<22} primeira renderização {statistics.median(r['first_ms'] for r in results):7.1f} ms"
+              f"   rerun {statistics.median(r['rerun_ms'] for r in results):6.1f} ms"
+              + (f"   ERRO: {failures[0]}" if failures else ""))
+
+
+if __name__ == "__main__":
+    main()
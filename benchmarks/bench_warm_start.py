@@ -0,0 +1,98 @@
+"""Compara a primeira renderização com o cache em disco do Graph frio e quente
+
+Cenários (cada um simula um processo recém-iniciado):
+  sem cache em disco   todas as chamadas vão ao Graph
+  cache frio           arquivo vazio: chamadas ao Graph + gravação cifrada
+  cache quente         reinício dentro do TTL: respostas lidas do disco
+  revalidação          TTL vencido: requisições condicionais (If-None-Match -> 304)
+
+Uso (a partir da raiz do projeto):
+    python benchmarks/bench_warm_start.py [--runs 10] [--latency 0.08]
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import jwt
+from cryptography.fernet import Fernet
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import graph_client
+import graph_disk_cache
+from graph_async import fetch_parallel
+from stub_graph import StubGraphServer, default_routes
+
+GROUP_FIELDS = ['id', 'displayName', 'description', 'groupTypes']
+FIRST_RENDER = {
+    'me': '/me',
+    'member_of': graph_client.with_query('/me/memberOf', top=999),
+    'groups': graph_client.with_query('/groups', top=100, select=GROUP_FIELDS),
+}
+
+
+def user_token():
+    claims = {'tid': 'tenant-1', 'oid': 'user-1', 'appid': 'app-1',
+              'scp': 'User.Read Group.Read.All GroupMember.Read.All'}
+    return jwt.encode(claims, 'stub-signing-key-only-for-local-benchmarks', algorithm='HS256')
+
+
+def use_disk_cache(cache):
+    # Equivale a reiniciar o processo com o arquivo de cache já existente
+    graph_disk_cache._disk_cache = cache
+    graph_disk_cache._disk_cache_loaded = True
+
+
+def first_render(token):
+    start = time.perf_counter()
+    results = fetch_parallel(token, FIRST_RENDER, collections={'member_of'})
+    elapsed = time.perf_counter() - start
+    failed = [name for name, result in results.items() if isinstance(result, Exception)]
+    if failed:
+        raise RuntimeError(f"falha na primeira renderização: {failed}")
+    return elapsed
+
+
+def measure(label, server, runs, prepare):
+    samples = []
+    server.request_counts.clear()
+    for _ in range(runs):
+        prepare()
+        samples.append(first_render(user_token()))
+    calls = sum(server.request_counts.values()) / runs
+    print(f"{label:<22} mediana {statistics.median(samples) * 1000:8.1f} ms"
+          f"   mín {min(samples) * 1000:8.1f} ms   {calls:5.1f} chamadas/render")
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.08,
+                        help="latência simulada por requisição, em segundos")
+    args = parser.parse_args()
+
+    key = Fernet.generate_key()
+    with tempfile.TemporaryDirectory() as tmp, \
+            StubGraphServer(routes=default_routes(), latency=args.latency) as server:
+        graph_client.get_graph_config().BASE_URL = server.url
+        path = os.path.join(tmp, "graph_cache.sqlite3")
+
+        def open_cache(ttl, clear=False):
+            cache = graph_disk_cache.DiskGraphCache(path, key, 64 * 1024 * 1024, ttl)
+            if clear:
+                cache.clear()
+            use_disk_cache(cache)
+
+        no_cache = measure("sem cache em disco", server, args.runs, lambda: use_disk_cache(None))
+        measure("cache frio", server, args.runs, lambda: open_cache(ttl=300, clear=True))
+        warm = measure("cache quente", server, args.runs, lambda: open_cache(ttl=300))
+        measure("revalidação (304)", server, args.runs, lambda: open_cache(ttl=0))
+
+    print(f"primeira renderização com cache quente: {no_cache / warm:.0f}x mais rápida")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,328 @@
+"""Teste de carga: N sessões simultâneas do app contra o Azure AD e o Graph simulados
+
+Sobe o provedor de identidade local (stub_identity) e o Graph simulado
+(stub_graph, com paginação, latência e 429 + Retry-After opcionais) e abre
+N sessões com o AppTest do Streamlit, em threads do mesmo processo, como
+as sessões de um servidor real (mesmos caches e singletons). Cada sessão
+faz o login pelo código de autorização (MSAL + validação do ID token),
+repete a página principal e visita as páginas permitidas ao seu papel.
+Com --tenants N, os usuários se dividem entre N tenants (um domínio de
+e-mail por tenant) e cada sessão confere que entrou no próprio tenant, com
+a própria identidade.
+
+Relata os percentis (p50/p95/p99) do tempo de cada rerun por etapa, as
+chamadas recebidas pelo IdP e pelo Graph (total e por sessão), o tempo de
+check_user_permissions e das chamadas ao Graph medido pelo app e a memória
+residente acrescentada por sessão. Com --output, grava tudo em JSON para
+comparar execuções (linha de base de cada mudança).
+
+Uso (a partir da raiz do projeto):
+    python benchmarks/load_sessions.py [--sessions 20] [--reruns 5] [--latency 0.02]
+        [--throttle-every 0] [--admins 2] [--app-roles] [--tenants 1] [--output resultado.json]
+"""
+import argparse
+import gc
+import json
+import os
+import re
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from stub_graph import (StubGraphServer, default_routes, delta_collection, make_groups, make_users,
+                        nest_groups, paged_collection, throttled)
+from stub_identity import StubIdentityServer, identity_routes, make_identities, make_tenants
+
+APP = os.path.join(ROOT, "app.py")
+PAGES = {
+    'dashboard': os.path.join(ROOT, "pages", "1_Dashboard.py"),
+    'reports': os.path.join(ROOT, "pages", "2_Reports.py"),
+    'admin': os.path.join(ROOT, "pages", "3_Admin.py"),
+}
+# Estado da sessão levado do app para as páginas (no servidor real, a sessão é a mesma)
+SESSION_KEYS = ("authenticated", "access_token", "tenant_id", "home_account_id", "account_id", "permissions",
+                "user_name", "user_email", "id_token_claims")
+# Segmentos de URL com IDs viram {id} na contagem de chamadas
+ID_SEGMENT = re.compile(r'/(group|user)-\d+')
+
+
+def share_apptest_runtime():
+    """Adaptar o AppTest (feito para uma sessão por vez) a sessões simultâneas em threads
+
+    - Cada run cria um Runtime simulado em Runtime._instance e o apaga no fim,
+      derrubando as sessões em andamento: o primeiro criado passa a valer para
+      todas, como o Runtime único de um servidor (inclusive o st.cache_data).
+    - Cada AppTest tem o seu cache de bytecode e ast.parse/compile em threads
+      simultâneas falham no CPython 3.11 ("AST constructor recursion depth
+      mismatch"): os scripts são compilados um de cada vez.
+    - A opção global.appTest é ligada e desligada em volta de cada run; um
+      run que termina a desliga no meio de outro: fica ligada de vez.
+    """
+    import contextlib
+
+    from streamlit import config
+    from streamlit.runtime.runtime import Runtime
+    from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+    from streamlit.testing.v1 import app_test
+    from streamlit.testing.v1.util import build_mock_config_get_option
+
+    config.get_option = build_mock_config_get_option({"global.appTest": True})
+    app_test.patch_config_options = lambda overrides: contextlib.nullcontext()
+
+    shared = []
+    original_instance = Runtime.instance.__func__
+
+    def instance(cls):
+        if not shared:
+            shared.append(original_instance(cls))
+        return shared[0]
+    Runtime.instance = classmethod(instance)
+    Runtime.exists = classmethod(lambda cls: bool(shared) or cls._instance is not None)
+
+    lock = threading.Lock()
+    get_bytecode = ScriptCache.get_bytecode
+
+    def locked_get_bytecode(self, script_path):
+        with lock:
+            return get_bytecode(self, script_path)
+    ScriptCache.get_bytecode = locked_get_bytecode
+
+
+def resident_mb():
+    """Memória residente do processo (MB), de /proc ou, fora do Linux, o pico do processo"""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+    except OSError:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+
+def percentiles(samples):
+    ordered = sorted(samples)
+    if len(ordered) < 2:
+        value = ordered[0] if ordered else 0.0
+        return {'n': len(ordered), 'p50_ms': value, 'p95_ms': value, 'p99_ms': value, 'max_ms': value}
+    cuts = statistics.quantiles(ordered, n=100, method='inclusive')
+    return {'n': len(ordered), 'p50_ms': cuts[49], 'p95_ms': cuts[94], 'p99_ms': cuts[98], 'max_ms': ordered[-1]}
+
+
+def call_counts(server):
+    counts = {}
+    for path, count in list(server.request_counts.items()):
+        label = ID_SEGMENT.sub(lambda match: f"/{{{match.group(1)}}}", path.split("?")[0])
+        counts[label] = counts.get(label, 0) + count
+    return dict(sorted(counts.items()))
+
+
+def make_secrets(identity, graph, directory, admins, tenants):
+    return {
+        'oauth': {
+            'client_id': identity.client_id,
+            'client_secret': identity.client_secret,
+            'tenant_id': identity.tenant_id,
+            'tenants': {domain: tenant_id for domain, tenant_id in tenants if tenant_id != identity.tenant_id},
+            'authority_host': identity.url,
+            'redirect_uri': "http://localhost:8501",
+        },
+        'graph': {'base_url': graph.url},
+        'session': {'backend': 'memory'},
+        'audit': {'directory': os.path.join(directory, "audit")},
+        'reports': {'path': os.path.join(directory, "sales")},
+        'roles': {'admin': {'emails': admins}},
+    }
+
+
+class VirtualUser:
+    """Uma sessão do navegador: login pelo código, reruns do app e visita às páginas permitidas"""
+
+    def __init__(self, identity_server, identity, secrets, reruns):
+        self.identity_server = identity_server
+        self.login = identity["preferred_username"]
+        self.tenant_id = identity["tid"]
+        self.secrets = secrets
+        self.reruns = reruns
+        self.samples = {}
+        self.errors = []
+        # Mantidos vivos até a medição de memória, como sessões abertas
+        self.apps = []
+
+    def _app(self, script, state=None):
+        from streamlit.testing.v1 import AppTest
+        at = AppTest.from_file(script, default_timeout=120)
+        for key, value in self.secrets.items():
+            at.secrets[key] = value
+        for key, value in (state or {}).items():
+            at.session_state[key] = value
+        self.apps.append(at)
+        return at
+
+    def _timed_run(self, at, stage):
+        start = time.perf_counter()
+        at.run()
+        self.samples.setdefault(stage, []).append((time.perf_counter() - start) * 1000)
+        self.errors.extend(f"{stage}: {exception.value}" for exception in at.exception)
+
+    def run(self, barrier=None):
+        at = self._app(APP)
+        # Como no redirecionamento do Azure AD: o código e o `state` com o tenant escolhido no login
+        at.query_params["code"] = self.identity_server.issue_code(self.login, self.tenant_id)
+        at.query_params["state"] = self.tenant_id
+        if barrier is not None:
+            barrier.wait()
+        self._timed_run(at, "login")
+        if "authenticated" not in at.session_state or not at.session_state["authenticated"]:
+            self.errors.append(f"login: sessão não autenticada ({[e.value for e in at.error]})")
+            return
+        for _ in range(self.reruns):
+            self._timed_run(at, "app rerun")
+        # Isolamento: a sessão continua no tenant e na identidade do próprio login
+        seen = (at.session_state["tenant_id"], at.session_state["user_email"])
+        if seen != (self.tenant_id, self.login):
+            self.errors.append(f"isolamento: {self.login} ({self.tenant_id}) viu {seen}")
+        state = {key: at.session_state[key] for key in SESSION_KEYS if key in at.session_state}
+        permissions = state.get("permissions") or {}
+        for page, script in PAGES.items():
+            if page == 'admin' and not permissions.get('admin'):
+                continue
+            if page == 'reports' and not (permissions.get('admin') or permissions.get('manager')):
+                continue
+            page_app = self._app(script, state)
+            self._timed_run(page_app, f"{page} primeira")
+            for _ in range(self.reruns):
+                self._timed_run(page_app, f"{page} rerun")
+
+
+def graph_routes(identity_server, group_count, member_count, throttle_every, retry_after):
+    groups = make_groups(group_count)
+    routes = default_routes()
+    routes.update({
+        "/groups": paged_collection(groups),
+        "/groups/delta": delta_collection(nest_groups(make_groups(group_count))),
+        "/groups/{id}/members": paged_collection(make_users(member_count)),
+        **identity_routes(identity_server, groups),
+    })
+    if throttle_every:
+        for path in ("/me", "/me/memberOf", "/groups", "/groups/{id}/members"):
+            routes[path] = throttled(routes[path], every=throttle_every, retry_after=retry_after)
+    return routes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=20, help="sessões simultâneas")
+    parser.add_argument("--reruns", type=int, default=5, help="reruns por página em cada sessão")
+    parser.add_argument("--latency", type=float, default=0.02, help="latência simulada por requisição (s)")
+    parser.add_argument("--idp-latency", type=float, default=0.05, help="latência do endpoint de token (s)")
+    parser.add_argument("--throttle-every", type=int, default=0, help="429 em uma a cada N chamadas ao Graph")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After dos 429 simulados (s)")
+    parser.add_argument("--groups", type=int, default=2500)
+    parser.add_argument("--members", type=int, default=30)
+    parser.add_argument("--admins", type=int, default=2, help="quantas sessões entram como admin")
+    parser.add_argument("--app-roles", action="store_true",
+                        help="incluir a claim `roles` nos ID tokens (autorização sem /me e /me/memberOf)")
+    parser.add_argument("--tenants", type=int, default=1, help="tenants entre os quais os usuários se dividem")
+    parser.add_argument("--output", help="gravar o resultado em JSON")
+    args = parser.parse_args()
+
+    tenants = make_tenants(args.tenants)
+    identities = make_identities(args.sessions + 1, group_count=args.groups, tenants=tenants)
+    admins = [identity["preferred_username"] for identity in identities[:args.admins + 1]]
+    app_roles = ["user"] if args.app_roles else None
+
+    with StubIdentityServer(identities, latency=args.idp_latency, app_roles=app_roles) as identity_server, \
+            tempfile.TemporaryDirectory() as directory:
+        routes = graph_routes(identity_server, args.groups, args.members, args.throttle_every, args.retry_after)
+        with StubGraphServer(routes=routes, latency=args.latency) as graph_server:
+            # MSAL (requests) e a busca das chaves JWKS (urllib) confiam no certificado do IdP local
+            os.environ["SSL_CERT_FILE"] = os.environ["REQUESTS_CA_BUNDLE"] = identity_server.ca_file
+            secrets = make_secrets(identity_server, graph_server, directory, admins, tenants)
+            share_apptest_runtime()
+
+            # Sessão de aquecimento: imports, singletons e diretório de grupos fora das medições
+            warmup = VirtualUser(identity_server, identities[0], secrets, 1)
+            warmup.run()
+            if warmup.errors:
+                print("Falha na sessão de aquecimento:", *warmup.errors[:5], sep="\n  ")
+                return
+            from instrumentation import process_metrics
+            from msal_client import get_client_pool
+            process_metrics.reset()
+            identity_server.request_counts.clear()
+            graph_server.request_counts.clear()
+            gc.collect()
+            memory_before = resident_mb()
+
+            users = [VirtualUser(identity_server, identity, secrets, args.reruns) for identity in identities[1:]]
+            barrier = threading.Barrier(len(users))
+            threads = [threading.Thread(target=user.run, args=(barrier,), name=f"sessao-{i}")
+                       for i, user in enumerate(users)]
+            start = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - start
+            gc.collect()
+            memory_per_session = (resident_mb() - memory_before) / len(users)
+
+            stages = {}
+            for user in users:
+                for stage, samples in user.samples.items():
+                    stages.setdefault(stage, []).extend(samples)
+            errors = [error for user in users for error in user.errors]
+            upstream = {'idp': call_counts(identity_server), 'graph': call_counts(graph_server)}
+            operations = process_metrics.snapshot()['operations']
+            result = {
+                'sessions': len(users),
+                'reruns': args.reruns,
+                'latency_s': args.latency,
+                'throttle_every': args.throttle_every,
+                'app_roles': args.app_roles,
+                'tenants': args.tenants,
+                'elapsed_s': elapsed,
+                'memory_per_session_mb': memory_per_session,
+                'stages': {stage: percentiles(samples) for stage, samples in stages.items()},
+                'upstream': upstream,
+                'tokens_issued': dict(identity_server.issued),
+                'operations': {name: summary for name, summary in operations.items()
+                               if name.startswith(('app.', 'graph ', 'msal.'))},
+                'msal_pool': get_client_pool().stats(),
+                'errors': errors,
+            }
+
+    print(f"{result['sessions']} sessões simultâneas, {args.reruns} reruns por página, "
+          f"latência do Graph {args.latency * 1000:.0f} ms"
+          + (f", 429 a cada {args.throttle_every} chamadas" if args.throttle_every else "")
+          + f"; total {elapsed:.1f} s")
+    print(f"\n{'Etapa':<20} {'n':>5} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'máx ms':>9}")
+    for stage, summary in result['stages'].items():
+        print(f"{stage:<20} {summary['n']:>5} {summary['p50_ms']:>9.1f} {summary['p95_ms']:>9.1f}"
+              f" {summary['p99_ms']:>9.1f} {summary['max_ms']:>9.1f}")
+    for name, counts in upstream.items():
+        total = sum(counts.values())
+        print(f"\nChamadas ao {name}: {total} ({total / result['sessions']:.1f} por sessão)")
+        for path, count in counts.items():
+            print(f"  {count:>6}  {path}")
+    print("\nMedido pelo app (todas as sessões):")
+    for name, summary in result['operations'].items():
+        print(f"  {name:<48} {summary['count']:>6} chamadas   p50 {summary['p50_ms']:7.1f} ms"
+              f"   p95 {summary['p95_ms']:7.1f} ms")
+    pool = result['msal_pool']
+    print(f"\nMSAL: {pool['tenants']} tenants no pool, {pool['accounts']} contas em cache")
+    print(f"\nMemória residente por sessão: {memory_per_session:.2f} MB (inclui a árvore de elementos do AppTest)")
+    if errors:
+        print(f"\n{len(errors)} erros; primeiros:", *errors[:5], sep="\n  ")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output:
+            json.dump(result, output, indent=2, ensure_ascii=False)
+        print(f"\nResultado gravado em {args.output}")
+
+
+if __name__ == "__main__":
+    main()
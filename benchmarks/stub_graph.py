@@ -0,0 +1,239 @@
+"""Servidor HTTP local que imita o Microsoft Graph para benchmarks"""
+import hashlib
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlsplit
+
+
+class StubGraphHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 para permitir conexões keep-alive
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def find_route(self, path):
+        """Rota exata ou com parâmetros no formato /groups/{id}/members"""
+        routes = self.server.routes
+        if path in routes:
+            return routes[path]
+        for pattern, payload in routes.items():
+            if "{" in pattern:
+                regex = "^" + re.sub(r"\{\w+\}", "[^/]+", pattern) + "$"
+                if re.match(regex, path):
+                    return payload
+        return None
+
+    def dispatch(self, url):
+        """Resolver uma URL relativa em (status, payload, headers)"""
+        parts = urlsplit(url)
+        payload = self.find_route(parts.path)
+        if payload is None:
+            return 404, {"error": {"code": "Request_ResourceNotFound",
+                                   "message": f"Resource '{parts.path}' does not exist"}}, {}
+        if callable(payload):
+            query = {name: values[0] for name, values in parse_qs(parts.query).items()}
+            result = payload(self, parts.path, query)
+            # Rotas dinâmicas podem devolver (status, payload[, headers]) para simular falhas
+            if not isinstance(result, tuple):
+                return 200, result, {}
+            return result if len(result) == 3 else (*result, {})
+        return 200, payload, {}
+
+    def do_GET(self):
+        server = self.server
+        server.count_request(self.path)
+        if server.latency:
+            time.sleep(server.latency)
+        status, payload, headers = self.dispatch(self.path)
+        if status == 200:
+            # ETag fraca derivada do conteúdo, com suporte a If-None-Match (304)
+            etag = f'W/"{hashlib.sha1(json.dumps(payload).encode("utf-8")).hexdigest()}"'
+            if self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            headers = {**headers, "ETag": etag}
+        self.send_json(status, payload, headers)
+
+    def do_POST(self):
+        server = self.server
+        server.count_request(self.path)
+        if server.latency:
+            time.sleep(server.latency)
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+        if urlsplit(self.path).path != "/$batch":
+            self.send_json(405, {"error": {"code": "MethodNotAllowed"}})
+            return
+        responses = []
+        for item in body.get("requests", []):
+            status, payload, headers = self.dispatch(item["url"])
+            responses.append({"id": item["id"], "status": status, "headers": headers, "body": payload})
+        self.send_json(200, {"responses": responses})
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address
+        return f"http://{host}:{port}"
+
+
+class StubGraphServer:
+    """Inicia o servidor stub em uma thread, em uma porta livre de localhost"""
+
+    def __init__(self, routes=None, latency=0.0, handler=StubGraphHandler):
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        self.httpd.daemon_threads = True
+        self.httpd.routes = routes if routes is not None else default_routes()
+        self.httpd.latency = latency
+        self.httpd.request_counts = {}
+        self.httpd.counts_lock = threading.Lock()
+        self.httpd.count_request = self._count_request
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def _count_request(self, path):
+        with self.httpd.counts_lock:
+            self.httpd.request_counts[path] = self.httpd.request_counts.get(path, 0) + 1
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address
+        return f"http://{host}:{port}"
+
+    @property
+    def request_counts(self):
+        return self.httpd.request_counts
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def paged_collection(items, page_size=100):
+    """Rota que pagina a lista com $top/$skiptoken e devolve @odata.nextLink"""
+    def handler(request, path, query):
+        top = min(int(query.get("$top", page_size)), 999)
+        skip = int(query.get("$skiptoken", 0))
+        select = query.get("$select")
+        matching = items
+        if "$search" in query:
+            # $search "campo:termo" OR ...: busca simples por substring nos campos
+            terms = re.findall(r'"(\w+):([^"]*)"', query["$search"])
+            matching = [item for item in items
+                        if any(term.lower() in str(item.get(field, "")).lower() for field, term in terms)]
+        page = matching[skip:skip + top]
+        if select:
+            # Relações pedidas no $select de um delta voltam como "<campo>@delta"
+            fields = set(select.split(",")) | {"@odata.type"}
+            page = [{k: v for k, v in item.items() if k.split("@")[0] in fields or k in fields}
+                    for item in page]
+        payload = {"value": page}
+        if query.get("$count") == "true":
+            payload["@odata.count"] = len(matching)
+        if skip + top < len(matching):
+            next_query = dict(query, **{"$top": top, "$skiptoken": skip + top})
+            payload["@odata.nextLink"] = f"{request.base_url}{path}?{urlencode(next_query)}"
+        return payload
+    return handler
+
+
+def delta_collection(items, page_size=200):
+    """Rota /delta: páginas com nextLink e, na última, um deltaLink
+
+    Chamadas com $deltatoken devolvem apenas os itens de `changes` (lista mutável).
+    """
+    changes = []
+    paged = paged_collection(items, page_size)
+
+    def handler(request, path, query):
+        if "$deltatoken" in query:
+            pending = list(changes)
+            changes.clear()
+            return {"value": pending,
+                    "@odata.deltaLink": f"{request.base_url}{path}?$deltatoken=next"}
+        payload = paged(request, path, query)
+        if "@odata.nextLink" not in payload:
+            payload["@odata.deltaLink"] = f"{request.base_url}{path}?$deltatoken=initial"
+        return payload
+    handler.changes = changes
+    return handler
+
+
+def make_groups(count):
+    return [
+        {"id": f"group-{i}", "displayName": f"Grupo {i}", "description": None,
+         "groupTypes": [], "@odata.type": "#microsoft.graph.group"}
+        for i in range(count)
+    ]
+
+
+def nest_groups(groups, fanout=10):
+    """Aninhar os grupos em árvore: o grupo i passa a conter os grupos i*fanout+1 ... i*fanout+fanout
+
+    Os membros que são grupos aparecem em "members@delta", como no /groups/delta do Graph.
+    """
+    for i, group in enumerate(groups):
+        children = groups[i * fanout + 1:i * fanout + fanout + 1]
+        if children:
+            group["members@delta"] = [{"@odata.type": "#microsoft.graph.group", "id": child["id"]}
+                                      for child in children]
+    return groups
+
+
+def throttled(route, every=3, retry_after=1):
+    """Envolver uma rota para responder 429 + Retry-After em uma a cada `every` chamadas"""
+    counter = {"calls": 0}
+    lock = threading.Lock()
+
+    def handler(request, path, query):
+        with lock:
+            counter["calls"] += 1
+            limited = counter["calls"] % every == 0
+        if limited:
+            return 429, {"error": {"code": "TooManyRequests", "message": "Too many requests"}}, \
+                {"Retry-After": str(retry_after)}
+        result = route(request, path, query) if callable(route) else route
+        return result
+    return handler
+
+
+def make_users(count):
+    return [
+        {"id": f"user-{i}", "displayName": f"Usuário {i}",
+         "userPrincipalName": f"usuario{i}@example.com", "@odata.type": "#microsoft.graph.user"}
+        for i in range(count)
+    ]
+
+
+def default_routes():
+    return {
+        "/me": {
+            "id": "00000000-0000-0000-0000-000000000001",
+            "displayName": "Usuário de Teste",
+            "userPrincipalName": "teste@example.com"
+        },
+        "/me/memberOf": paged_collection(make_groups(20)),
+        "/groups": paged_collection(make_groups(2500)),
+        "/groups/delta": delta_collection(nest_groups(make_groups(2500))),
+        "/groups/{id}/members": paged_collection(make_users(30))
+    }
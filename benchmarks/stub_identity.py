@@ -0,0 +1,313 @@
+"""Provedor de identidade local que imita o Azure AD (v2.0) para benchmarks e testes de carga
+
+Serve, por HTTPS com certificado autoassinado (o MSAL exige https na
+autoridade), a descoberta OpenID, as chaves JWKS, o endpoint de autorização
+e o endpoint de token. Os ID tokens são assinados com RS256 e validados pelo
+app como os do Azure AD; os access tokens são opacos e o servidor Graph
+simulado descobre o usuário por eles (rotas de identity_routes). Usuários
+com `tid` (make_identities com `tenants`) pertencem a outros tenants,
+servidos no mesmo host como no Azure AD ({authority_host}/{tenant}).
+
+Para o app confiar no certificado, aponte SSL_CERT_FILE e REQUESTS_CA_BUNDLE
+para `server.ca_file` antes da primeira conexão e use em secrets.toml:
+
+    [oauth]
+    authority_host = "<server.url>"
+    tenant_id = "<server.tenant_id>"
+    client_id = "<server.client_id>"
+
+    [oauth.tenants]
+    "<domínio>" = "<tenant>"   # demais tenants de make_tenants
+"""
+import base64
+import datetime
+import ipaddress
+import itertools
+import json
+import os
+import ssl
+import tempfile
+import threading
+import time
+from urllib.parse import parse_qs, urlencode, urlsplit
+
+import jwt
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.x509.oid import NameOID
+
+from stub_graph import StubGraphHandler, StubGraphServer, paged_collection
+
+TENANT_ID = "00000000-0000-0000-0000-0000000000aa"
+CLIENT_ID = "00000000-0000-0000-0000-0000000000bb"
+CLIENT_SECRET = "stub-client-secret"
+SIGNING_KEY_ID = "stub-signing-key"
+TOKEN_LIFETIME = 3600
+
+
+def make_tenants(count):
+    """[(domínio, tenant_id)]: o primeiro é o tenant padrão (TENANT_ID, example.com)"""
+    return [("example.com", TENANT_ID)] + [
+        (f"tenant{k}.example.com", f"00000000-0000-0000-0000-{k:012d}") for k in range(1, count)
+    ]
+
+
+def make_identities(count, groups_per_user=5, group_count=2500, tenants=None):
+    """Usuários simulados, cada um em `groups_per_user` grupos de make_groups(group_count)
+
+    Com `tenants` (de make_tenants), os usuários são distribuídos entre eles
+    em rodízio, com o domínio do tenant no login.
+    """
+    tenants = tenants or make_tenants(1)
+    identities = []
+    for i in range(count):
+        domain, tenant_id = tenants[i % len(tenants)]
+        identities.append({
+            "oid": f"00000000-0000-0000-0001-{i:012d}", "name": f"Usuário {i}",
+            "preferred_username": f"usuario{i}@{domain}", "tid": tenant_id,
+            "groups": [f"group-{(i * groups_per_user + k) % group_count}" for k in range(groups_per_user)]})
+    return identities
+
+
+def _self_signed_certificate(directory):
+    """Certificado para 127.0.0.1/localhost; retorna (arquivo do certificado, arquivo da chave)"""
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "localhost")])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    certificate = (
+        x509.CertificateBuilder()
+        .subject_name(name).issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - datetime.timedelta(minutes=5))
+        .not_valid_after(now + datetime.timedelta(days=1))
+        .add_extension(x509.SubjectAlternativeName(
+            [x509.DNSName("localhost"), x509.IPAddress(ipaddress.ip_address("127.0.0.1"))]), critical=False)
+        .add_extension(x509.BasicConstraints(ca=True, path_length=None), critical=True)
+        .sign(key, hashes.SHA256())
+    )
+    cert_file = os.path.join(directory, "stub-idp.pem")
+    key_file = os.path.join(directory, "stub-idp.key")
+    with open(cert_file, "wb") as output:
+        output.write(certificate.public_bytes(serialization.Encoding.PEM))
+    with open(key_file, "wb") as output:
+        output.write(key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                                       serialization.NoEncryption()))
+    return cert_file, key_file
+
+
+def _client_info(oid, tenant_id):
+    info = json.dumps({"uid": oid, "utid": tenant_id}).encode()
+    return base64.urlsafe_b64encode(info).decode().rstrip("=")
+
+
+def _path_tenant(path):
+    return path.split("/")[1]
+
+
+class StubIdentityHandler(StubGraphHandler):
+    def do_GET(self):
+        parts = urlsplit(self.path)
+        if parts.path.endswith("/oauth2/v2.0/authorize"):
+            # Login sem interação: o primeiro usuário do tenant (ou o do login_hint) é autenticado na hora
+            server = self.server
+            server.count_request(self.path)
+            query = {name: values[0] for name, values in parse_qs(parts.query).items()}
+            code = server.identity.issue_code(query.get("login_hint"), _path_tenant(parts.path))
+            location = f"{query['redirect_uri']}?{urlencode({'code': code, 'state': query.get('state', '')})}"
+            self.send_response(302)
+            self.send_header("Location", location)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        super().do_GET()
+
+    def do_POST(self):
+        server = self.server
+        server.count_request(self.path)
+        if server.latency:
+            time.sleep(server.latency)
+        length = int(self.headers.get("Content-Length", 0))
+        form = {name: values[0] for name, values in parse_qs(self.rfile.read(length).decode()).items()}
+        if not urlsplit(self.path).path.endswith("/oauth2/v2.0/token"):
+            self.send_json(405, {"error": "invalid_request"})
+            return
+        status, payload = server.identity.token(form, _path_tenant(urlsplit(self.path).path))
+        self.send_json(status, payload, {"Cache-Control": "no-store"})
+
+
+class StubIdentityServer(StubGraphServer):
+    """Azure AD simulado em uma thread, em uma porta livre de localhost
+
+    Serve `tenant_id` e os tenants (`tid`) dos usuários. `issue_code(login)`
+    gera um código de autorização de uso único para o usuário, como o
+    redirecionamento após o login. O endpoint de token aceita
+    authorization_code, refresh_token e client_credentials; códigos e
+    refresh tokens só valem no tenant em que o usuário entrou.
+    """
+
+    def __init__(self, identities=None, tenant_id=TENANT_ID, client_id=CLIENT_ID, client_secret=CLIENT_SECRET,
+                 latency=0.0, token_lifetime=TOKEN_LIFETIME, app_roles=None):
+        self._directory = tempfile.TemporaryDirectory()
+        self.ca_file, key_file = _self_signed_certificate(self._directory.name)
+        self.tenant_id = tenant_id
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.token_lifetime = token_lifetime
+        # Papéis de aplicativo incluídos na claim `roles` (dispensam /me/memberOf no app)
+        self.app_roles = app_roles
+        self.identities = identities if identities is not None else make_identities(10)
+        self.tenant_ids = {tenant_id} | {identity.get("tid", tenant_id) for identity in self.identities}
+        self._by_login = {identity["preferred_username"]: identity for identity in self.identities}
+        self._signing_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        self._codes = {}
+        self._refresh_tokens = {}
+        self._access_tokens = {}
+        self._serial = itertools.count(1)
+        self._lock = threading.Lock()
+        self.issued = {"authorization_code": 0, "refresh_token": 0, "client_credentials": 0}
+
+        super().__init__(routes={
+            "/{tenant}/v2.0/.well-known/openid-configuration": self._openid_configuration,
+            "/{tenant}/discovery/v2.0/keys": self._jwks,
+        }, latency=latency, handler=StubIdentityHandler)
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(self.ca_file, key_file)
+        self.httpd.socket = context.wrap_socket(self.httpd.socket, server_side=True)
+        self.httpd.identity = self
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address
+        return f"https://{host}:{port}"
+
+    @property
+    def authority(self):
+        return self.authority_for(self.tenant_id)
+
+    def authority_for(self, tenant_id):
+        return f"{self.url}/{tenant_id}"
+
+    def __exit__(self, *exc):
+        super().__exit__(*exc)
+        self._directory.cleanup()
+
+    def _unknown_tenant(self, tenant_id):
+        return 400, {"error": "invalid_tenant",
+                     "error_description": f"AADSTS90002: Tenant '{tenant_id}' not found."}
+
+    def _openid_configuration(self, request, path, query):
+        tenant_id = _path_tenant(path)
+        if tenant_id not in self.tenant_ids:
+            return self._unknown_tenant(tenant_id)
+        authority = self.authority_for(tenant_id)
+        return {
+            "issuer": f"{authority}/v2.0",
+            "authorization_endpoint": f"{authority}/oauth2/v2.0/authorize",
+            "token_endpoint": f"{authority}/oauth2/v2.0/token",
+            "jwks_uri": f"{authority}/discovery/v2.0/keys",
+            "response_types_supported": ["code", "id_token", "code id_token"],
+            "subject_types_supported": ["pairwise"],
+            "id_token_signing_alg_values_supported": ["RS256"],
+        }
+
+    def _jwks(self, request, path, query):
+        key = jwt.algorithms.RSAAlgorithm.to_jwk(self._signing_key.public_key(), as_dict=True)
+        return {"keys": [{**key, "kid": SIGNING_KEY_ID, "use": "sig", "alg": "RS256"}]}
+
+    def issue_code(self, login=None, tenant_id=None):
+        """Código de autorização de uso único para o usuário `login` (ou o primeiro do tenant)"""
+        tenant_id = tenant_id or self.tenant_id
+        if login:
+            identity = self._by_login.get(login)
+        else:
+            identity = next((i for i in self.identities if i.get("tid", self.tenant_id) == tenant_id), None)
+        if identity is None or identity.get("tid", self.tenant_id) != tenant_id:
+            raise KeyError(f"Usuário desconhecido no tenant {tenant_id} do provedor simulado: {login}")
+        code = f"code-{next(self._serial)}"
+        with self._lock:
+            self._codes[code] = identity
+        return code
+
+    def identity_for(self, access_token):
+        """Usuário dono do access token (None para tokens desconhecidos ou de aplicativo)"""
+        with self._lock:
+            return self._access_tokens.get(access_token)
+
+    def _id_token(self, identity, tenant_id, now):
+        claims = {
+            "aud": self.client_id, "iss": f"{self.authority_for(tenant_id)}/v2.0", "iat": now, "nbf": now,
+            "exp": now + self.token_lifetime, "tid": tenant_id, "oid": identity["oid"],
+            "sub": identity["oid"], "name": identity["name"],
+            "preferred_username": identity["preferred_username"], "groups": identity["groups"],
+            "ver": "2.0"
+        }
+        if self.app_roles:
+            claims["roles"] = list(self.app_roles)
+        return jwt.encode(claims, self._signing_key, algorithm="RS256", headers={"kid": SIGNING_KEY_ID})
+
+    def token(self, form, tenant_id=None):
+        """Resposta do endpoint de token do tenant: (status, corpo JSON)"""
+        tenant_id = tenant_id or self.tenant_id
+        if tenant_id not in self.tenant_ids:
+            return self._unknown_tenant(tenant_id)
+        if form.get("client_id") != self.client_id or form.get("client_secret") != self.client_secret:
+            return 401, {"error": "invalid_client", "error_description": "AADSTS7000215: Invalid client secret."}
+        grant_type = form.get("grant_type")
+        now = int(time.time())
+        with self._lock:
+            if grant_type == "client_credentials":
+                self.issued[grant_type] += 1
+                return 200, {"token_type": "Bearer", "expires_in": self.token_lifetime,
+                             "access_token": f"app-{next(self._serial)}"}
+            if grant_type == "authorization_code":
+                identity = self._codes.pop(form.get("code"), None)
+            elif grant_type == "refresh_token":
+                identity = self._refresh_tokens.pop(form.get("refresh_token"), None)
+            else:
+                return 400, {"error": "unsupported_grant_type"}
+            if identity is None or identity.get("tid", self.tenant_id) != tenant_id:
+                return 400, {"error": "invalid_grant",
+                             "error_description": "AADSTS70008: The provided grant has expired or is invalid."}
+            self.issued[grant_type] += 1
+            serial = next(self._serial)
+            access_token = f"at-{serial}"
+            refresh_token = f"rt-{serial}"
+            self._access_tokens[access_token] = identity
+            self._refresh_tokens[refresh_token] = identity
+        return 200, {
+            "token_type": "Bearer",
+            "scope": form.get("scope", ""),
+            "expires_in": self.token_lifetime,
+            "ext_expires_in": self.token_lifetime,
+            "access_token": access_token,
+            "refresh_token": refresh_token,
+            "id_token": self._id_token(identity, tenant_id, now),
+            "client_info": _client_info(identity["oid"], identity.get("tid", self.tenant_id)),
+        }
+
+
+def identity_routes(identity_server, groups):
+    """Rotas /me e /me/memberOf do Graph simulado resolvidas pelo access token da requisição"""
+    by_id = {group["id"]: group for group in groups}
+
+    def caller(request):
+        token = request.headers.get("Authorization", "").removeprefix("Bearer ")
+        return identity_server.identity_for(token)
+
+    def me(request, path, query):
+        identity = caller(request)
+        if identity is None:
+            return 401, {"error": {"code": "InvalidAuthenticationToken", "message": "Access token is invalid."}}
+        return {"id": identity["oid"], "displayName": identity["name"],
+                "userPrincipalName": identity["preferred_username"]}
+
+    def member_of(request, path, query):
+        identity = caller(request)
+        if identity is None:
+            return 401, {"error": {"code": "InvalidAuthenticationToken", "message": "Access token is invalid."}}
+        memberships = [by_id[group_id] for group_id in identity["groups"] if group_id in by_id]
+        return paged_collection(memberships)(request, path, query)
+
+    return {"/me": me, "/me/memberOf": member_of}
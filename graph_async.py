@@ -0,0 +1,95 @@
+import asyncio
+import concurrent.futures
+
+from graph_client import send_graph_request, with_query
+
+# Número máximo de requisições simultâneas por cliente
+MAX_CONCURRENCY = 8
+# Prazo padrão (segundos) para fetch_parallel
+DEFAULT_DEADLINE = 10
+
+# Threads compartilhadas para as chamadas bloqueantes; por não ser o executor
+# padrão do loop, asyncio.run não espera chamadas abandonadas pelo prazo
+_executor = concurrent.futures.ThreadPoolExecutor(max_workers=32, thread_name_prefix="graph-async")
+
+
+class AsyncGraphClient:
+    """Cliente asyncio para o Microsoft Graph
+
+    As requisições reaproveitam send_graph_request (sessão com pool, limitador
+    de taxa e retentativas), executada em um pool de threads pelo loop, de modo
+    que várias chamadas ficam em voo ao mesmo tempo sem dependências extras.
+    """
+
+    def __init__(self, access_token, max_concurrency=MAX_CONCURRENCY):
+        self.access_token = access_token
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def get(self, endpoint):
+        """GET de um endpoint; erros HTTP são propagados como requests.HTTPError"""
+        async with self._semaphore:
+            loop = asyncio.get_running_loop()
+            response = await loop.run_in_executor(
+                _executor, send_graph_request, self.access_token, endpoint)
+        response.raise_for_status()
+        return response.json()
+
+    async def get_all(self, endpoint, top=None, select=None):
+        """Coleção completa no formato {'value': [...]}, seguindo @odata.nextLink"""
+        url = with_query(endpoint, top=top, select=select)
+        items = []
+        while url:
+            page = await self.get(url)
+            items.extend(page.get('value', []))
+            url = page.get('@odata.nextLink')
+        return {'value': items}
+
+    async def gather(self, calls, deadline=DEFAULT_DEADLINE):
+        """Executar as corrotinas de `calls` ({nome: corrotina}) em paralelo
+
+        Retorna {nome: resultado}; chamadas que falharem trazem a exceção e as
+        que não terminarem dentro do prazo trazem asyncio.TimeoutError.
+        """
+        tasks = {name: asyncio.ensure_future(call) for name, call in calls.items()}
+        if not tasks:
+            return {}
+        done, pending = await asyncio.wait(tasks.values(), timeout=deadline)
+        for task in pending:
+            task.cancel()
+        results = {}
+        for name, task in tasks.items():
+            if task in pending:
+                results[name] = asyncio.TimeoutError()
+            elif task.exception() is not None:
+                results[name] = task.exception()
+            else:
+                results[name] = task.result()
+        return results
+
+
+def _run(coroutine):
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coroutine)
+    # Já existe um loop nesta thread: executar em uma thread separada
+    with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(asyncio.run, coroutine).result()
+
+
+def fetch_parallel(access_token, endpoints, collections=(), deadline=DEFAULT_DEADLINE):
+    """Wrapper síncrono (para scripts do Streamlit) que busca vários endpoints em paralelo
+
+    `endpoints` é {nome: endpoint}; os nomes em `collections` são buscados com
+    todas as páginas. Retorna {nome: resultado ou exceção}; o tempo total fica
+    próximo ao da chamada mais lenta, limitado por `deadline`.
+    """
+    async def main():
+        client = AsyncGraphClient(access_token)
+        calls = {
+            name: client.get_all(endpoint) if name in collections else client.get(endpoint)
+            for name, endpoint in endpoints.items()
+        }
+        return await client.gather(calls, deadline=deadline)
+
+    return _run(main())
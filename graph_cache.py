@@ -0,0 +1,82 @@
+import time
+
+import streamlit as st
+
+# Tempo de vida padrão (segundos) das respostas do Graph em cache por sessão
+GRAPH_CACHE_TTL = 300
+
+SESSION_KEY = "graph_cache"
+
+
+class GraphCache:
+    """Cache de respostas do Microsoft Graph por sessão, com TTL e contadores"""
+
+    def __init__(self, ttl=GRAPH_CACHE_TTL):
+        self.ttl = ttl
+        self._entries = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, value = entry
+            if time.monotonic() < expires_at:
+                self.hits += 1
+                return value
+            del self._entries[key]
+        self.misses += 1
+        return None
+
+    def __contains__(self, key):
+        """Verificar se há entrada válida sem alterar os contadores"""
+        entry = self._entries.get(key)
+        return entry is not None and time.monotonic() < entry[0]
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        self._entries[key] = (time.monotonic() + ttl, value)
+
+    def invalidate(self, key=None):
+        """Remover uma entrada específica ou todo o cache"""
+        if key is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(key, None)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+            'entries': len(self._entries)
+        }
+
+
+def get_session_cache():
+    """Obter (ou criar) o cache de Graph da sessão atual"""
+    if SESSION_KEY not in st.session_state:
+        st.session_state[SESSION_KEY] = GraphCache()
+    return st.session_state[SESSION_KEY]
+
+
+def cached_call(key, loader, ttl=None):
+    """Retornar o valor em cache para a chave ou carregá-lo com loader()
+
+    Respostas vazias (None) não são armazenadas, para que erros não fiquem em cache.
+    """
+    cache = get_session_cache()
+    value = cache.get(key)
+    if value is None:
+        value = loader()
+        if value is not None:
+            cache.set(key, value, ttl)
+    return value
+
+
+def invalidate_session_cache():
+    """Limpar o cache da sessão (logout ou renovação de token)"""
+    cache = st.session_state.get(SESSION_KEY)
+    if cache is not None:
+        cache.invalidate()
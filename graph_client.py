@@ -0,0 +1,426 @@
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+import requests
+import streamlit as st
+from requests.adapters import HTTPAdapter
+
+from graph_disk_cache import get_disk_cache, response_etag
+from graph_singleflight import SingleFlight, _token_identity, flight_key
+from graph_throttle import (
+    RETRY_STATUSES,
+    ThrottleMetrics,
+    TokenBucket,
+    backoff_delay,
+    parse_retry_after,
+)
+from instrumentation import endpoint_label, register_collector, span
+
+# Configuração do cliente HTTP do Microsoft Graph (seção [graph] opcional em secrets.toml)
+class GraphConfig:
+    def __init__(self):
+        try:
+            settings = st.secrets.get("graph", {})
+        except FileNotFoundError:
+            settings = {}
+        self.BASE_URL = settings.get("base_url", "https://graph.microsoft.com/v1.0")
+        self.CONNECT_TIMEOUT = float(settings.get("connect_timeout", 3.05))
+        self.READ_TIMEOUT = float(settings.get("read_timeout", 30))
+        self.POOL_CONNECTIONS = int(settings.get("pool_connections", 4))
+        self.POOL_MAXSIZE = int(settings.get("pool_maxsize", 32))
+        self.MAX_RETRIES = int(settings.get("max_retries", 4))
+        self.BACKOFF_BASE = float(settings.get("backoff_base", 0.5))
+        self.BACKOFF_MAX = float(settings.get("backoff_max", 30))
+        # Limite de requisições por segundo por tenant, somando todas as sessões do processo
+        self.RATE_LIMIT = float(settings.get("rate_limit", 50))
+        self.RATE_BURST = float(settings.get("rate_burst", 100))
+        # Agrupar GETs idênticos simultâneos em uma única chamada ao Graph
+        self.SINGLE_FLIGHT = bool(settings.get("single_flight", True))
+
+_lock = threading.Lock()
+_config = None
+_session = None
+# Um limitador por tenant (LRU): o Graph limita cada tenant separadamente
+_rate_limiters = OrderedDict()
+MAX_RATE_LIMITERS = 256
+throttle_metrics = ThrottleMetrics()
+register_collector('graph', throttle_metrics.snapshot)
+single_flight = SingleFlight()
+register_collector('graph_singleflight', single_flight.stats)
+
+
+def get_graph_config():
+    """Obter a configuração do Graph (lida uma única vez por processo)"""
+    global _config
+    if _config is None:
+        _config = GraphConfig()
+    return _config
+
+
+def get_http_session():
+    """Obter a sessão HTTP compartilhada do processo (pool de conexões keep-alive)"""
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                config = get_graph_config()
+                session = requests.Session()
+                adapter = HTTPAdapter(
+                    pool_connections=config.POOL_CONNECTIONS,
+                    pool_maxsize=config.POOL_MAXSIZE,
+                    pool_block=False
+                )
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                session.headers.update({
+                    'Accept': 'application/json',
+                    'Accept-Encoding': 'gzip, deflate',
+                    'Connection': 'keep-alive'
+                })
+                _session = session
+    return _session
+
+
+def get_rate_limiter(access_token=None):
+    """Obter o limitador de taxa do tenant do token, compartilhado pelas sessões do processo
+
+    Tokens sem claims legíveis usam um limitador comum. Um 429 de um tenant
+    pausa só o limitador dele.
+    """
+    tenant = _token_identity(access_token)[0] if access_token else None
+    with _lock:
+        limiter = _rate_limiters.get(tenant)
+        if limiter is None:
+            config = get_graph_config()
+            limiter = _rate_limiters[tenant] = TokenBucket(config.RATE_LIMIT, config.RATE_BURST)
+            while len(_rate_limiters) > MAX_RATE_LIMITERS:
+                _rate_limiters.popitem(last=False)
+        else:
+            _rate_limiters.move_to_end(tenant)
+    return limiter
+
+
+def get_throttle_metrics():
+    """Contadores de requisições, tentativas e limitações do Graph"""
+    return throttle_metrics.snapshot()
+
+
+def get_timeout():
+    config = get_graph_config()
+    return (config.CONNECT_TIMEOUT, config.READ_TIMEOUT)
+
+
+def build_url(endpoint):
+    """Montar a URL completa (links @odata.nextLink já são absolutos)"""
+    if endpoint.startswith(('http://', 'https://')):
+        return endpoint
+    return f'{get_graph_config().BASE_URL}{endpoint}'
+
+
+def with_query(endpoint, top=None, select=None, **params):
+    """Acrescentar parâmetros OData ($top, $select, ...) ao endpoint"""
+    query = {}
+    if top:
+        query['$top'] = top
+    if select:
+        query['$select'] = ','.join(select)
+    for name, value in params.items():
+        if value is not None:
+            query[f'${name}'] = value
+    if not query:
+        return endpoint
+    separator = '&' if '?' in endpoint else '?'
+    return f'{endpoint}{separator}{urlencode(query, safe="$,")}'
+
+
+def wait_before_retry(attempt, retry_after=None, access_token=None):
+    """Aguardar antes de tentar de novo; um Retry-After pausa todas as chamadas do tenant do token"""
+    config = get_graph_config()
+    delay = backoff_delay(attempt, retry_after, config.BACKOFF_BASE, config.BACKOFF_MAX)
+    if retry_after is not None:
+        get_rate_limiter(access_token).pause(delay)
+    throttle_metrics.incr('retries')
+    throttle_metrics.incr('backoff_wait_seconds', delay)
+    time.sleep(delay)
+
+
+def send_graph_request(access_token, endpoint, method='GET', json=None, headers=None):
+    """Enviar a requisição pela sessão compartilhada e devolver a resposta HTTP
+
+    Respostas 429/503/504 e falhas de conexão são repetidas até MAX_RETRIES vezes,
+    respeitando Retry-After ou com backoff exponencial com jitter. GETs idênticos
+    em voo ao mesmo tempo (mesmo tenant, endpoint e escopo do token) compartilham
+    uma única chamada e a mesma resposta, que deve ser tratada como somente leitura.
+    Com o cache em disco ativo, GETs podem ser respondidos por ele (ver graph_disk_cache).
+    `headers` acrescenta cabeçalhos como ConsistencyLevel (consultas avançadas).
+    """
+    with span(f'graph {method} {endpoint_label(endpoint)}'):
+        if method != 'GET':
+            return _send_with_retries(access_token, endpoint, method, json, headers)
+        disk_cache = get_disk_cache()
+        if disk_cache is None or not disk_cache.cacheable(endpoint):
+            return _send_shared(access_token, endpoint, headers)
+        return _send_disk_cached(disk_cache, access_token, endpoint, headers)
+
+
+def _send_shared(access_token, endpoint, headers=None):
+    if not get_graph_config().SINGLE_FLIGHT:
+        return _send_with_retries(access_token, endpoint, 'GET', None, headers)
+    response = single_flight.do(
+        flight_key(access_token, 'GET', build_url(endpoint)),
+        lambda: _send_with_retries(access_token, endpoint, 'GET', None, headers)
+    )
+    if response.status_code == 401 and response.request.headers.get('Authorization') != f'Bearer {access_token}':
+        # O token de quem fez a chamada compartilhada foi recusado, não necessariamente o nosso
+        return _send_with_retries(access_token, endpoint, 'GET', None, headers)
+    return response
+
+
+def _send_disk_cached(disk_cache, access_token, endpoint, headers=None):
+    """GET pelo cache em disco: dentro do TTL sem rede, depois revalidado com If-None-Match"""
+    url = build_url(endpoint)
+    key = disk_cache.key(access_token, url)
+    entry = disk_cache.get(key)
+    if entry is not None and disk_cache.is_fresh(entry):
+        disk_cache.incr('hits')
+        return entry.to_response(url)
+
+    conditional = {'If-None-Match': entry.etag} if entry is not None and entry.etag else {}
+    response = _send_shared(access_token, endpoint, {**(headers or {}), **conditional})
+    if response.status_code == 304:
+        if entry is not None:
+            disk_cache.renew(key)
+            disk_cache.incr('revalidated')
+            return entry.to_response(url)
+        # A chamada compartilhada era condicional, mas não temos a entrada
+        response = _send_with_retries(access_token, endpoint, 'GET', None, headers)
+    disk_cache.incr('misses')
+    if response.status_code == 200:
+        disk_cache.set(key, response_etag(response), response.content)
+    return response
+
+
+def _send_with_retries(access_token, endpoint, method, json, extra_headers=None):
+    config = get_graph_config()
+    headers = {'Authorization': f'Bearer {access_token}', **(extra_headers or {})}
+    for attempt in range(config.MAX_RETRIES + 1):
+        throttle_metrics.incr('limiter_wait_seconds', get_rate_limiter(access_token).acquire())
+        throttle_metrics.incr('requests')
+        try:
+            response = get_http_session().request(
+                method,
+                build_url(endpoint),
+                headers=headers,
+                json=json,
+                timeout=get_timeout()
+            )
+        except requests.ConnectionError:
+            if attempt == config.MAX_RETRIES:
+                throttle_metrics.incr('gave_up')
+                raise
+            wait_before_retry(attempt, access_token=access_token)
+            continue
+
+        if response.status_code not in RETRY_STATUSES:
+            return response
+        if response.status_code == 429:
+            throttle_metrics.incr('throttled')
+        if attempt == config.MAX_RETRIES:
+            throttle_metrics.incr('gave_up')
+            return response
+        wait_before_retry(attempt, parse_retry_after(response.headers.get('Retry-After')), access_token)
+
+
+def make_graph_request(access_token, endpoint, headers=None):
+    """Fazer requisição para Microsoft Graph API com tratamento de erro"""
+    try:
+        response = send_graph_request(access_token, endpoint, headers=headers)
+
+        if response.status_code == 200:
+            return response.json()
+        elif response.status_code == 403:
+            st.warning(f"⚠️ Permissão insuficiente para acessar: {endpoint}")
+            return None
+        elif response.status_code in RETRY_STATUSES:
+            st.warning("⏳ O Microsoft Graph está limitando as requisições. Tente novamente em instantes.")
+            return None
+        else:
+            st.error(f"Erro na API: {response.status_code} - {response.text}")
+            return None
+    except requests.Timeout:
+        st.error(f"Tempo esgotado ao acessar: {endpoint}")
+        return None
+    except Exception as e:
+        st.error(f"Erro ao fazer requisição: {str(e)}")
+        return None
+
+
+def iter_graph_pages(access_token, endpoint, top=None, select=None):
+    """Percorrer as páginas de uma coleção do Graph seguindo @odata.nextLink
+
+    As páginas são buscadas sob demanda: apenas a página atual fica em memória.
+    """
+    url = with_query(endpoint, top=top, select=select)
+    while url:
+        page = make_graph_request(access_token, url)
+        if page is None:
+            return
+        yield page
+        url = page.get('@odata.nextLink')
+
+
+def iter_graph_items(access_token, endpoint, top=None, select=None):
+    """Gerar os itens de uma coleção do Graph, página a página"""
+    for page in iter_graph_pages(access_token, endpoint, top=top, select=select):
+        yield from page.get('value', [])
+
+
+def fetch_all_pages(access_token, endpoint, top=None, select=None):
+    """Buscar a coleção completa no formato {'value': [...]}
+
+    Retorna None se qualquer página falhar, como make_graph_request: uma
+    lista parcial ficaria no cache como se fosse a coleção inteira.
+    """
+    items, page = [], None
+    for page in iter_graph_pages(access_token, endpoint, top=top, select=select):
+        items.extend(page.get('value', []))
+    if page is None or page.get('@odata.nextLink'):
+        # Nenhuma página ou a seguinte à última recebida falhou
+        return None
+    return {'value': items}
+
+
+# Limite de sub-requisições por chamada /$batch imposto pelo Graph
+BATCH_SIZE = 20
+BATCH_WORKERS = 4
+
+
+def post_graph_batch(access_token, batch_requests):
+    """Enviar até BATCH_SIZE sub-requisições em uma chamada /$batch
+
+    Retorna um dicionário {id: resposta} com status, headers e body de cada item.
+    Falhas da chamada inteira são propagadas como requests.RequestException.
+    """
+    response = send_graph_request(access_token, '/$batch', method='POST',
+                                  json={'requests': batch_requests})
+    response.raise_for_status()
+    return {item.get('id'): item for item in response.json().get('responses', [])}
+
+
+def get_graph_json(access_token, endpoint):
+    """GET sem interface: erros HTTP são propagados (uso em threads de fundo)"""
+    response = send_graph_request(access_token, endpoint)
+    response.raise_for_status()
+    return response.json()
+
+
+def _follow_next_links(access_token, next_link):
+    """Buscar as páginas restantes de uma resposta (fora da thread do Streamlit)"""
+    items = []
+    while next_link:
+        page = get_graph_json(access_token, next_link)
+        items.extend(page.get('value', []))
+        next_link = page.get('@odata.nextLink')
+    return items
+
+
+class BatchItemError(str):
+    """Descrição da falha de um item do lote; `status` é o HTTP do item (None se o lote todo falhou)"""
+
+    def __new__(cls, message, status=None):
+        error = super().__new__(cls, message)
+        error.status = status
+        return error
+
+
+def _item_error(item):
+    body = item.get('body') or {}
+    message = body.get('error', {}).get('message', '') if isinstance(body, dict) else ''
+    return BatchItemError(f"{item.get('status')} - {message}".rstrip(' -'), item.get('status'))
+
+
+def get_pages_batch(access_token, endpoints):
+    """GET de até BATCH_SIZE endpoints em uma chamada /$batch, repetindo os itens limitados
+
+    `endpoints` é {chave: endpoint}. Retorna (páginas, erros) pelas mesmas
+    chaves: páginas[chave] é o corpo JSON da primeira página (com
+    @odata.nextLink, se houver mais) e erros[chave] (BatchItemError)
+    descreve a falha do item.
+    """
+    pages, errors = {}, {}
+    pending = dict(enumerate(endpoints.items()))
+    config = get_graph_config()
+    for attempt in range(config.MAX_RETRIES + 1):
+        batch_requests = [
+            {'id': str(index), 'method': 'GET', 'url': endpoint}
+            for index, (key, endpoint) in pending.items()
+        ]
+        try:
+            responses = post_graph_batch(access_token, batch_requests)
+        except (requests.RequestException, ValueError) as e:
+            errors.update({key: BatchItemError(str(e)) for key, endpoint in pending.values()})
+            return pages, errors
+
+        throttled, retry_after = {}, None
+        for index, (key, endpoint) in pending.items():
+            item = responses.get(str(index))
+            if item is None:
+                errors[key] = BatchItemError("Resposta ausente no lote")
+                continue
+            status = item.get('status')
+            if status in RETRY_STATUSES and attempt < config.MAX_RETRIES:
+                # Itens limitados voltam para o próximo lote
+                if status == 429:
+                    throttle_metrics.incr('throttled')
+                throttled[index] = (key, endpoint)
+                delay = parse_retry_after((item.get('headers') or {}).get('Retry-After'))
+                if delay is not None:
+                    retry_after = max(retry_after or 0.0, delay)
+                continue
+            if status != 200:
+                errors[key] = _item_error(item)
+                continue
+            pages[key] = item.get('body') or {}
+
+        if not throttled:
+            break
+        pending = throttled
+        wait_before_retry(attempt, retry_after, access_token)
+    return pages, errors
+
+
+def _fetch_members_batch(access_token, group_ids, top, select):
+    endpoints = {group_id: with_query(f'/groups/{group_id}/members', top=top, select=select)
+                 for group_id in group_ids}
+    pages, errors = get_pages_batch(access_token, endpoints)
+    members = {}
+    for group_id, body in pages.items():
+        try:
+            members[group_id] = list(body.get('value', [])) + _follow_next_links(
+                access_token, body.get('@odata.nextLink'))
+        except (requests.RequestException, ValueError) as e:
+            errors[group_id] = str(e)
+    return members, errors
+
+
+def get_members_bulk(access_token, group_ids, top=999, select=None, max_workers=BATCH_WORKERS):
+    """Buscar os membros de vários grupos com /$batch e um pool de threads limitado
+
+    Os grupos são agrupados em lotes de BATCH_SIZE e os lotes rodam em paralelo.
+    Retorna (membros, erros): membros[group_id] é a lista completa de membros e
+    erros[group_id] descreve a falha daquele item, sem afetar os demais.
+    """
+    group_ids = list(group_ids)
+    chunks = [group_ids[i:i + BATCH_SIZE] for i in range(0, len(group_ids), BATCH_SIZE)]
+    members, errors = {}, {}
+    if not chunks:
+        return members, errors
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(chunks))) as pool:
+        for chunk_members, chunk_errors in pool.map(
+                lambda chunk: _fetch_members_batch(access_token, chunk, top, select), chunks):
+            members.update(chunk_members)
+            errors.update(chunk_errors)
+    return members, errors
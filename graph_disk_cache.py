@@ -0,0 +1,226 @@
+import base64
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+import requests
+import streamlit as st
+from cryptography.fernet import Fernet, InvalidToken
+
+from graph_cache import GRAPH_CACHE_TTL
+from graph_singleflight import normalize_url, principal
+from instrumentation import register_collector
+from msal_client import get_config
+
+# Tamanho máximo padrão do arquivo de cache (payloads cifrados)
+MAX_CACHE_MB = 64
+# Idade máxima (segundos) de uma entrada guardada; depois disso é descartada
+MAX_AGE = 24 * 3600
+# Intervalo mínimo entre atualizações de last_access de uma mesma entrada
+TOUCH_INTERVAL = 60
+# Endpoints com estado no servidor (delta) não podem ser reaproveitados
+UNCACHEABLE_SEGMENTS = {'delta', '$batch'}
+
+
+class DiskCacheConfig:
+    """Configuração do cache em disco do Graph (seção [disk_cache] opcional em secrets.toml)"""
+
+    def __init__(self):
+        try:
+            settings = st.secrets.get("disk_cache", {})
+        except FileNotFoundError:
+            settings = {}
+        self.ENABLED = bool(settings.get("enabled", False))
+        self.PATH = settings.get("path", os.path.join(".streamlit", "graph_cache.sqlite3"))
+        self.MAX_BYTES = int(float(settings.get("max_mb", MAX_CACHE_MB)) * 1024 * 1024)
+        # Dentro do TTL a resposta é usada sem consultar o Graph; depois, é revalidada
+        self.TTL = int(settings.get("ttl", GRAPH_CACHE_TTL))
+        self.MAX_AGE = int(settings.get("max_age", MAX_AGE))
+        # Sem chave dedicada, deriva uma do client secret (estável entre reinícios)
+        secret_key = settings.get("secret_key") or get_config().CLIENT_SECRET
+        self.SECRET_KEY = base64.urlsafe_b64encode(
+            hashlib.sha256(f"disk_cache:{secret_key}".encode()).digest())
+
+
+class CachedEntry:
+    def __init__(self, etag, content, stored_at):
+        self.etag = etag
+        self.content = content
+        self.stored_at = stored_at
+
+    def to_response(self, url):
+        """Resposta HTTP 200 equivalente à original, para os chamadores de send_graph_request"""
+        response = requests.Response()
+        response.status_code = 200
+        response.url = url
+        response.headers['Content-Type'] = 'application/json'
+        if self.etag:
+            response.headers['ETag'] = self.etag
+        response._content = self.content
+        return response
+
+
+class DiskGraphCache:
+    """Respostas GET do Graph em SQLite, cifradas e com tamanho limitado
+
+    A chave combina o principal (tenant, usuário e escopo do token) com a
+    URL normalizada: uma resposta nunca é servida a outro usuário. Os corpos são comprimidos e cifrados
+    com Fernet; entradas adulteradas ou de outra chave contam como ausentes.
+    O arquivo é limitado a `max_bytes`, descartando as menos usadas (LRU).
+    """
+
+    def __init__(self, path, secret_key, max_bytes, ttl, max_age=MAX_AGE):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.max_age = max_age
+        self._fernet = Fernet(secret_key)
+        self._lock = threading.Lock()
+        self._counters = dict.fromkeys(
+            ('hits', 'revalidated', 'misses', 'stores', 'evictions', 'errors'), 0)
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=5, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                " key TEXT PRIMARY KEY, etag TEXT, body BLOB NOT NULL, size INTEGER NOT NULL,"
+                " stored_at REAL NOT NULL, last_access REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS responses_access ON responses (last_access)")
+            self._total_bytes = self._conn.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        os.chmod(path, 0o600)
+
+    def incr(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    @staticmethod
+    def cacheable(url):
+        return not UNCACHEABLE_SEGMENTS & set(url.split('?')[0].split('/'))
+
+    @staticmethod
+    def key(access_token, url):
+        url = normalize_url(url)
+        tenant, owner = principal(access_token, url)
+        return hashlib.sha256(json.dumps([tenant, owner, url]).encode()).hexdigest()
+
+    def get(self, key):
+        """Entrada guardada para a chave, ou None (ausente, velha demais ou ilegível)"""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT etag, body, stored_at, last_access FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        etag, body, stored_at, last_access = row
+        if now - stored_at > self.max_age:
+            self.delete(key)
+            return None
+        try:
+            content = zlib.decompress(self._fernet.decrypt(body))
+        except (InvalidToken, zlib.error):
+            self.incr('errors')
+            self.delete(key)
+            return None
+        if now - last_access > TOUCH_INTERVAL:
+            with self._lock, self._conn:
+                self._conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+        return CachedEntry(etag, content, stored_at)
+
+    def is_fresh(self, entry):
+        return time.time() - entry.stored_at < self.ttl
+
+    def set(self, key, etag, content):
+        body = self._fernet.encrypt(zlib.compress(content))
+        now = time.time()
+        with self._lock, self._conn:
+            previous = self._conn.execute(
+                "SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, etag, body, size, stored_at, last_access)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (key, etag, body, len(body), now, now)
+            )
+            self._total_bytes += len(body) - (previous[0] if previous else 0)
+            self._counters['stores'] += 1
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def renew(self, key):
+        """Marcar a entrada como recém-validada (resposta 304 do Graph)"""
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE responses SET stored_at = ?, last_access = ? WHERE key = ?", (now, now, key))
+
+    def _evict(self):
+        # Chamado com o lock: remover as menos usadas até caber em 90% do limite
+        target = self.max_bytes * 0.9
+        rows = self._conn.execute(
+            "SELECT key, size FROM responses ORDER BY last_access").fetchall()
+        evicted = []
+        for key, size in rows:
+            if self._total_bytes <= target:
+                break
+            evicted.append((key,))
+            self._total_bytes -= size
+        self._conn.executemany("DELETE FROM responses WHERE key = ?", evicted)
+        self._counters['evictions'] += len(evicted)
+
+    def delete(self, key):
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            if row:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._total_bytes -= row[0]
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM responses")
+            self._total_bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {'bytes': self._total_bytes, **self._counters}
+
+
+_disk_cache_lock = threading.Lock()
+_disk_cache = None
+_disk_cache_loaded = False
+
+
+def get_disk_cache():
+    """Obter o cache em disco do processo, ou None se estiver desativado"""
+    global _disk_cache, _disk_cache_loaded
+    if not _disk_cache_loaded:
+        with _disk_cache_lock:
+            if not _disk_cache_loaded:
+                config = DiskCacheConfig()
+                if config.ENABLED:
+                    _disk_cache = DiskGraphCache(config.PATH, config.SECRET_KEY,
+                                                 config.MAX_BYTES, config.TTL, config.MAX_AGE)
+                    register_collector('graph_disk_cache', _disk_cache.stats)
+                _disk_cache_loaded = True
+    return _disk_cache
+
+
+def response_etag(response):
+    """ETag da resposta: cabeçalho HTTP ou @odata.etag de uma entidade"""
+    etag = response.headers.get('ETag')
+    if etag:
+        return etag
+    try:
+        body = response.json()
+    except ValueError:
+        return None
+    return body.get('@odata.etag') if isinstance(body, dict) else None
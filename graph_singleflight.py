@@ -0,0 +1,127 @@
+import functools
+import hashlib
+import threading
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import jwt
+
+# Coleções cuja resposta não depende do usuário, só do tenant e do escopo do token
+# (/groups lista também os grupos de associação oculta; os membros deles, não)
+USER_INDEPENDENT_COLLECTIONS = {'groups'}
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Agrupa chamadas idênticas simultâneas em uma única execução
+
+    A primeira chamada de uma chave executa a função; as que chegam enquanto
+    ela está em voo esperam e recebem o mesmo resultado (ou a mesma exceção).
+    Nada é guardado depois que a chamada termina: isso não é um cache.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights = {}
+        self._counters = {'leaders': 0, 'shared': 0}
+
+    def do(self, key, func):
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                flight.waiters += 1
+                self._counters['shared'] += 1
+                leader = False
+            else:
+                flight = self._flights[key] = _Flight()
+                self._counters['leaders'] += 1
+                leader = True
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = func()
+        except BaseException as error:
+            flight.error = error
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+        return flight.result
+
+    def stats(self):
+        with self._lock:
+            return {'in_flight': len(self._flights), **self._counters}
+
+
+@functools.lru_cache(maxsize=1024)
+def _token_identity(access_token):
+    """(tenant, usuário, escopo, hash) do token; só o hash se não for um JWT legível
+
+    Os access tokens do Graph não podem ser validados pela aplicação; as claims
+    servem apenas para decidir quais chamadas podem compartilhar a resposta.
+    """
+    digest = hashlib.sha256(access_token.encode()).hexdigest()
+    try:
+        claims = jwt.decode(access_token, options={'verify_signature': False})
+    except jwt.InvalidTokenError:
+        return None, None, None, digest
+    scope = (
+        claims.get('appid') or claims.get('azp'),
+        ' '.join(sorted((claims.get('scp') or '').split())),
+        ' '.join(sorted(claims.get('roles') or ()))
+    )
+    return claims.get('tid'), claims.get('oid'), scope, digest
+
+
+def normalize_url(url):
+    """URL com host em minúsculas e parâmetros da query em ordem fixa"""
+    parts = urlsplit(url)
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)), safe='$,')
+    return urlunsplit((parts.scheme, parts.netloc.lower(), parts.path.rstrip('/'), query, ''))
+
+
+def principal(access_token, url):
+    """(tenant, principal) a quem a resposta de `url` se aplica
+
+    Toda resposta pertence ao usuário (oid) e ao escopo do token, inclusive
+    fora de /me: o Graph pode responder 403 a um usuário para o mesmo
+    endpoint que devolve a outro (ex.: membros de grupos ocultos). Tokens
+    sem claims legíveis ficam restritos a si mesmos.
+    """
+    tenant, user_id, scope, digest = _token_identity(access_token)
+    if scope is None:
+        return tenant, digest
+    return tenant, (user_id or digest, scope)
+
+
+def user_independent(url):
+    """A resposta vale para qualquer usuário do tenant com o mesmo escopo (ex.: páginas de /groups)"""
+    segments = urlsplit(url).path.rstrip('/').split('/')
+    return 'me' not in segments and segments[-1] in USER_INDEPENDENT_COLLECTIONS
+
+
+def flight_key(access_token, method, url):
+    """Chave (tenant, principal, método, endpoint com query normalizada)
+
+    Em voo, chamadas de usuários diferentes se juntam apenas nas coleções
+    que não dependem do usuário: o resultado é descartado ao terminar, então
+    não há como servir a um usuário o que o Graph lhe negaria depois. O
+    cache em disco, que guarda respostas no tempo, usa sempre principal().
+    """
+    url = normalize_url(url)
+    tenant, _, scope, _ = _token_identity(access_token)
+    if scope is not None and user_independent(url):
+        return (tenant, scope, method, url)
+    return (*principal(access_token, url), method, url)
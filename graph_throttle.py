@@ -0,0 +1,95 @@
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+# Respostas do Graph que indicam limitação temporária (vale a pena tentar de novo)
+RETRY_STATUSES = {429, 503, 504}
+
+
+class TokenBucket:
+    """Limitador de taxa (token bucket) compartilhado pelas sessões do processo (um por tenant)"""
+
+    def __init__(self, rate, capacity):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._resume_at = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        elapsed = now - self._updated
+        self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+        self._updated = now
+
+    def acquire(self):
+        """Bloquear até haver um token disponível; retorna o tempo esperado em segundos"""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now < self._resume_at:
+                    delay = self._resume_at - now
+                else:
+                    self._refill(now)
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return waited
+                    delay = (1 - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+    def pause(self, seconds):
+        """Suspender as requisições que passam por este limitador (ex.: após um 429 do Graph)"""
+        with self._lock:
+            self._resume_at = max(self._resume_at, time.monotonic() + seconds)
+            self._tokens = 0.0
+
+
+class ThrottleMetrics:
+    """Contadores de tentativas, limitações e esperas, seguros entre threads"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {
+            'requests': 0,
+            'retries': 0,
+            'throttled': 0,
+            'gave_up': 0,
+            'limiter_wait_seconds': 0.0,
+            'backoff_wait_seconds': 0.0
+        }
+
+    def incr(self, name, value=1):
+        with self._lock:
+            self._counters[name] += value
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._counters)
+
+
+def parse_retry_after(value):
+    """Converter o cabeçalho Retry-After (segundos ou data HTTP) em segundos"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt, retry_after=None, base=0.5, cap=30.0):
+    """Tempo de espera antes da próxima tentativa
+
+    Respeita o Retry-After do servidor quando presente; caso contrário usa
+    backoff exponencial com jitter completo (entre 0 e base * 2^attempt).
+    """
+    if retry_after is not None:
+        return min(cap, retry_after)
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
@@ -0,0 +1,298 @@
+import threading
+import time
+from collections import OrderedDict
+
+import requests
+
+from graph_client import get_graph_json, with_query
+from group_graph import GroupGraph
+from msal_client import acquire_app_token, get_config
+from roles import get_role_index
+
+# Campos dos grupos mantidos no diretório compartilhado
+DIRECTORY_FIELDS = ['id', 'displayName', 'description', 'groupTypes', 'mail']
+# Pedido junto no delta só para montar o grafo de grupos aninhados (members@delta)
+MEMBERSHIP_FIELD = 'members'
+GROUP_TYPE = '#microsoft.graph.group'
+# Limite de grupos em memória, idade máxima do snapshot e intervalo de atualização (segundos)
+MAX_GROUPS = 100000
+DIRECTORY_TTL = 900
+REFRESH_INTERVAL = 300
+# O refresher para de consultar o Graph se ninguém leu o diretório nesse intervalo
+IDLE_TIMEOUT = 1800
+# Token delegado guardado é descartado se nenhum rerun da sessão admin o renovar nesse intervalo
+DELEGATED_TOKEN_TTL = 1800
+
+
+class GroupDirectory:
+    """Cache do diretório de grupos de um tenant, compartilhado pelas sessões do processo
+
+    Os grupos ficam em um OrderedDict limitado (LRU). Cada sincronização via
+    /groups/delta publica um novo snapshot imutável (tupla), então as sessões
+    leem sem bloqueio enquanto a thread de fundo aplica as alterações. O mesmo
+    delta traz os membros que são grupos, mantendo `membership` (GroupGraph)
+    com os papéis herdados por grupos aninhados. Grupos descartados pelo
+    limite não voltam pelo delta incremental: enquanto houver descartes,
+    `last_error` avisa que o diretório está incompleto.
+    """
+
+    def __init__(self, tenant_id=None, max_groups=MAX_GROUPS, ttl=DIRECTORY_TTL,
+                 refresh_interval=REFRESH_INTERVAL):
+        self.tenant_id = tenant_id
+        self.max_groups = max_groups
+        self.ttl = ttl
+        self.refresh_interval = refresh_interval
+        self._groups = OrderedDict()
+        self._snapshot = ()
+        self._index = None
+        self.membership = GroupGraph(get_role_index().roles)
+        self._delta_link = None
+        self._updated_at = None
+        self._last_read = time.monotonic()
+        # (token, dono, instante): token de uma sessão admin, alternativa ao token de aplicação
+        self._delegated = None
+        self._lock = threading.RLock()
+        self._sync_lock = threading.Lock()
+        self._refresher = None
+        self._closed = threading.Event()
+        self.version = 0
+        self.last_error = None
+        # Grupos descartados pelo limite desde a última sincronização completa
+        self.evicted = 0
+
+    # Leitura (sessões do Streamlit)
+
+    def is_ready(self):
+        return self._updated_at is not None
+
+    def is_stale(self):
+        return self._updated_at is None or time.monotonic() - self._updated_at > self.ttl
+
+    def snapshot(self):
+        """Tupla com os grupos da última sincronização (não deve ser modificada)"""
+        self._last_read = time.monotonic()
+        return self._snapshot
+
+    def get(self, group_id):
+        with self._lock:
+            group = self._groups.get(group_id)
+            if group is not None:
+                self._groups.move_to_end(group_id)
+            return group
+
+    def index(self):
+        """Índice colunar de busca do snapshot atual (montado a cada sincronização)"""
+        self._last_read = time.monotonic()
+        index = self._index
+        if index is None:
+            from group_index import GroupIndex
+            index = self._index = GroupIndex(self._snapshot, self.version)
+        return index
+
+    def stats(self):
+        return {
+            'groups': len(self._snapshot),
+            'version': self.version,
+            'nested_groups': self.membership.stats()['groups_with_parents'],
+            'age_seconds': None if self._updated_at is None else round(time.monotonic() - self._updated_at),
+            'evicted': self.evicted,
+            'last_error': self.last_error
+        }
+
+    # Sincronização
+
+    def remember_token(self, access_token, owner):
+        """Registrar o token de uma sessão admin (do mesmo tenant) como alternativa ao token de aplicação
+
+        `owner` identifica a sessão (account_id) para que o logout descarte o token.
+        """
+        if access_token and owner:
+            self._delegated = (access_token, owner, time.monotonic())
+
+    def forget_token(self, owner):
+        """Descartar o token delegado guardado, se for da sessão `owner` (logout)"""
+        with self._lock:
+            if self._delegated is not None and self._delegated[1] == owner:
+                self._delegated = None
+
+    def _delegated_token(self):
+        with self._lock:
+            delegated = self._delegated
+            if delegated is not None and time.monotonic() - delegated[2] > DELEGATED_TOKEN_TTL:
+                self._delegated = delegated = None
+        return delegated[0] if delegated is not None else None
+
+    def _token(self):
+        try:
+            token = acquire_app_token(self.tenant_id)
+        except Exception:
+            token = None
+        return token or self._delegated_token()
+
+    def _apply(self, items):
+        """Aplicar um delta; retorna as alterações para o grafo de grupos aninhados"""
+        added, removed, changed, deleted = [], [], set(), set()
+        with self._lock:
+            for item in items:
+                group_id = item.get('id')
+                if not group_id:
+                    continue
+                if '@removed' in item:
+                    self._groups.pop(group_id, None)
+                    deleted.add(group_id)
+                    continue
+                for member in item.get('members@delta', ()):
+                    if member.get('@odata.type') == GROUP_TYPE and member.get('id'):
+                        edges = removed if '@removed' in member else added
+                        edges.append((member['id'], group_id))
+                group = self._groups.get(group_id) or {}
+                # Respostas delta podem trazer apenas as propriedades alteradas
+                group.update({k: v for k, v in item.items() if '@' not in k})
+                self._groups[group_id] = group
+                self._groups.move_to_end(group_id)
+                changed.add(group_id)
+            while len(self._groups) > self.max_groups:
+                self._groups.popitem(last=False)
+                self.evicted += 1
+        return added, removed, changed, deleted
+
+    def _sync_status(self):
+        """Erro a manter após uma sincronização bem-sucedida: o do diretório truncado, se houver"""
+        if not self.evicted:
+            return None
+        return (f"Diretório incompleto: {self.evicted} grupos acima do limite de {self.max_groups} "
+                f"foram descartados e não voltam pela sincronização incremental")
+
+    def _update_membership(self, graph, added, removed, changed, deleted):
+        role_index = get_role_index()
+        own_masks = {}
+        for group_id in changed:
+            group = self._groups.get(group_id)
+            role = role_index.role_for_group(group) if group else role_index.group_roles.get(group_id)
+            own_masks[group_id] = graph.role_bit(role) if role else 0
+        graph.update(added, removed, own_masks, deleted)
+
+    def refresh(self, access_token=None):
+        """Sincronizar com /groups/delta (completo na primeira vez, incremental depois)"""
+        access_token = access_token or self._token()
+        if not access_token:
+            self.last_error = "Nenhum token disponível para sincronizar o diretório"
+            return False
+        with self._sync_lock:
+            # Sincronização completa: o grafo é remontado e só substitui o atual no fim
+            graph = self.membership if self._delta_link else GroupGraph(get_role_index().roles)
+            url = self._delta_link or with_query('/groups/delta', select=DIRECTORY_FIELDS + [MEMBERSHIP_FIELD])
+            # Cada página é aplicada ao chegar (grupos e grafo em preparação): na sincronização
+            # completa, members@delta traz também os usuários, e acumular tudo custaria o tenant inteiro.
+            # Se uma página falhar, o deltaLink não avança e a próxima sincronização reaplica as mesmas
+            # alterações (aplicá-las de novo não muda o resultado)
+            received, delta_link = 0, None
+            try:
+                while url:
+                    page = get_graph_json(access_token, url)
+                    items = page.get('value', [])
+                    if items:
+                        received += len(items)
+                        self._update_membership(graph, *self._apply(items))
+                    url = page.get('@odata.nextLink')
+                    delta_link = page.get('@odata.deltaLink')
+            except requests.HTTPError as e:
+                if e.response is not None and e.response.status_code == 410:
+                    # deltaLink expirado: a próxima sincronização será completa
+                    with self._lock:
+                        self._delta_link = None
+                        self._groups.clear()
+                        self.evicted = 0
+                self.last_error = str(e)
+                return False
+            except (requests.RequestException, ValueError) as e:
+                self.last_error = str(e)
+                return False
+
+            if not received and self._updated_at is not None:
+                # Nada mudou: manter snapshot e índice, apenas renovar a idade
+                with self._lock:
+                    self._delta_link = delta_link
+                    self._updated_at = time.monotonic()
+                    self.last_error = self._sync_status()
+                return True
+
+            with self._lock:
+                snapshot = tuple(self._groups.values())
+                version = self.version + 1
+            # Índice de busca montado aqui, fora das execuções das sessões; o import
+            # é tardio para que NumPy e pandas só carreguem quando há um diretório
+            from group_index import GroupIndex
+            index = GroupIndex(snapshot, version)
+            with self._lock:
+                self._delta_link = delta_link
+                self._snapshot = snapshot
+                self._index = index
+                self.membership = graph
+                self._updated_at = time.monotonic()
+                self.version = version
+                self.last_error = self._sync_status()
+            return True
+
+    def refresh_async(self, access_token=None):
+        """Iniciar uma sincronização em segundo plano, se nenhuma estiver em andamento"""
+        if self._sync_lock.locked():
+            return
+        threading.Thread(target=self.refresh, args=(access_token,), daemon=True,
+                         name="group-directory-sync").start()
+
+    def ensure_loaded(self, access_token=None, owner=None):
+        """Garantir o carregamento inicial e manter o refresher de fundo ativo
+
+        Só sessões admin devem passar `access_token` (e `owner`): ele fica
+        guardado para as sincronizações de fundo. Sem ele, vale o token de
+        aplicação.
+        """
+        self.remember_token(access_token, owner)
+        self._last_read = time.monotonic()
+        if self.is_stale():
+            self.refresh_async(access_token)
+        self.start_refresher()
+
+    def start_refresher(self):
+        with self._lock:
+            if self._closed.is_set():
+                return
+            if self._refresher is not None and self._refresher.is_alive():
+                return
+            self._refresher = threading.Thread(target=self._refresh_loop, daemon=True,
+                                               name=f"group-directory-refresher-{self.tenant_id}")
+            self._refresher.start()
+
+    def _refresh_loop(self):
+        while not self._closed.wait(self.refresh_interval):
+            if time.monotonic() - self._last_read > IDLE_TIMEOUT:
+                continue
+            self.refresh()
+
+    def close(self):
+        """Parar o refresher (diretório removido do processo)"""
+        self._closed.set()
+
+
+_directory_lock = threading.Lock()
+# Um diretório por tenant (LRU, no máximo MAX_TENANTS): grupos de um tenant nunca aparecem em outro
+_directories = OrderedDict()
+
+
+def get_group_directory(tenant_id=None):
+    """Obter o diretório de grupos do tenant, compartilhado pelas sessões do processo"""
+    config = get_config()
+    tenant_id = tenant_id or config.TENANT_ID
+    evicted = []
+    with _directory_lock:
+        directory = _directories.get(tenant_id)
+        if directory is None:
+            directory = _directories[tenant_id] = GroupDirectory(tenant_id)
+            while len(_directories) > config.MAX_TENANTS:
+                evicted.append(_directories.popitem(last=False)[1])
+        else:
+            _directories.move_to_end(tenant_id)
+    for old in evicted:
+        old.close()
+    return directory
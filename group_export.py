@@ -0,0 +1,308 @@
+import csv
+import glob
+import json
+import os
+import shutil
+import time
+
+import requests
+
+from graph_client import BATCH_SIZE, get_graph_json, get_pages_batch, with_query
+from graph_throttle import RETRY_STATUSES
+
+# Formatos aceitos e extensão do arquivo gerado
+EXPORT_FORMATS = {'csv': '.csv', 'jsonl': '.jsonl', 'parquet': '.parquet'}
+# Uma linha por (grupo, membro); grupos sem membros geram uma linha com os campos do membro vazios
+EXPORT_COLUMNS = ('group_id', 'group_name', 'member_id', 'member_name', 'member_upn', 'member_type')
+GROUP_FIELDS = ['id', 'displayName']
+MEMBER_FIELDS = ['id', 'displayName', 'userPrincipalName']
+# Linhas acumuladas antes de gravar no arquivo (e salvar o ponto de retomada)
+EXPORT_CHUNK_ROWS = 5000
+EXPORT_PAGE_SIZE = 999
+EXPORT_DIR = os.path.join(".streamlit", "exports")
+# Intervalo mínimo (segundos) entre chamadas do callback de progresso
+PROGRESS_INTERVAL = 0.25
+CHECKPOINT_SUFFIX = ".checkpoint.json"
+
+
+class CsvChunkWriter:
+    def __init__(self, path, offset=None):
+        self.path = path
+        fresh = offset is None
+        self._file = open(path, 'w' if fresh else 'r+', newline='', encoding='utf-8')
+        if fresh:
+            csv.writer(self._file).writerow(EXPORT_COLUMNS)
+        else:
+            # Descartar o que foi gravado depois do último ponto de retomada
+            self._file.seek(offset)
+            self._file.truncate()
+        self._writer = csv.writer(self._file)
+
+    def write(self, rows):
+        self._writer.writerows([row[column] for column in EXPORT_COLUMNS] for row in rows)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def position(self):
+        return self._file.tell()
+
+    def close(self):
+        self._file.close()
+
+    def finish(self):
+        self.close()
+
+
+class JsonlChunkWriter(CsvChunkWriter):
+    def __init__(self, path, offset=None):
+        self.path = path
+        self._file = open(path, 'w' if offset is None else 'r+', encoding='utf-8')
+        if offset is not None:
+            self._file.seek(offset)
+            self._file.truncate()
+
+    def write(self, rows):
+        self._file.write(''.join(json.dumps(row, ensure_ascii=False) + '\n' for row in rows))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+
+class ParquetChunkWriter:
+    """Cada bloco vira um arquivo `part-NNNNN.parquet`; no fim, as partes são unidas
+
+    Um Parquet interrompido não tem rodapé e não pode ser lido nem
+    continuado, então as partes concluídas é que permitem retomar.
+    """
+
+    def __init__(self, path, offset=None):
+        import pyarrow as pa
+        self.path = path
+        self.parts_dir = path + ".parts"
+        self.schema = pa.schema([(column, pa.string()) for column in EXPORT_COLUMNS])
+        self.parts = offset or 0
+        os.makedirs(self.parts_dir, exist_ok=True)
+        for name in os.listdir(self.parts_dir):
+            if int(name[5:10]) >= self.parts:
+                os.remove(os.path.join(self.parts_dir, name))
+
+    def _part(self, index):
+        return os.path.join(self.parts_dir, f"part-{index:05d}.parquet")
+
+    def write(self, rows):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        table = pa.Table.from_pylist(rows, schema=self.schema)
+        pq.write_table(table, self._part(self.parts) + ".tmp")
+        os.replace(self._part(self.parts) + ".tmp", self._part(self.parts))
+        self.parts += 1
+
+    def position(self):
+        return self.parts
+
+    def close(self):
+        pass
+
+    def finish(self):
+        """Unir as partes em um único arquivo, uma parte (row group) por vez"""
+        import pyarrow.parquet as pq
+        with pq.ParquetWriter(self.path, self.schema) as writer:
+            for index in range(self.parts):
+                writer.write_table(pq.read_table(self._part(index)))
+        shutil.rmtree(self.parts_dir)
+
+
+WRITERS = {'csv': CsvChunkWriter, 'jsonl': JsonlChunkWriter, 'parquet': ParquetChunkWriter}
+
+
+def export_rows(group, members):
+    group_id, group_name = group.get('id') or '', group.get('displayName') or ''
+    return [{
+        'group_id': group_id,
+        'group_name': group_name,
+        'member_id': member.get('id') or '',
+        'member_name': member.get('displayName') or '',
+        'member_upn': member.get('userPrincipalName') or '',
+        'member_type': (member.get('@odata.type') or '').replace('#microsoft.graph.', '')
+    } for member in members]
+
+
+def skippable(status):
+    """Falha que se repetiria em toda retomada (grupo removido, sem acesso): o grupo é registrado e pulado"""
+    return status is not None and 400 <= status < 500 and status not in RETRY_STATUSES
+
+
+def empty_group_row(group):
+    row = dict.fromkeys(EXPORT_COLUMNS, '')
+    row.update(group_id=group.get('id') or '', group_name=group.get('displayName') or '')
+    return row
+
+
+class GroupExport:
+    """Exportação de grupos e membros página a página, com memória constante e retomada
+
+    Percorre /groups e, para cada grupo, /groups/{id}/members seguindo os
+    @odata.nextLink. Só a página atual e um bloco de até `chunk_rows` linhas
+    (mais uma página) ficam em memória. Depois de gravar cada bloco, a
+    posição (página de grupos, grupo dentro dela e próxima página de
+    membros) é salva em `<arquivo>.checkpoint.json`; `resume` continua dali.
+    Grupos que o Graph recusa (404, 403) ficam em `state['failed']` e a
+    exportação segue; só falhas do lote inteiro ou transitórias interrompem.
+    O checkpoint guarda o tenant: só sessões do mesmo tenant o veem e retomam.
+    """
+
+    def __init__(self, path, fmt, tenant_id, chunk_rows=EXPORT_CHUNK_ROWS, state=None):
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"Formato de exportação desconhecido: {fmt}")
+        self.path = path
+        self.format = fmt
+        self.chunk_rows = chunk_rows
+        self.state = state or {
+            'format': fmt,
+            'tenant_id': tenant_id,
+            'groups_link': with_query('/groups', top=EXPORT_PAGE_SIZE, select=GROUP_FIELDS),
+            'group_offset': 0,
+            'members_link': None,
+            'position': None,
+            'groups': 0,
+            'rows': 0,
+            'failed': [],
+            'started_at': time.time()
+        }
+
+    @property
+    def checkpoint_path(self):
+        return self.path + CHECKPOINT_SUFFIX
+
+    @classmethod
+    def start(cls, fmt, tenant_id, directory=EXPORT_DIR, chunk_rows=EXPORT_CHUNK_ROWS):
+        os.makedirs(directory, exist_ok=True)
+        name = time.strftime("grupos-membros-%Y%m%d-%H%M%S") + EXPORT_FORMATS[fmt]
+        return cls(os.path.join(directory, name), fmt, tenant_id, chunk_rows)
+
+    @classmethod
+    def resume(cls, checkpoint_path, tenant_id, chunk_rows=EXPORT_CHUNK_ROWS):
+        """Continuar uma exportação interrompida; levanta PermissionError se ela for de outro tenant"""
+        with open(checkpoint_path, encoding='utf-8') as checkpoint:
+            state = json.load(checkpoint)
+        if state.get('tenant_id') != tenant_id:
+            raise PermissionError("A exportação interrompida pertence a outro tenant")
+        return cls(checkpoint_path[:-len(CHECKPOINT_SUFFIX)], state['format'], tenant_id, chunk_rows, state)
+
+    def _save_checkpoint(self, writer):
+        self.state['position'] = writer.position()
+        temporary = self.checkpoint_path + ".tmp"
+        with open(temporary, 'w', encoding='utf-8') as checkpoint:
+            json.dump(self.state, checkpoint)
+        os.replace(temporary, self.checkpoint_path)
+
+    def _record_failure(self, group, error):
+        self.state.setdefault('failed', []).append({
+            'group_id': group.get('id') or '',
+            'group_name': group.get('displayName') or '',
+            'error': str(error)
+        })
+
+    def run(self, access_token, progress=None):
+        """Executar (ou continuar) a exportação; retorna o caminho do arquivo pronto
+
+        As primeiras páginas de membros de até BATCH_SIZE grupos vêm em uma
+        chamada /$batch; as seguintes, pelos nextLink. `progress(state)` é
+        chamado durante a leitura. Erros do Graph que não sejam de um grupo
+        específico são propagados com o ponto de retomada já salvo.
+        """
+        state = self.state
+        writer = WRITERS[self.format](self.path, state['position'])
+        buffer = []
+        last_progress = [0.0]
+
+        def page_done():
+            # Só grava em fronteiras de página, para o ponto de retomada ser exato
+            if len(buffer) >= self.chunk_rows:
+                writer.write(buffer)
+                buffer.clear()
+                self._save_checkpoint(writer)
+            if progress is not None and time.monotonic() - last_progress[0] >= PROGRESS_INTERVAL:
+                last_progress[0] = time.monotonic()
+                progress(state)
+
+        try:
+            if state['position'] is None:
+                self._save_checkpoint(writer)
+            while state['groups_link']:
+                groups_page = get_graph_json(access_token, state['groups_link'])
+                groups = groups_page.get('value', [])
+                while state['group_offset'] < len(groups):
+                    first = state['group_offset']
+                    window = list(enumerate(groups[first:first + BATCH_SIZE], first))
+                    resumed_link = state['members_link']
+                    endpoints = {
+                        index: with_query(f"/groups/{group.get('id')}/members",
+                                          top=EXPORT_PAGE_SIZE, select=MEMBER_FIELDS)
+                        for index, group in window if not (index == first and resumed_link)
+                    }
+                    pages, errors = get_pages_batch(access_token, endpoints) if endpoints else ({}, {})
+                    for index, error in errors.items():
+                        if not skippable(error.status):
+                            raise requests.RequestException(
+                                f"Membros do grupo {groups[index].get('id')}: {error}")
+                    for index, group in window:
+                        link = resumed_link if index == first else None
+                        if index in errors:
+                            self._record_failure(group, errors[index])
+                        else:
+                            try:
+                                page = get_graph_json(access_token, link) if link else pages[index]
+                                while True:
+                                    rows = export_rows(group, page.get('value', []))
+                                    if not rows and not link:
+                                        rows = [empty_group_row(group)]
+                                    buffer.extend(rows)
+                                    state['rows'] += len(rows)
+                                    link = page.get('@odata.nextLink')
+                                    if not link:
+                                        break
+                                    state['members_link'] = link
+                                    page_done()
+                                    page = get_graph_json(access_token, link)
+                            except requests.HTTPError as error:
+                                if error.response is None or not skippable(error.response.status_code):
+                                    raise
+                                self._record_failure(group, error)
+                        # Liberar a página do lote assim que o grupo termina
+                        pages.pop(index, None)
+                        state['group_offset'] = index + 1
+                        state['members_link'] = None
+                        state['groups'] += 1
+                        page_done()
+                state['groups_link'] = groups_page.get('@odata.nextLink')
+                state['group_offset'] = 0
+            if buffer:
+                writer.write(buffer)
+            writer.finish()
+        finally:
+            writer.close()
+        os.remove(self.checkpoint_path)
+        return self.path
+
+
+def pending_exports(tenant_id, directory=EXPORT_DIR):
+    """Exportações interrompidas do tenant: [(caminho do checkpoint, estado)], da mais recente à mais antiga"""
+    pending = []
+    for checkpoint_path in glob.glob(os.path.join(directory, "*" + CHECKPOINT_SUFFIX)):
+        try:
+            with open(checkpoint_path, encoding='utf-8') as checkpoint:
+                state = json.load(checkpoint)
+        except (OSError, ValueError):
+            continue
+        if state.get('tenant_id') == tenant_id:
+            pending.append((checkpoint_path, state))
+    return sorted(pending, key=lambda item: item[1].get('started_at', 0), reverse=True)
+
+
+def discard_export(checkpoint_path):
+    """Apagar uma exportação interrompida (arquivo parcial, partes e checkpoint)"""
+    output = checkpoint_path[:-len(CHECKPOINT_SUFFIX)]
+    for path in (output, checkpoint_path):
+        if os.path.exists(path):
+            os.remove(path)
+    shutil.rmtree(output + ".parts", ignore_errors=True)
@@ -0,0 +1,130 @@
+import threading
+from collections import deque
+
+
+class GroupGraph:
+    """Grafo de contenção entre grupos com os papéis herdados já resolvidos
+
+    Guarda as arestas filho -> pais (um grupo membro de outro grupo) e, para
+    cada grupo, uma máscara de bits com os papéis concedidos por ele ou por
+    qualquer grupo que o contenha, direta ou indiretamente. A máscara é o
+    fecho transitivo projetado nos papéis: responder se um grupo concede um
+    papel é uma consulta de dicionário.
+
+    Alterações de arestas ou de papéis próprios recalculam apenas os grupos
+    afetados (os alterados e seus descendentes), por propagação até um ponto
+    fixo, o que também trata ciclos: papéis nunca surgem só por causa do ciclo.
+    """
+
+    def __init__(self, roles=()):
+        self.roles = tuple(roles)
+        self.version = 0
+        self._parents = {}
+        self._children = {}
+        self._own = {}
+        self._masks = {}
+        self._lock = threading.RLock()
+
+    def role_bit(self, role):
+        return 1 << self.roles.index(role) if role in self.roles else 0
+
+    def update(self, added=(), removed=(), own_masks=None, removed_groups=()):
+        """Aplicar alterações e recalcular só os grupos afetados
+
+        `added` e `removed` são pares (filho, pai); `own_masks` é {grupo: máscara}
+        com os papéis concedidos diretamente pelo grupo; `removed_groups` são
+        grupos excluídos do diretório. Retorna o número de grupos recalculados.
+        """
+        with self._lock:
+            changed = set()
+            for group_id in removed_groups:
+                changed.update(self._children.get(group_id, ()))
+                for parent in self._parents.pop(group_id, ()):
+                    self._children.get(parent, set()).discard(group_id)
+                for child in self._children.pop(group_id, ()):
+                    self._parents.get(child, set()).discard(group_id)
+                self._own.pop(group_id, None)
+                self._masks.pop(group_id, None)
+            for child, parent in removed:
+                self._parents.get(child, set()).discard(parent)
+                self._children.get(parent, set()).discard(child)
+                changed.add(child)
+            for child, parent in added:
+                if child == parent:
+                    continue
+                self._parents.setdefault(child, set()).add(parent)
+                self._children.setdefault(parent, set()).add(child)
+                changed.add(child)
+            for group_id, mask in (own_masks or {}).items():
+                if self._own.get(group_id, 0) != mask:
+                    if mask:
+                        self._own[group_id] = mask
+                    else:
+                        self._own.pop(group_id, None)
+                    changed.add(group_id)
+            affected = self._descendants(changed)
+            self._recompute(affected)
+            self.version += 1
+            return len(affected)
+
+    def _descendants(self, roots):
+        seen = set(roots)
+        queue = deque(roots)
+        while queue:
+            for child in self._children.get(queue.popleft(), ()):
+                if child not in seen:
+                    seen.add(child)
+                    queue.append(child)
+        return seen
+
+    def _mask_from_parents(self, group_id, skip=()):
+        mask = self._own.get(group_id, 0)
+        for parent in self._parents.get(group_id, ()):
+            if parent not in skip:
+                mask |= self._masks.get(parent, 0)
+        return mask
+
+    def _recompute(self, affected):
+        masks = self._masks
+        # Ponto de partida: papéis próprios e de pais fora da área afetada
+        for group_id in affected:
+            mask = self._mask_from_parents(group_id, skip=affected)
+            if mask:
+                masks[group_id] = mask
+            else:
+                masks.pop(group_id, None)
+        # Propagar pelos pais afetados até estabilizar (máscaras só crescem)
+        queue = deque(affected)
+        queued = set(affected)
+        while queue:
+            group_id = queue.popleft()
+            queued.discard(group_id)
+            mask = self._mask_from_parents(group_id)
+            if mask != masks.get(group_id, 0):
+                masks[group_id] = mask
+                for child in self._children.get(group_id, ()):
+                    if child in affected and child not in queued:
+                        queued.add(child)
+                        queue.append(child)
+
+    def mask_for(self, group_ids):
+        with self._lock:
+            masks = self._masks
+            mask = 0
+            for group_id in group_ids:
+                mask |= masks.get(group_id, 0)
+            return mask
+
+    def effective_roles(self, group_ids):
+        """Papéis concedidos aos membros diretos de `group_ids`, incluindo herança"""
+        mask = self.mask_for(group_ids)
+        return [role for position, role in enumerate(self.roles) if mask >> position & 1]
+
+    def stats(self):
+        with self._lock:
+            return {
+                'groups_with_parents': len(self._parents),
+                'edges': sum(len(parents) for parents in self._parents.values()),
+                'groups_with_roles': len(self._masks),
+                'version': self.version
+            }
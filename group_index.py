@@ -0,0 +1,178 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+# Tipos de grupo, na ordem dos códigos guardados em GroupIndex.kinds
+KIND_LABELS = ('Segurança', 'Microsoft 365')
+# Buscas recentes memorizadas por índice (o índice muda a cada snapshot)
+MAX_MEMOIZED_SEARCHES = 64
+# Tamanho dos n-gramas do índice invertido; buscas menores usam só o prefixo do nome
+NGRAM = 3
+
+_CODE_BITS = np.uint64(21)  # um code point Unicode cabe em 21 bits
+
+
+def group_kind(group):
+    return 1 if 'Unified' in (group.get('groupTypes') or []) else 0
+
+
+def _ngram_codes(chars, n=NGRAM):
+    """Códigos inteiros de todos os n-gramas de um array de code points"""
+    count = len(chars) - n + 1
+    if count <= 0:
+        return np.zeros(0, dtype=np.uint64)
+    codes = chars[:count].copy()
+    for k in range(1, n):
+        codes = (codes << _CODE_BITS) | chars[k:count + k]
+    return codes
+
+
+def _code_points(text):
+    return np.frombuffer(text.encode('utf-32-le'), dtype=np.uint32).astype(np.uint64)
+
+
+class GroupIndex:
+    """Índice colunar e imutável de um snapshot do diretório de grupos
+
+    Os grupos ficam ordenados por nome em arrays NumPy (IDs, nomes, e-mails,
+    descrições e códigos de tipo). Buscas por prefixo usam searchsorted nos
+    nomes (e IDs) ordenados; buscas por trecho usam um índice invertido com
+    as posições de cada trigrama no texto formado por nome e e-mail de todos
+    os grupos.
+    Montar o índice custa algumas centenas de ms para dezenas de milhares
+    de grupos, por isso ele é criado uma vez por snapshot, na sincronização.
+    """
+
+    def __init__(self, groups, version=0):
+        self.version = version
+        groups = sorted(groups, key=lambda g: ((g.get('displayName') or '').lower(), g.get('id') or ''))
+        self.ids = np.array([g.get('id') or '' for g in groups], dtype=object)
+        self.names = np.array([g.get('displayName') or 'Sem nome' for g in groups], dtype=object)
+        self.mails = np.array([g.get('mail') or '' for g in groups], dtype=object)
+        self.descriptions = np.array([g.get('description') or '' for g in groups], dtype=object)
+        self.kinds = np.array([group_kind(g) for g in groups], dtype=np.int8)
+        self._lower_names = np.array([(g.get('displayName') or '').lower() for g in groups], dtype=object)
+        self._id_order = np.argsort(self.ids, kind='stable')
+        self._sorted_ids = self.ids[self._id_order]
+        self._rows_by_id = {group_id: row for row, group_id in enumerate(self.ids)}
+        self._lines = [f'{name}\t{mail.lower()}' for name, mail in zip(self._lower_names, self.mails)]
+        self._build_ngrams()
+        self._searches = OrderedDict()
+        self._searches_lock = threading.Lock()
+
+    def _build_ngrams(self):
+        # Uma linha por grupo, separadas por '\n'; o índice guarda posições no texto
+        text = '\n'.join(self._lines)
+        lengths = np.fromiter((len(line) + 1 for line in self._lines), dtype=np.int64,
+                              count=len(self._lines))
+        self._line_starts = np.concatenate(([0], np.cumsum(lengths)[:-1])) if len(lengths) else lengths
+        codes = _ngram_codes(_code_points(text))
+        # Ordenação estável: dentro de um trigrama, as posições ficam em ordem crescente
+        order = np.argsort(codes, kind='stable')
+        codes = codes[order]
+        starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]]) if len(codes) else np.zeros(0, np.int64)
+        self._gram_codes = codes[starts]
+        self._gram_starts = np.append(starts, len(codes))
+        self._gram_positions = order.astype(np.int32 if len(text) < 2 ** 31 else np.int64)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def row_of(self, group_id):
+        return self._rows_by_id.get(group_id)
+
+    def prefix_range(self, prefix):
+        """Intervalo [início, fim) das linhas cujo nome começa com `prefix`"""
+        prefix = prefix.lower()
+        start = int(np.searchsorted(self._lower_names, prefix, side='left'))
+        end = int(np.searchsorted(self._lower_names, prefix + '\U0010ffff', side='left'))
+        return start, end
+
+    def _id_prefix_rows(self, prefix):
+        start = np.searchsorted(self._sorted_ids, prefix, side='left')
+        end = np.searchsorted(self._sorted_ids, prefix + '\U0010ffff', side='left')
+        return np.sort(self._id_order[start:end])
+
+    def _postings(self, code):
+        slot = int(np.searchsorted(self._gram_codes, code))
+        if slot == len(self._gram_codes) or self._gram_codes[slot] != code:
+            return None
+        return self._gram_positions[self._gram_starts[slot]:self._gram_starts[slot + 1]]
+
+    def _substring_rows(self, term):
+        """Linhas cujo nome ou e-mail contém `term` (len(term) >= NGRAM)
+
+        Os trigramas nas posições 0, 3, 6, ... e o último cobrem a busca
+        inteira; o trecho ocorre onde todos aparecem no deslocamento certo,
+        então o resultado é exato sem conferir as linhas.
+        """
+        codes = _ngram_codes(_code_points(term))
+        offsets = sorted(set(range(0, len(codes), NGRAM)) | {len(codes) - 1})
+        postings = []
+        for offset in offsets:
+            positions = self._postings(codes[offset])
+            if positions is None:
+                return np.zeros(0, dtype=np.int64)
+            postings.append((positions, offset))
+        postings.sort(key=lambda item: len(item[0]))
+        positions, offset = postings[0]
+        matches = positions - offset
+        for positions, offset in postings[1:]:
+            if len(matches) == 0:
+                break
+            # Interseção de arrays ordenados via searchsorted
+            candidates = matches + offset
+            slots = np.minimum(np.searchsorted(positions, candidates), len(positions) - 1)
+            matches = matches[positions[slots] == candidates]
+        # As posições estão em ordem, então as linhas também: remover repetidas
+        rows = np.searchsorted(self._line_starts, matches, side='right') - 1
+        return rows[np.r_[True, rows[1:] != rows[:-1]]] if len(rows) else rows
+
+    def search(self, query='', kind=None):
+        """Linhas (em ordem de nome) que correspondem à busca
+
+        Nomes que começam com a busca vêm primeiro, seguidos de trechos do
+        nome ou do e-mail e de prefixos de ID. Buscas com menos de NGRAM
+        caracteres consideram apenas o início do nome. `kind` filtra pelo
+        código de tipo (índice em KIND_LABELS). O resultado é um array de
+        posições, memorizado por índice.
+        """
+        term = (query or '').strip().lower()
+        key = (term, kind)
+        with self._searches_lock:
+            cached = self._searches.get(key)
+            if cached is not None:
+                self._searches.move_to_end(key)
+                return cached
+
+        if not term:
+            rows = np.arange(len(self.ids))
+        else:
+            start, end = self.prefix_range(term)
+            rows = np.arange(start, end)
+            if len(term) >= NGRAM:
+                others = np.union1d(self._substring_rows(term), self._id_prefix_rows(term))
+                rows = np.concatenate((rows, others[(others < start) | (others >= end)]))
+        if kind is not None:
+            rows = rows[self.kinds[rows] == kind]
+
+        with self._searches_lock:
+            self._searches[key] = rows
+            while len(self._searches) > MAX_MEMOIZED_SEARCHES:
+                self._searches.popitem(last=False)
+        return rows
+
+    def labels(self, rows):
+        """Rótulos "nome (id)" apenas das linhas pedidas (ex.: a página visível)"""
+        return [f'{self.names[row]} ({self.ids[row]})' for row in rows]
+
+    def frame(self, rows):
+        """Tabela (Nome, ID, Descrição, Tipo) com as linhas pedidas"""
+        return pd.DataFrame({
+            'Nome': self.names[rows],
+            'ID': self.ids[rows],
+            'Descrição': self.descriptions[rows],
+            'Tipo': pd.Categorical.from_codes(self.kinds[rows], categories=KIND_LABELS)
+        })
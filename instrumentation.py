@@ -0,0 +1,190 @@
+import functools
+import json
+import re
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+# Limites (segundos) dos buckets dos histogramas exportados no formato Prometheus
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Amostras recentes mantidas por operação para calcular percentis
+MAX_SAMPLES = 1024
+
+SESSION_KEY = "perf_metrics"
+
+
+class Histogram:
+    """Histograma de durações: buckets cumulativos e janela de amostras recentes"""
+
+    def __init__(self, max_samples=MAX_SAMPLES):
+        self.bucket_counts = [0] * len(BUCKETS)
+        self.count = 0
+        self.total = 0.0
+        self.samples = deque(maxlen=max_samples)
+
+    def observe(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.samples.append(seconds)
+        for index, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                self.bucket_counts[index] += 1
+
+    def percentile(self, pct):
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'mean_ms': self.total / self.count * 1000 if self.count else 0.0,
+            'p50_ms': self.percentile(50) * 1000,
+            'p95_ms': self.percentile(95) * 1000,
+            'p99_ms': self.percentile(99) * 1000
+        }
+
+
+class MetricsRegistry:
+    """Conjunto de histogramas e contadores protegido por lock"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.histograms = {}
+        self.counters = {}
+
+    def observe(self, name, seconds):
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.observe(seconds)
+
+    def incr(self, name, value=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'operations': {name: h.summary() for name, h in sorted(self.histograms.items())},
+                'counters': dict(sorted(self.counters.items()))
+            }
+
+    def reset(self):
+        with self._lock:
+            self.histograms.clear()
+            self.counters.clear()
+
+
+process_metrics = MetricsRegistry()
+_collectors = []
+
+
+def register_collector(prefix, collect):
+    """Registrar uma função que devolve contadores extras (ex.: métricas do Graph)"""
+    _collectors.append((prefix, collect))
+
+
+def session_metrics():
+    """Registro da sessão atual, ou None fora de uma execução de script do Streamlit"""
+    if get_script_run_ctx(suppress_warning=True) is None:
+        return None
+    if SESSION_KEY not in st.session_state:
+        st.session_state[SESSION_KEY] = MetricsRegistry()
+    return st.session_state[SESSION_KEY]
+
+
+def observe(name, seconds):
+    process_metrics.observe(name, seconds)
+    registry = session_metrics()
+    if registry is not None:
+        registry.observe(name, seconds)
+
+
+def incr(name, value=1):
+    process_metrics.incr(name, value)
+    registry = session_metrics()
+    if registry is not None:
+        registry.incr(name, value)
+
+
+@contextmanager
+def span(name):
+    """Medir a duração do bloco e registrá-la na sessão e no processo"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start)
+
+
+def timed(name):
+    """Decorator que mede cada chamada da função com span(name)"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+_ID_SEGMENT = re.compile(r'^(?=.*\d)[0-9A-Za-z-]{8,}$')
+
+
+def endpoint_label(endpoint):
+    """Normalizar um endpoint do Graph para uso como rótulo (sem IDs nem query)"""
+    path = re.sub(r'^https?://[^/]+(/v1\.0|/beta)?', '', endpoint).split('?')[0]
+    return '/'.join('{id}' if _ID_SEGMENT.match(part) else part for part in path.split('/'))
+
+
+def _collected_counters():
+    counters = {}
+    for prefix, collect in _collectors:
+        for name, value in collect().items():
+            counters[f'{prefix}_{name}'] = value
+    return counters
+
+
+def export_json(registry=None):
+    snapshot = (registry or process_metrics).snapshot()
+    if registry is None:
+        snapshot['counters'].update(_collected_counters())
+    return json.dumps(snapshot, indent=2, ensure_ascii=False)
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"')
+
+
+def export_prometheus():
+    """Métricas do processo no formato texto de exposição do Prometheus"""
+    lines = [
+        '# HELP app_operation_duration_seconds Duração das operações instrumentadas.',
+        '# TYPE app_operation_duration_seconds histogram'
+    ]
+    with process_metrics._lock:
+        histograms = [(name, list(h.bucket_counts), h.count, h.total)
+                      for name, h in sorted(process_metrics.histograms.items())]
+        counters = dict(process_metrics.counters)
+    for name, bucket_counts, count, total in histograms:
+        label = _escape(name)
+        for bound, bucket_count in zip(BUCKETS, bucket_counts):
+            lines.append(f'app_operation_duration_seconds_bucket{{operation="{label}",le="{bound}"}} {bucket_count}')
+        lines.append(f'app_operation_duration_seconds_bucket{{operation="{label}",le="+Inf"}} {count}')
+        lines.append(f'app_operation_duration_seconds_sum{{operation="{label}"}} {total}')
+        lines.append(f'app_operation_duration_seconds_count{{operation="{label}"}} {count}')
+
+    counters.update(_collected_counters())
+    if counters:
+        lines.append('# HELP app_events_total Contadores de eventos da aplicação.')
+        lines.append('# TYPE app_events_total counter')
+        for name, value in sorted(counters.items()):
+            lines.append(f'app_events_total{{name="{_escape(name)}"}} {value}')
+    return '\n'.join(lines) + '\n'
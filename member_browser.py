@@ -0,0 +1,117 @@
+from collections import OrderedDict
+
+from graph_client import make_graph_request, with_query
+
+# Membros por página da tabela e campos pedidos ao Graph ($select)
+MEMBER_PAGE_SIZE = 100
+MEMBER_FIELDS = ['id', 'displayName', 'userPrincipalName']
+# Páginas visitadas mantidas em memória por grupo (as mais antigas são descartadas)
+MAX_CACHED_PAGES = 20
+
+# $search e $count em membros exigem consultas avançadas do Graph
+ADVANCED_QUERY_HEADERS = {'ConsistencyLevel': 'eventual'}
+
+SESSION_KEY = "member_browser"
+
+
+def members_endpoint(group_id, search=None, page_size=MEMBER_PAGE_SIZE):
+    """Primeira página de membros do grupo, com total ($count) e busca opcional"""
+    params = {'count': 'true'}
+    term = (search or '').strip().replace('"', '')
+    if term:
+        params['search'] = f'"displayName:{term}" OR "userPrincipalName:{term}"'
+    return with_query(f'/groups/{group_id}/members', top=page_size, select=MEMBER_FIELDS, **params)
+
+
+def members_frame(members):
+    """Tabela colunar (Nome, Email, Tipo) com uma página de membros"""
+    # Import tardio: pandas só é carregado quando alguém abre uma lista de membros
+    import pandas as pd
+    return pd.DataFrame({
+        'Nome': pd.array([m.get('displayName') or 'N/A' for m in members], dtype='string'),
+        'Email': pd.array([m.get('userPrincipalName') or 'N/A' for m in members], dtype='string'),
+        'Tipo': pd.Categorical([
+            (m.get('@odata.type') or 'N/A').replace('#microsoft.graph.', '') for m in members
+        ])
+    })
+
+
+class MemberPages:
+    """Navegador paginado dos membros de um grupo
+
+    O Graph só pagina para frente (@odata.nextLink), então os links de cada
+    página já alcançada são guardados para permitir voltar e reabrir páginas.
+    Apenas as últimas MAX_CACHED_PAGES páginas visitadas ficam em memória,
+    como DataFrames; as demais são buscadas de novo pelo link guardado.
+    """
+
+    def __init__(self, group_id, search=None, page_size=MEMBER_PAGE_SIZE, max_pages=MAX_CACHED_PAGES):
+        self.group_id = group_id
+        self.search = search or ''
+        self.page_size = page_size
+        self.max_pages = max_pages
+        self.total = None
+        self._links = [members_endpoint(group_id, search, page_size)]
+        self._pages = OrderedDict()
+
+    def matches(self, group_id, search):
+        return self.group_id == group_id and self.search == (search or '')
+
+    @property
+    def page_count(self):
+        """Número de páginas, se o Graph informou o total; senão, as conhecidas até agora"""
+        if self.total is not None:
+            return max(1, -(-self.total // self.page_size))
+        return len(self._links)
+
+    def has_next(self, index):
+        if self.total is not None:
+            return index + 1 < self.page_count
+        return index + 1 < len(self._links)
+
+    def page(self, access_token, index):
+        """DataFrame da página `index`, buscando no Graph as páginas ainda não alcançadas
+
+        Retorna None se a página não existir ou se a chamada ao Graph falhar.
+        """
+        if index in self._pages:
+            self._pages.move_to_end(index)
+            return self._pages[index]
+        # Alcançar a página seguindo os nextLink a partir da última conhecida
+        position = min(index, len(self._links) - 1)
+        while position < index:
+            if position not in self._pages and self._fetch(access_token, position) is None:
+                return None
+            if position + 1 >= len(self._links):
+                # A coleção terminou antes da página pedida
+                return None
+            position += 1
+        return self._fetch(access_token, index)
+
+    def _fetch(self, access_token, index):
+        result = make_graph_request(access_token, self._links[index], headers=ADVANCED_QUERY_HEADERS)
+        if result is None:
+            return None
+        if '@odata.count' in result:
+            self.total = result['@odata.count']
+        next_link = result.get('@odata.nextLink')
+        if next_link and index + 1 == len(self._links):
+            self._links.append(next_link)
+        frame = members_frame(result.get('value', []))
+        self._pages[index] = frame
+        while len(self._pages) > self.max_pages:
+            self._pages.popitem(last=False)
+        return frame
+
+
+def get_member_pages(session_state, group_id, search=None):
+    """Navegador de membros da sessão para o grupo e busca atuais
+
+    Trocar de grupo ou de busca descarta as páginas anteriores.
+    """
+    browser = session_state.get(SESSION_KEY)
+    if browser is None or not browser.matches(group_id, search):
+        browser = MemberPages(group_id, search)
+        session_state[SESSION_KEY] = browser
+        session_state["members_page"] = 0
+    return browser
@@ -0,0 +1,302 @@
+import base64
+import json
+import threading
+from collections import OrderedDict
+
+import msal
+import requests
+import streamlit as st
+
+from instrumentation import register_collector, timed
+
+# Host padrão do Azure AD; com outro host (ex.: o IdP simulado dos benchmarks) não há descoberta de instância
+AUTHORITY_HOST = "https://login.microsoftonline.com"
+
+# Limite de tenants com aplicação MSAL, cache de tokens e diretório de grupos no processo
+MAX_TENANTS = 50
+
+# Configuração do Azure AD
+class MSALConfig:
+    def __init__(self):
+        self.CLIENT_ID = st.secrets["oauth"]["client_id"]
+        self.CLIENT_SECRET = st.secrets["oauth"]["client_secret"]
+        # Tenant padrão: usado quando o login não indica outro
+        self.TENANT_ID = st.secrets["oauth"]["tenant_id"]
+        # Outros tenants por domínio de e-mail ([oauth.tenants]: "empresa.com" = "<tenant id>")
+        self.TENANTS = {
+            domain.lower(): tenant_id for domain, tenant_id in st.secrets["oauth"].get("tenants", {}).items()
+        }
+        self.TENANT_IDS = {self.TENANT_ID, *self.TENANTS.values()}
+        self.MAX_TENANTS = int(st.secrets["oauth"].get("max_tenants", MAX_TENANTS))
+        self.AUTHORITY_HOST = st.secrets["oauth"].get("authority_host", AUTHORITY_HOST).rstrip("/")
+        self.AUTHORITY = self.authority(self.TENANT_ID)
+        self.REDIRECT_URI = st.secrets["oauth"].get(
+            "redirect_uri", st.secrets["oauth"].get("REDIRECT_URI", "https://5015d77f4d00.ngrok-free.app"))
+        self.SCOPE = ["User.Read", "Group.Read.All", "GroupMember.Read.All"]
+        # Renovar tokens em segundo plano quando faltar menos que isso (segundos) para expirar
+        self.REFRESH_WINDOW = int(st.secrets["oauth"].get("refresh_window", 300))
+
+    def authority(self, tenant_id):
+        return f"{self.AUTHORITY_HOST}/{tenant_id}"
+
+# Limite de contas mantidas no cache de tokens do processo
+MAX_CACHED_ACCOUNTS = 1000
+
+
+class BoundedTokenCache(msal.TokenCache):
+    """Cache de tokens em memória de um tenant, compartilhado pelo processo e limitado por conta (LRU)"""
+
+    def __init__(self, max_accounts=MAX_CACHED_ACCOUNTS):
+        super().__init__()
+        self.max_accounts = max_accounts
+        self._accounts = OrderedDict()
+        self._accounts_lock = threading.Lock()
+
+    def touch(self, home_account_id):
+        """Marcar a conta como usada recentemente e remover as mais antigas se passar do limite"""
+        if not home_account_id:
+            return
+        with self._accounts_lock:
+            self._accounts[home_account_id] = True
+            self._accounts.move_to_end(home_account_id)
+            evicted = []
+            while len(self._accounts) > self.max_accounts:
+                evicted.append(self._accounts.popitem(last=False)[0])
+        for account_id in evicted:
+            self.remove_account_entries(account_id)
+
+    def _account_credential_types(self):
+        return (
+            self.CredentialType.ACCESS_TOKEN,
+            self.CredentialType.REFRESH_TOKEN,
+            self.CredentialType.ID_TOKEN,
+            self.CredentialType.ACCOUNT,
+        )
+
+    def remove_account_entries(self, home_account_id):
+        """Remover todos os tokens e a conta associados a um home_account_id"""
+        with self._accounts_lock:
+            self._accounts.pop(home_account_id, None)
+        query = {"home_account_id": home_account_id}
+        for credential_type in self._account_credential_types():
+            for entry in self.find(credential_type, query=query):
+                self.modify(credential_type, entry)
+
+    def export_account(self, home_account_id):
+        """Entradas (tokens e conta) de um home_account_id, para persistir a sessão"""
+        query = {"home_account_id": home_account_id}
+        return {
+            credential_type: self.find(credential_type, query=query)
+            for credential_type in self._account_credential_types()
+        }
+
+    def import_account(self, home_account_id, entries):
+        """Restaurar entradas exportadas por export_account (ex.: após reinício do processo)"""
+        with self._lock:
+            for credential_type, items in entries.items():
+                bucket = self._cache.setdefault(credential_type, {})
+                for entry in items:
+                    bucket[self.key_makers[credential_type](**entry)] = entry
+        self.touch(home_account_id)
+
+    def __len__(self):
+        with self._accounts_lock:
+            return len(self._accounts)
+
+
+class TenantClientPool:
+    """Aplicações MSAL por tenant, criadas sob demanda e limitadas (LRU)
+
+    Cada tenant tem a sua ConfidentialClientApplication (com a autoridade do
+    tenant) e o seu BoundedTokenCache: uma conta só encontra tokens emitidos
+    pelo tenant em que entrou. Todas compartilham a mesma sessão HTTP, e
+    portanto o pool de conexões com o Azure AD. Um tenant removido do pool
+    leva junto os seus tokens; as sessões dele precisam autenticar de novo.
+    """
+
+    def __init__(self, config, max_tenants=MAX_TENANTS):
+        self.config = config
+        self.max_tenants = max_tenants
+        self._clients = OrderedDict()
+        self._lock = threading.Lock()
+        self._http_client = requests.Session()
+        self.created = 0
+        self.evicted = 0
+
+    def _create(self, tenant_id):
+        cache = BoundedTokenCache()
+        app = msal.ConfidentialClientApplication(
+            client_id=self.config.CLIENT_ID,
+            client_credential=self.config.CLIENT_SECRET,
+            authority=self.config.authority(tenant_id),
+            instance_discovery=self.config.AUTHORITY_HOST == AUTHORITY_HOST,
+            token_cache=cache,
+            http_client=self._http_client
+        )
+        return app, cache
+
+    def get(self, tenant_id):
+        """(aplicação MSAL, cache de tokens) do tenant"""
+        with self._lock:
+            client = self._clients.get(tenant_id)
+            if client is not None:
+                self._clients.move_to_end(tenant_id)
+                return client
+        # A descoberta da autoridade vai à rede: fora do lock, para não bloquear os outros tenants
+        created = self._create(tenant_id)
+        with self._lock:
+            client = self._clients.get(tenant_id)
+            if client is None:
+                client = self._clients[tenant_id] = created
+                self.created += 1
+                while len(self._clients) > self.max_tenants:
+                    self._clients.popitem(last=False)
+                    self.evicted += 1
+            return client
+
+    def stats(self):
+        with self._lock:
+            caches = [cache for _, cache in self._clients.values()]
+        return {
+            'tenants': len(caches),
+            'accounts': sum(len(cache) for cache in caches),
+            'created': self.created,
+            'evicted': self.evicted
+        }
+
+
+_pool_lock = threading.Lock()
+_pool = None
+_config = None
+
+
+def get_config():
+    """Obter a configuração do MSAL (lida de st.secrets uma única vez por processo)"""
+    global _config
+    if _config is None:
+        _config = MSALConfig()
+    return _config
+
+
+def get_client_pool():
+    """Obter o pool de aplicações MSAL por tenant do processo"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                config = get_config()
+                _pool = TenantClientPool(config, config.MAX_TENANTS)
+                register_collector('msal', _pool.stats)
+    return _pool
+
+
+def get_msal_app(tenant_id=None):
+    """Obter a ConfidentialClientApplication do tenant (por padrão, o tenant configurado)"""
+    return get_client_pool().get(tenant_id or get_config().TENANT_ID)[0]
+
+
+def get_token_cache(tenant_id=None):
+    return get_client_pool().get(tenant_id or get_config().TENANT_ID)[1]
+
+
+def tenant_for_login(login_hint=None):
+    """Tenant de um login pelo domínio do e-mail (ou o domínio informado); sem correspondência, o padrão"""
+    config = get_config()
+    domain = (login_hint or "").rpartition("@")[2].strip().lower()
+    return config.TENANTS.get(domain, config.TENANT_ID)
+
+
+def account_key(tenant_id, home_account_id):
+    """Identificador da conta no processo: tenant do login e home_account_id
+
+    O home_account_id aponta o tenant de origem do usuário; um convidado
+    entra em outros tenants com o mesmo home_account_id, então o tenant do
+    login faz parte da chave (agendador de renovação e sessões salvas).
+    """
+    if not home_account_id:
+        return None
+    return f"{tenant_id}/{home_account_id}"
+
+
+def split_account_key(account_id):
+    """(tenant_id, home_account_id) de um identificador criado por account_key"""
+    tenant_id, _, home_account_id = account_id.rpartition("/")
+    return tenant_id or get_config().TENANT_ID, home_account_id
+
+
+def get_home_account_id(token_result):
+    """Extrair o home_account_id (uid.utid) de uma resposta de token"""
+    client_info = token_result.get("client_info")
+    if client_info:
+        try:
+            padded = client_info + "=" * (-len(client_info) % 4)
+            info = json.loads(base64.urlsafe_b64decode(padded))
+            return f"{info['uid']}.{info['utid']}"
+        except (ValueError, KeyError):
+            pass
+    claims = token_result.get("id_token_claims") or {}
+    if claims.get("oid") and claims.get("tid"):
+        return f"{claims['oid']}.{claims['tid']}"
+    return None
+
+
+@timed("msal.acquire_token_by_code")
+def acquire_token_by_code(auth_code, tenant_id=None):
+    """Trocar o código de autorização por tokens, registrando a conta no cache do tenant"""
+    config = get_config()
+    app, cache = get_client_pool().get(tenant_id or config.TENANT_ID)
+    result = app.acquire_token_by_authorization_code(
+        code=auth_code,
+        scopes=config.SCOPE,
+        redirect_uri=config.REDIRECT_URI
+    )
+    if "access_token" in result:
+        cache.touch(get_home_account_id(result))
+    return result
+
+
+@timed("msal.acquire_token_silent")
+def acquire_token_silent(account_id, force_refresh=False):
+    """Obter um token do cache (renovando via refresh token se necessário) sem interação
+
+    `account_id` vem de account_key. Com force_refresh=True, ignora o access
+    token em cache e usa o refresh token.
+    """
+    if not account_id:
+        return None
+    tenant_id, home_account_id = split_account_key(account_id)
+    app, cache = get_client_pool().get(tenant_id)
+    accounts = cache.find(
+        msal.TokenCache.CredentialType.ACCOUNT,
+        query={"home_account_id": home_account_id}
+    )
+    if not accounts:
+        return None
+    result = app.acquire_token_silent(
+        get_config().SCOPE, account=accounts[0], force_refresh=force_refresh)
+    if result and "access_token" in result:
+        cache.touch(home_account_id)
+        return result
+    return None
+
+
+# Escopo para tokens de aplicação (client credentials) no Microsoft Graph
+APP_SCOPE = ["https://graph.microsoft.com/.default"]
+
+
+@timed("msal.acquire_token_for_client")
+def acquire_app_token(tenant_id=None):
+    """Obter um token da própria aplicação (sem usuário) no tenant, para tarefas de fundo
+
+    Requer permissões de aplicação (ex.: Group.Read.All) com consentimento do
+    administrador do tenant. Retorna None se o token não puder ser obtido.
+    """
+    result = get_msal_app(tenant_id).acquire_token_for_client(scopes=APP_SCOPE)
+    return result.get("access_token") if result else None
+
+
+def remove_account(account_id):
+    """Remover a conta do cache de tokens do seu tenant (logout)"""
+    if account_id:
+        tenant_id, home_account_id = split_account_key(account_id)
+        get_token_cache(tenant_id).remove_account_entries(home_account_id)
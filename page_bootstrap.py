@@ -0,0 +1,28 @@
+import streamlit as st
+
+from auth_utils import require_admin, require_auth, require_manager_or_admin, require_permission, show_user_info
+
+# Verificações de acesso disponíveis para as páginas (ver setup_page)
+ACCESS_CHECKS = {
+    'auth': require_auth,
+    'admin': require_admin,
+    'manager': require_manager_or_admin,
+}
+
+
+def setup_page(page_title, page_icon, access='auth'):
+    """Preparar uma página de `pages/`: configuração, verificação de acesso e barra lateral
+
+    `access` é 'auth', 'admin', 'manager' ou o nome de uma página de
+    `pages_access` (ex.: 'dashboard'). As páginas não precisam alterar
+    sys.path: o Streamlit já coloca a pasta do app.py no caminho de imports.
+    A configuração vem antes da verificação porque st.set_page_config precisa
+    ser o primeiro comando da execução, e a verificação pode exibir um erro.
+    """
+    st.set_page_config(page_title=page_title, page_icon=page_icon)
+    check = ACCESS_CHECKS.get(access)
+    if check is not None:
+        check()
+    else:
+        require_permission(access)
+    show_user_info()
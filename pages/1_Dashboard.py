@@ -1,48 +1,75 @@
 import streamlit as st
-import sys
-import os
 
-# Adicionar o diretório pai ao path para importar auth_utils
-sys.path.append(os.path.dirname(os.path.dirname(__file__)))
-from auth_utils import require_permission, show_user_info
+from auth_utils import get_user_role
+from instrumentation import span
+from page_bootstrap import setup_page
+from report_engine import get_report_engine, report_scope
 
-# Verificar permissões
-require_permission("dashboard")
 
-# Interface da página
-st.set_page_config(page_title="Dashboard", page_icon="📊")
-show_user_info()
+@st.cache_data
+def monthly_sales():
+    """Dados fictícios do gráfico, exibidos sem arquivos de vendas ou sem escopo de relatório"""
+    import numpy as np
+    import pandas as pd
+    return pd.DataFrame({
+        'Mês': ['Jan', 'Fev', 'Mar', 'Abr', 'Mai', 'Jun'],
+        'Vendas': np.random.randint(10000, 50000, 6)
+    }).set_index('Mês')
 
-st.title("📊 Dashboard")
-st.write("Bem-vindo ao dashboard! Esta página é acessível para todos os usuários autenticados.")
-
-# Métricas fictícias
-col1, col2, col3, col4 = st.columns(4)
-
-with col1:
-    st.metric("Usuários Ativos", "1,234", "12%")
 
-with col2:
-    st.metric("Vendas", "R$ 45,678", "5%")
+# Configurar a página e verificar permissões
+setup_page("Dashboard", "📊", access="dashboard")
 
-with col3:
-    st.metric("Produtos", "89", "-2%")
-
-with col4:
-    st.metric("Satisfação", "98%", "1%")
-
-# Gráfico simples
-st.subheader("Vendas por Mês")
+st.title("📊 Dashboard")
+st.write("Bem-vindo ao dashboard! Esta página é acessível para todos os usuários autenticados.")
 
-import pandas as pd
-import numpy as np
+def growth(value):
+    return None if value is None else f"{value:.0f}%"
 
-# Dados fictícios
-data = pd.DataFrame({
-    'Mês': ['Jan', 'Fev', 'Mar', 'Abr', 'Mai', 'Jun'],
-    'Vendas': np.random.randint(10000, 50000, 6)
-})
 
-st.line_chart(data.set_index('Mês'))
+# Métricas e gráfico a partir dos rollups (já agregados), no escopo do papel do usuário
+engine = get_report_engine()
+scope = report_scope(get_user_role(), st.session_state.get("user_email"))
 
-st.info("ℹ️ Esta é uma página básica acessível a todos os usuários autenticados.")
\ No newline at end of file
+if engine.has_data() and scope != ():
+    totals = engine.report('totals', scope)
+    margin = totals['profit'] / totals['amount'] * 100 if totals['amount'] else 0.0
+    col1, col2, col3, col4 = st.columns(4)
+    
+    with col1:
+        st.metric("Vendas", f"R$ {totals['amount']:,.0f}", growth(totals['growth']['amount']))
+    
+    with col2:
+        st.metric("Lucro", f"R$ {totals['profit']:,.0f}", growth(totals['growth']['profit']))
+    
+    with col3:
+        st.metric("Produtos", totals['products'])
+    
+    with col4:
+        st.metric("Margem", f"{margin:.1f}%")
+    
+    st.subheader("Vendas por Mês")
+    
+    with span("page.dashboard.render.chart"):
+        st.line_chart(engine.report('monthly', scope)[['Vendas']])
+else:
+    # Métricas fictícias
+    col1, col2, col3, col4 = st.columns(4)
+    
+    with col1:
+        st.metric("Usuários Ativos", "1,234", "12%")
+    
+    with col2:
+        st.metric("Vendas", "R$ 45,678", "5%")
+    
+    with col3:
+        st.metric("Produtos", "89", "-2%")
+    
+    with col4:
+        st.metric("Satisfação", "98%", "1%")
+    
+    # Gráfico simples
+    st.subheader("Vendas por Mês")
+    
+    with span("page.dashboard.render.chart"):
+        st.line_chart(monthly_sales())
@@ -1,17 +1,27 @@
 import streamlit as st
-import sys
-import os
 
-# Adicionar o diretório pai ao path para importar auth_utils
-sys.path.append(os.path.dirname(os.path.dirname(__file__)))
-from auth_utils import require_manager_or_admin, show_user_info, get_user_role
+from auth_utils import get_user_role
+from instrumentation import span
+from page_bootstrap import setup_page
+from report_engine import ALL_DEPARTMENTS, get_report_engine, report_scope
 
-# Verificar permissões (apenas gerentes e admins)
-require_manager_or_admin()
 
-# Interface da página
-st.set_page_config(page_title="Relatórios", page_icon="📈")
-show_user_info()
+@st.cache_data
+def sales_table():
+    """Dados fictícios de vendas, exibidos enquanto não há arquivos em [reports] path"""
+    import numpy as np
+    import pandas as pd
+    rng = np.random.RandomState(42)
+    return pd.DataFrame({
+        'Produto': ['Produto A', 'Produto B', 'Produto C', 'Produto D', 'Produto E'],
+        'Vendas': rng.randint(1000, 10000, 5),
+        'Lucro': rng.randint(100, 1000, 5),
+        'Margem (%)': rng.randint(10, 30, 5)
+    })
+
+
+# Configurar a página e verificar permissões (apenas gerentes e admins)
+setup_page("Relatórios", "📈", access="manager")
 
 st.title("📈 Relatórios Gerenciais")
 st.write("Esta página é restrita a gerentes e administradores.")
@@ -58,21 +68,38 @@ elif user_role == "manager":
         st.write("- Metas e objetivos")
         st.write("- Performance da equipe")
 
-# Tabela de dados fictícios
 st.subheader("Dados de Vendas")
 
-import pandas as pd
-import numpy as np
+# Rollups pré-calculados, filtrados pelos departamentos que o papel enxerga
+engine = get_report_engine()
+scope = report_scope(user_role, st.session_state.get("user_email"))
 
-# Gerar dados fictícios
-np.random.seed(42)
-data = pd.DataFrame({
-    'Produto': ['Produto A', 'Produto B', 'Produto C', 'Produto D', 'Produto E'],
-    'Vendas': np.random.randint(1000, 10000, 5),
-    'Lucro': np.random.randint(100, 1000, 5),
-    'Margem (%)': np.random.randint(10, 30, 5)
-})
-
-st.dataframe(data, use_container_width=True)
+if engine.has_data() and scope != ():
+    months = engine.months()
+    col_period, col_departments = st.columns(2)
+    with col_period:
+        period = None
+        if len(months) > 1:
+            period = st.select_slider("Período", options=months, value=(months[0], months[-1]),
+                                      key="reports_period")
+    with col_departments:
+        departments = st.multiselect("Departamentos", engine.departments(scope), key="reports_departments")
+    if scope is not ALL_DEPARTMENTS:
+        st.caption(f"Departamentos visíveis para você: {', '.join(scope)}")
+    
+    with span("page.reports.render.sales"):
+        st.dataframe(engine.report('by_product', scope, period, departments),
+                     use_container_width=True, hide_index=True)
+        if user_role == "admin":
+            st.write("**Por departamento:**")
+            st.dataframe(engine.report('by_department', scope, period, departments),
+                         use_container_width=True, hide_index=True)
+        st.line_chart(engine.report('monthly', scope, period, departments)[['Vendas', 'Lucro']])
+elif engine.has_data():
+    st.warning("⚠️ Nenhum departamento associado ao seu usuário em [reports.manager_departments].")
+else:
+    st.caption("Dados ilustrativos: configure `path` na seção [reports] com os arquivos de vendas.")
+    with span("page.reports.render.sales"):
+        st.dataframe(sales_table(), use_container_width=True)
 
 st.info(f"ℹ️ Você está visualizando como: {user_role.title()}")
\ No newline at end of file
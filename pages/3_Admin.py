@@ -1,17 +1,80 @@
-import streamlit as st
-import sys
+import datetime
 import os
+import tempfile
+
+import requests
+import streamlit as st
+
+from audit_log import ACTIONS, ADMIN_ACTION, CSV_HEADER, FAILURE, audit, date_window, get_audit_log
+from auth_utils import ensure_group_directory
+from graph_client import get_members_bulk, get_throttle_metrics
+from group_export import EXPORT_FORMATS, GroupExport, discard_export, pending_exports
+from instrumentation import export_json, export_prometheus, process_metrics, session_metrics, span
+from page_bootstrap import setup_page
+
+# Linhas exibidas na tabela de grupos (a busca filtra antes do corte)
+GROUP_TABLE_LIMIT = 1000
+# Eventos exibidos na aba de logs (a exportação inclui todos do período)
+AUDIT_TABLE_LIMIT = 1000
+
+
+@st.cache_data
+def registered_users():
+    """Lista fictícia de usuários (estática: montada uma vez por processo)"""
+    import pandas as pd
+    return pd.DataFrame({
+        'Nome': ['João Silva', 'Maria Santos', 'Pedro Oliveira'],
+        'Email': ['joao@empresa.com', 'maria@empresa.com', 'pedro@empresa.com'],
+        'Grupo': ['Administradores', 'Gerentes', 'Usuários'],
+        'Status': ['Ativo', 'Ativo', 'Inativo']
+    })
+
+
+def audit_frame(rows):
+    """Tabela da aba de logs a partir das linhas do AuditStore"""
+    import pandas as pd
+    return pd.DataFrame(
+        [(datetime.datetime.fromtimestamp(ts), user, action, status, detail)
+         for ts, user, action, status, detail in rows],
+        columns=list(CSV_HEADER)
+    )
+
+
+def export_audit_csv(store, start, end, user_filter, actions, tenant):
+    """Gravar o CSV dos eventos do tenant em um arquivo temporário, bloco a bloco (memória constante)"""
+    with tempfile.NamedTemporaryFile('w', suffix='.csv', newline='', encoding='utf-8', delete=False) as export:
+        for piece in store.iter_csv(start, end, user_filter, actions, tenant):
+            export.write(piece)
+    return export.name
+
+
+def run_group_export(export, access_token, total_groups=None):
+    """Executar a exportação com barra de progresso; retorna o caminho do arquivo ou None em erro"""
+    bar = st.progress(0.0, text="Exportando grupos e membros...")
+
+    def progress(state):
+        text = f"{state['groups']} grupos, {state['rows']} linhas gravadas"
+        bar.progress(min(state['groups'] / total_groups, 1.0) if total_groups else 0.0, text=text)
 
-# Adicionar o diretório pai ao path para importar auth_utils
-sys.path.append(os.path.dirname(os.path.dirname(__file__)))
-from auth_utils import require_admin, show_user_info
+    try:
+        path = export.run(access_token, progress)
+    except requests.RequestException as error:
+        bar.empty()
+        audit(ADMIN_ACTION, FAILURE, f"Exportar lista de grupos: {error}")
+        st.error(f"Exportação interrompida: {error}. Ela pode ser retomada abaixo.")
+        return None
+    bar.progress(1.0, text=f"{export.state['groups']} grupos, {export.state['rows']} linhas exportadas")
+    failed = export.state.get('failed') or []
+    audit(ADMIN_ACTION, detail=f"Exportar lista de grupos ({export.state['groups']} grupos, "
+                               f"{export.state['rows']} linhas, {len(failed)} com erro, {export.format})")
+    if failed:
+        st.warning(f"⚠️ {len(failed)} grupo(s) sem membros exportados (removidos ou sem acesso):")
+        st.dataframe(failed, use_container_width=True)
+    return path
 
-# Verificar permissões (apenas admins)
-require_admin()
 
-# Interface da página
-st.set_page_config(page_title="Administração", page_icon="⚙️")
-show_user_info()
+# Configurar a página e verificar permissões (apenas admins)
+setup_page("Administração", "⚙️", access="admin")
 
 st.title("⚙️ Painel de Administração")
 st.write("Esta página é exclusiva para administradores do sistema.")
@@ -19,7 +82,7 @@ st.write("Esta página é exclusiva para administradores do sistema.")
 st.error("🔴 ÁREA RESTRITA - APENAS ADMINISTRADORES")
 
 # Seções de administração
-tab1, tab2, tab3, tab4 = st.tabs(["👥 Usuários", "🏢 Grupos", "🔧 Sistema", "📊 Logs"])
+tab1, tab2, tab3, tab4, tab5 = st.tabs(["👥 Usuários", "🏢 Grupos", "🔧 Sistema", "📊 Logs", "⏱️ Performance"])
 
 with tab1:
     st.subheader("Gerenciamento de Usuários")
@@ -29,38 +92,52 @@ with tab1:
     
     with col1:
         if st.button("➕ Adicionar Usuário"):
+            audit(ADMIN_ACTION, detail="Adicionar usuário")
             st.success("Funcionalidade: Adicionar novo usuário")
     
     with col2:
         if st.button("✏️ Editar Usuário"):
+            audit(ADMIN_ACTION, detail="Editar usuário")
             st.success("Funcionalidade: Editar usuário existente")
     
     with col3:
         if st.button("🗑️ Remover Usuário"):
+            audit(ADMIN_ACTION, detail="Remover usuário")
             st.error("Funcionalidade: Remover usuário")
     
     # Lista fictícia de usuários
     st.write("**Usuários Registrados:**")
-    import pandas as pd
-    
-    users_data = pd.DataFrame({
-        'Nome': ['João Silva', 'Maria Santos', 'Pedro Oliveira'],
-        'Email': ['joao@empresa.com', 'maria@empresa.com', 'pedro@empresa.com'],
-        'Grupo': ['Administradores', 'Gerentes', 'Usuários'],
-        'Status': ['Ativo', 'Ativo', 'Inativo']
-    })
-    
-    st.dataframe(users_data, use_container_width=True)
+    with span("page.admin.render.users"):
+        st.dataframe(registered_users(), use_container_width=True)
 
 with tab2:
     st.subheader("Gerenciamento de Grupos")
     
     st.write("**Grupos do Azure AD:**")
     
-    # Verificar se há dados de grupos na sessão
-    if st.session_state.get("all_groups_data"):
-        groups_data = st.session_state["all_groups_data"]
-        st.dataframe(groups_data, use_container_width=True)
+    # Índice do diretório compartilhado: busca e filtro feitos no servidor
+    directory = ensure_group_directory(st.session_state.get("access_token"))
+    
+    if directory.is_ready():
+        from group_index import KIND_LABELS
+        index = directory.index()
+        col_search, col_kind = st.columns([3, 1])
+        with col_search:
+            group_search = st.text_input("🔍 Buscar (nome, e-mail ou ID):", key="admin_groups_search")
+        with col_kind:
+            kind_label = st.selectbox("Tipo", ("Todos",) + KIND_LABELS, key="admin_groups_kind")
+        matches = index.search(group_search, None if kind_label == "Todos" else KIND_LABELS.index(kind_label))
+        
+        groups_data = index.frame(matches[:GROUP_TABLE_LIMIT])
+        member_counts = st.session_state.get("group_member_counts")
+        if member_counts is not None:
+            groups_data['Membros'] = groups_data['ID'].map(member_counts)
+        st.caption(f"{len(matches)} de {len(index)} grupos"
+                   + (f" (exibindo os primeiros {GROUP_TABLE_LIMIT})" if len(matches) > GROUP_TABLE_LIMIT else ""))
+        with span("page.admin.render.groups"):
+            st.dataframe(groups_data, use_container_width=True, hide_index=True)
+        if directory.evicted:
+            st.warning(f"⚠️ {directory.last_error}")
     else:
         st.info("Dados dos grupos serão carregados após login completo.")
     
@@ -69,11 +146,55 @@ with tab2:
     
     with col1:
         if st.button("🔄 Sincronizar Grupos"):
-            st.success("Grupos sincronizados com Azure AD")
+            access_token = st.session_state.get("access_token")
+            with st.spinner("Sincronizando grupos e membros com o Azure AD..."):
+                if directory.refresh(access_token):
+                    groups = directory.snapshot()
+                    group_ids = [group.get('id') for group in groups]
+                    # Membros de todos os grupos em lotes /$batch paralelos
+                    members, errors = get_members_bulk(access_token, group_ids, select=['id'])
+                    st.session_state["group_member_counts"] = {
+                        group_id: len(group_members) for group_id, group_members in members.items()
+                    }
+                    audit(ADMIN_ACTION, detail=f"Sincronizar grupos ({len(group_ids)} grupos)")
+                    st.success(f"{len(group_ids)} grupos sincronizados com Azure AD")
+                    if errors:
+                        st.warning(f"⚠️ Não foi possível obter os membros de {len(errors)} grupos.")
+                else:
+                    audit(ADMIN_ACTION, FAILURE, f"Sincronizar grupos: {directory.last_error}")
+                    st.error(f"Erro ao sincronizar grupos: {directory.last_error}")
     
     with col2:
-        if st.button("📋 Exportar Lista"):
-            st.success("Lista exportada com sucesso")
+        export_format = st.selectbox("Formato", list(EXPORT_FORMATS), key="group_export_format")
+        export_clicked = st.button("📋 Exportar Lista")
+    
+    # Exportação página a página para um arquivo em disco (memória constante, com retomada)
+    access_token = st.session_state.get("access_token")
+    tenant_id = st.session_state.get("tenant_id")
+    total_groups = len(directory.index()) if directory.is_ready() else None
+    if export_clicked:
+        st.session_state["group_export"] = run_group_export(
+            GroupExport.start(export_format, tenant_id), access_token, total_groups)
+    
+    for checkpoint_path, state in pending_exports(tenant_id):
+        name = os.path.basename(checkpoint_path)
+        col_info, col_resume, col_discard = st.columns([3, 1, 1])
+        with col_info:
+            st.caption(f"⏸️ Exportação interrompida ({state['format']}): {state['groups']} grupos, "
+                       f"{state['rows']} linhas")
+        with col_resume:
+            if st.button("▶️ Retomar", key=f"resume_{name}"):
+                st.session_state["group_export"] = run_group_export(
+                    GroupExport.resume(checkpoint_path, tenant_id), access_token, total_groups)
+        with col_discard:
+            if st.button("🗑️ Descartar", key=f"discard_{name}"):
+                discard_export(checkpoint_path)
+                st.rerun()
+    
+    group_export = st.session_state.get("group_export")
+    if group_export and os.path.exists(group_export):
+        with open(group_export, 'rb') as export_file:
+            st.download_button("💾 Salvar Exportação", export_file, file_name=os.path.basename(group_export))
 
 with tab3:
     st.subheader("Configurações do Sistema")
@@ -92,31 +213,95 @@ with tab3:
         st.number_input("Timeout de sessão (min)", min_value=5, max_value=120, value=30)
     
     if st.button("💾 Salvar Configurações"):
+        audit(ADMIN_ACTION, detail="Salvar configurações")
         st.success("Configurações salvas com sucesso!")
+    
+    with st.expander("📈 Métricas do Microsoft Graph"):
+        st.json(get_throttle_metrics())
+        st.write("**Diretório de grupos compartilhado:**")
+        st.json(directory.stats())
 
 with tab4:
     st.subheader("Logs do Sistema")
     
-    st.write("**Logs Recentes:**")
+    audit_log = get_audit_log()
+    if audit_log is None:
+        st.info("Log de auditoria desativado (seção [audit] do secrets.toml).")
+    else:
+        # Filtros por período (índice por horário), usuário e ação, aplicados no SQLite;
+        # cada admin vê apenas os eventos do próprio tenant
+        audit_tenant = st.session_state.get("tenant_id")
+        today = datetime.date.today()
+        col_range, col_user, col_action = st.columns(3)
+        with col_range:
+            days = st.date_input("Período", (today - datetime.timedelta(days=7), today), key="audit_range")
+        with col_user:
+            user_filter = st.text_input("Usuário contém:", key="audit_user")
+        with col_action:
+            actions = st.multiselect("Ações", ACTIONS, key="audit_actions")
+        # Durante a seleção do período o widget devolve só a data inicial
+        days = days if isinstance(days, (tuple, list)) else (days,)
+        start, end = date_window(days[0], days[-1] if len(days) > 1 else days[0])
+        rows = audit_log.store.query(start, end, user_filter, actions, limit=AUDIT_TABLE_LIMIT,
+                                     tenant=audit_tenant)
+        
+        st.write("**Logs Recentes:**")
+        pending = audit_log.stats()['queued']
+        st.caption(f"{len(rows)} eventos" + (f" (exibindo os {AUDIT_TABLE_LIMIT} mais recentes)"
+                                             if len(rows) >= AUDIT_TABLE_LIMIT else "")
+                   + (f"; {pending} ainda na fila de gravação" if pending else ""))
+        with span("page.admin.render.logs"):
+            st.dataframe(audit_frame(rows), use_container_width=True, hide_index=True)
+        
+        if st.button("📥 Baixar Logs Completos"):
+            audit(ADMIN_ACTION, detail="Exportar logs de auditoria")
+            # Incluir os eventos ainda na fila antes de ler o período
+            audit_log.flush()
+            previous = st.session_state.pop("audit_export", None)
+            if previous and os.path.exists(previous):
+                os.remove(previous)
+            st.session_state["audit_export"] = export_audit_csv(audit_log.store, start, end, user_filter, actions,
+                                                             audit_tenant)
+        export_path = st.session_state.get("audit_export")
+        if export_path and os.path.exists(export_path):
+            with open(export_path, 'rb') as export_file:
+                st.download_button("💾 Salvar CSV", export_file, file_name="audit_log.csv", mime="text/csv")
+
+with tab5:
+    st.subheader("Performance")
     
-    # Logs fictícios
-    import datetime
+    def operations_table(snapshot):
+        return [
+            {
+                'Operação': name,
+                'Chamadas': summary['count'],
+                'Média (ms)': round(summary['mean_ms'], 2),
+                'p50 (ms)': round(summary['p50_ms'], 2),
+                'p95 (ms)': round(summary['p95_ms'], 2),
+                'p99 (ms)': round(summary['p99_ms'], 2)
+            }
+            for name, summary in snapshot['operations'].items()
+        ]
     
-    logs_data = pd.DataFrame({
-        'Timestamp': [
-            datetime.datetime.now() - datetime.timedelta(minutes=5),
-            datetime.datetime.now() - datetime.timedelta(minutes=15),
-            datetime.datetime.now() - datetime.timedelta(hours=1),
-        ],
-        'Usuário': ['joao@empresa.com', 'maria@empresa.com', 'pedro@empresa.com'],
-        'Ação': ['Login', 'Acesso Relatórios', 'Logout'],
-        'Status': ['Sucesso', 'Sucesso', 'Sucesso']
-    })
+    st.write("**Processo (todas as sessões):**")
+    process_snapshot = process_metrics.snapshot()
+    if process_snapshot['operations']:
+        st.dataframe(operations_table(process_snapshot), use_container_width=True)
+    else:
+        st.info("Nenhuma operação registrada ainda.")
     
-    st.dataframe(logs_data, use_container_width=True)
+    st.write("**Esta sessão:**")
+    current_session = session_metrics()
+    if current_session is not None and current_session.snapshot()['operations']:
+        st.dataframe(operations_table(current_session.snapshot()), use_container_width=True)
     
-    if st.button("📥 Baixar Logs Completos"):
-        st.success("Logs baixados com sucesso!")
+    col1, col2 = st.columns(2)
+    with col1:
+        st.download_button("📥 Exportar Prometheus", export_prometheus(),
+                           file_name="metrics.prom", mime="text/plain")
+    with col2:
+        st.download_button("📥 Exportar JSON", export_json(),
+                           file_name="metrics.json", mime="application/json")
 
 st.divider()
 st.warning("⚠️ Esta é uma área sensível do sistema. Todas as ações são registradas em log.")
@@ -0,0 +1,333 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import streamlit as st
+
+from instrumentation import register_collector
+
+# Colunas esperadas nos arquivos de vendas
+DATE_COLUMN = 'date'
+DIMENSIONS = ('product', 'department')
+MEASURES = ('amount', 'profit', 'quantity')
+# Chaves dos rollups pré-calculados (mês no formato AAAA-MM)
+ROLLUP_KEYS = ('month',) + DIMENSIONS
+# Extensões lidas: Parquet e Arrow IPC (ambos mapeados em memória)
+DATA_EXTENSIONS = ('.parquet', '.arrow', '.feather')
+# Intervalo mínimo (segundos) entre verificações de arquivos novos ou alterados
+REFRESH_INTERVAL = 60
+# Resultados memorizados por (escopo, tipo de relatório, filtros)
+MAX_CACHED_RESULTS = 256
+# Linhas por lote lidas dos arquivos Parquet
+READ_BATCH_ROWS = 256 * 1024
+
+# NumPy, pandas e pyarrow são importados dentro das funções que os usam: sem
+# arquivos de vendas, as páginas de relatório não pagam o tempo de carregá-los
+
+ALL_DEPARTMENTS = None
+
+
+class ReportConfig:
+    """Configuração dos relatórios (seção [reports] opcional em secrets.toml)"""
+
+    def __init__(self):
+        try:
+            settings = st.secrets.get("reports", {})
+        except FileNotFoundError:
+            settings = {}
+        self.PATH = settings.get("path", os.path.join("data", "sales"))
+        self.REFRESH_INTERVAL = int(settings.get("refresh_interval", REFRESH_INTERVAL))
+        # Departamentos visíveis para cada gerente: {email: [departamentos]}
+        self.MANAGER_DEPARTMENTS = {
+            email.lower(): tuple(departments)
+            for email, departments in dict(settings.get("manager_departments", {})).items()
+        }
+
+
+def report_scope(role, user_email, config=None):
+    """Departamentos que o papel enxerga: ALL_DEPARTMENTS (admin), os do gerente ou nenhum"""
+    if role == "admin":
+        return ALL_DEPARTMENTS
+    if role == "manager":
+        config = config or get_report_config()
+        return tuple(sorted(config.MANAGER_DEPARTMENTS.get((user_email or '').lower(), ())))
+    return ()
+
+
+def _record_batches(path):
+    """Lotes das colunas usadas, lidos sob demanda de um arquivo mapeado em memória"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    columns = [DATE_COLUMN, *DIMENSIONS, *MEASURES]
+    if path.endswith('.parquet'):
+        parquet = pq.ParquetFile(path, memory_map=True)
+        yield from parquet.iter_batches(batch_size=READ_BATCH_ROWS, columns=columns)
+        return
+    with pa.memory_map(path) as source:
+        reader = pa.ipc.open_file(source)
+        for position in range(reader.num_record_batches):
+            yield reader.get_batch(position).select(columns)
+
+
+def _aggregate_batch(batch):
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    dates = batch.column(DATE_COLUMN)
+    # Mês como inteiro (ano * 100 + mês): agrupar números é bem mais barato que formatar datas
+    month = pc.add(pc.multiply(pc.year(dates), 100), pc.month(dates))
+    table = pa.table({
+        'month': month,
+        **{name: batch.column(name) for name in DIMENSIONS},
+        **{name: batch.column(name) for name in MEASURES},
+    })
+    grouped = table.group_by(list(ROLLUP_KEYS)).aggregate(
+        [(name, 'sum') for name in MEASURES] + [(MEASURES[0], 'count')])
+    frame = grouped.to_pandas()
+    frame['month'] = [f'{value // 100:04d}-{value % 100:02d}' for value in frame['month']]
+    return frame.rename(columns={f'{name}_sum': name for name in MEASURES} | {f'{MEASURES[0]}_count': 'rows'})
+
+
+def _combine(frames):
+    """Somar rollups parciais (de lotes ou de arquivos) nas mesmas chaves"""
+    import numpy as np
+    import pandas as pd
+    frames = [frame for frame in frames if len(frame)]
+    if not frames:
+        return pd.DataFrame({**{key: pd.Categorical([]) for key in ROLLUP_KEYS},
+                             **{name: np.zeros(0) for name in (*MEASURES, 'rows')}})
+    combined = pd.concat(frames, ignore_index=True)
+    for key in ROLLUP_KEYS:
+        combined[key] = combined[key].astype(str)
+    rollup = combined.groupby(list(ROLLUP_KEYS), sort=True, observed=True).sum().reset_index()
+    # Chaves categóricas: filtros por departamento/mês viram comparações de códigos
+    for key in ROLLUP_KEYS:
+        rollup[key] = rollup[key].astype('category')
+    return rollup
+
+
+def aggregate_file(path):
+    """Rollup (mês, produto, departamento) de um arquivo, lendo um lote por vez"""
+    return _combine(_aggregate_batch(batch) for batch in _record_batches(path))
+
+
+class ReportEngine:
+    """Rollups de vendas pré-calculados a partir de arquivos colunares locais
+
+    Cada arquivo de `path` é agregado uma vez por (mês, produto,
+    departamento), lendo só as colunas usadas, um lote por vez. O rollup
+    total soma os parciais por arquivo; quando arquivos chegam, mudam ou
+    somem, só eles são relidos. Os relatórios filtram o rollup (milhares de
+    linhas, não milhões) com máscaras vetorizadas e ficam memorizados por
+    (versão, escopo, relatório, filtros).
+    """
+
+    def __init__(self, path, refresh_interval=REFRESH_INTERVAL, max_results=MAX_CACHED_RESULTS):
+        self.path = path
+        self.refresh_interval = refresh_interval
+        self.max_results = max_results
+        self._signatures = {}
+        self._partials = {}
+        # Nenhum rollup até o primeiro arquivo ser lido
+        self._rollup = None
+        self._results = OrderedDict()
+        self._checked_at = None
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self.version = 0
+        self.last_error = None
+        self._counters = {'refreshes': 0, 'files_read': 0, 'hits': 0, 'misses': 0}
+
+    def _scan(self):
+        if not os.path.isdir(self.path):
+            return {}
+        files = {}
+        for entry in os.scandir(self.path):
+            if entry.is_file() and entry.name.endswith(DATA_EXTENSIONS):
+                stat = entry.stat()
+                files[entry.path] = (stat.st_mtime_ns, stat.st_size)
+        return files
+
+    def refresh(self):
+        """Reler apenas os arquivos novos ou alterados; retorna True se os rollups mudaram"""
+        with self._refresh_lock:
+            files = self._scan()
+            changed = sorted(path for path, signature in files.items() if self._signatures.get(path) != signature)
+            removed = [path for path in self._signatures if path not in files]
+            self._checked_at = time.monotonic()
+            if not changed and not removed:
+                return False
+            import pyarrow as pa
+            partials = dict(self._partials)
+            signatures = dict(self._signatures)
+            for path in removed:
+                partials.pop(path, None)
+                signatures.pop(path, None)
+            errors = []
+            for path in changed:
+                try:
+                    partials[path] = aggregate_file(path)
+                except (OSError, pa.ArrowException, KeyError) as error:
+                    # Arquivo ainda sendo gravado ou fora do esquema: tentar na próxima verificação
+                    errors.append(f"{os.path.basename(path)}: {error}")
+                    continue
+                signatures[path] = files[path]
+                self._counters['files_read'] += 1
+            rollup = _combine(partials.values())
+            with self._lock:
+                self._partials = partials
+                self._signatures = signatures
+                self._rollup = rollup
+                self._results.clear()
+                self.version += 1
+                self.last_error = "; ".join(errors) or None
+                self._counters['refreshes'] += 1
+            return True
+
+    def ensure_fresh(self):
+        """Carregar na primeira chamada; depois, verificar arquivos novos em segundo plano"""
+        if self._checked_at is None:
+            self.refresh()
+        elif time.monotonic() - self._checked_at > self.refresh_interval and not self._refresh_lock.locked():
+            threading.Thread(target=self.refresh, daemon=True, name="report-refresh").start()
+
+    def has_data(self):
+        rollup = self._rollup
+        return rollup is not None and len(rollup) > 0
+
+    def months(self):
+        return sorted(self._rollup['month'].unique().tolist())
+
+    def departments(self, scope=ALL_DEPARTMENTS):
+        available = sorted(self._rollup['department'].unique().tolist())
+        return available if scope is ALL_DEPARTMENTS else [d for d in available if d in scope]
+
+    def _filtered(self, rollup, scope, months, departments):
+        import numpy as np
+        mask = np.ones(len(rollup), dtype=bool)
+        if scope is not ALL_DEPARTMENTS:
+            mask &= rollup['department'].isin(scope).to_numpy()
+        if departments:
+            mask &= rollup['department'].isin(departments).to_numpy()
+        if months:
+            month = rollup['month'].astype(str).to_numpy()
+            mask &= (month >= months[0]) & (month <= months[1])
+        return rollup[mask]
+
+    def report(self, kind, scope=ALL_DEPARTMENTS, months=None, departments=None):
+        """Relatório `kind` ('monthly', 'by_product', 'by_department' ou 'totals') memorizado
+
+        `scope` vem de report_scope; `months` é (primeiro, último) em AAAA-MM;
+        `departments` restringe ainda mais dentro do escopo. O resultado é
+        compartilhado entre sessões: não alterar.
+        """
+        key = (kind, scope, tuple(months) if months else None, tuple(sorted(departments or ())))
+        with self._lock:
+            result = self._results.get(key)
+            if result is not None:
+                self._results.move_to_end(key)
+                self._counters['hits'] += 1
+                return result
+            rollup = self._rollup
+            version = self.version
+            self._counters['misses'] += 1
+
+        rows = self._filtered(rollup, scope, months, departments)
+        result = REPORTS[kind](rows)
+
+        with self._lock:
+            if version == self.version:
+                self._results[key] = result
+                while len(self._results) > self.max_results:
+                    self._results.popitem(last=False)
+        return result
+
+    def stats(self):
+        with self._lock:
+            rows = len(self._rollup) if self._rollup is not None else 0
+            return {
+                'files': len(self._partials),
+                'rollup_rows': rows,
+                'source_rows': int(self._rollup['rows'].sum()) if rows else 0,
+                'cached_results': len(self._results),
+                'version': self.version,
+                **self._counters
+            }
+
+
+def _sum_by(rows, key, label):
+    grouped = rows.groupby(key, observed=True)[list(MEASURES)].sum()
+    grouped.index = grouped.index.astype(str)
+    grouped.index.name = label
+    return grouped
+
+
+def monthly_report(rows):
+    """Vendas e lucro por mês (índice 'Mês'), para gráficos"""
+    grouped = _sum_by(rows, 'month', 'Mês')
+    return grouped.rename(columns={'amount': 'Vendas', 'profit': 'Lucro', 'quantity': 'Quantidade'})
+
+
+def _with_margin(grouped):
+    import numpy as np
+    table = grouped.rename(columns={'amount': 'Vendas', 'profit': 'Lucro', 'quantity': 'Quantidade'})
+    sales = table['Vendas'].to_numpy(dtype=float)
+    table['Margem (%)'] = np.round(np.divide(table['Lucro'].to_numpy(dtype=float) * 100, sales,
+                                             out=np.zeros_like(sales), where=sales != 0), 1)
+    return table.reset_index()
+
+
+def product_report(rows):
+    return _with_margin(_sum_by(rows, 'product', 'Produto'))
+
+
+def department_report(rows):
+    return _with_margin(_sum_by(rows, 'department', 'Departamento'))
+
+
+def totals_report(rows):
+    """Totais do período e do último mês contra o anterior (para st.metric)"""
+    monthly = _sum_by(rows, 'month', 'Mês')
+    totals = {name: float(monthly[name].sum()) for name in MEASURES}
+    totals['products'] = int(rows['product'].nunique())
+    totals['months'] = len(monthly)
+    if len(monthly) >= 2:
+        last, previous = monthly.iloc[-1], monthly.iloc[-2]
+        totals['growth'] = {name: (float(last[name] / previous[name] - 1) * 100 if previous[name] else None)
+                            for name in MEASURES}
+    else:
+        totals['growth'] = {name: None for name in MEASURES}
+    return totals
+
+
+REPORTS = {
+    'monthly': monthly_report,
+    'by_product': product_report,
+    'by_department': department_report,
+    'totals': totals_report,
+}
+
+
+_engine_lock = threading.Lock()
+_engine = None
+_report_config = None
+
+
+def get_report_config():
+    global _report_config
+    if _report_config is None:
+        _report_config = ReportConfig()
+    return _report_config
+
+
+def get_report_engine():
+    """Obter o motor de relatórios do processo (arquivos verificados a cada REFRESH_INTERVAL)"""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                config = get_report_config()
+                _engine = ReportEngine(config.PATH, config.REFRESH_INTERVAL)
+                register_collector('reports', _engine.stats)
+    _engine.ensure_fresh()
+    return _engine
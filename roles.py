@@ -0,0 +1,152 @@
+import re
+import threading
+
+import streamlit as st
+
+# Mapeamento declarativo de papéis: grupos (por ID ou trecho do nome), emails e páginas.
+# Pode ser sobrescrito pela seção [roles.<papel>] de secrets.toml.
+# A ordem define a prioridade quando um mesmo grupo casa com mais de um papel.
+ROLE_CONFIG = {
+    'admin': {
+        'group_ids': [],
+        'name_patterns': ['admin', 'administrador', 'administrator'],
+        # Lista de emails de administradores (fallback)
+        'emails': [
+            "@outlook.com",  # Substitua pelo seu email real
+            "admin@example.com"
+        ],
+        'pages': ['dashboard', 'users', 'reports', 'settings']
+    },
+    'manager': {
+        'group_ids': [],
+        'name_patterns': ['manager', 'gerente', 'gestor'],
+        'emails': [],
+        'pages': ['dashboard', 'reports']
+    },
+    'user': {
+        'group_ids': [],
+        'name_patterns': ['user', 'usuario', 'usuário'],
+        'emails': [],
+        'pages': ['dashboard']
+    }
+}
+
+# Papel e páginas atribuídos quando nenhuma regra se aplica
+DEFAULT_ROLE = 'user'
+DEFAULT_PAGES = ['dashboard']
+
+# Limite de nomes de grupo memorizados no índice
+MAX_MEMOIZED_NAMES = 100000
+
+
+class RoleIndex:
+    """Índice de papéis compilado uma única vez a partir de ROLE_CONFIG
+
+    IDs de grupo e emails são resolvidos por dicionário (O(1)); nomes de grupo
+    passam por uma única regex combinada, com o resultado memorizado por nome.
+    """
+
+    def __init__(self, config):
+        self.roles = list(config)
+        self.priority = {role: position for position, role in enumerate(self.roles)}
+        self.pages = {role: list(rule.get('pages', [])) for role, rule in config.items()}
+        self.group_roles = {}
+        self.email_roles = {}
+        alternatives = []
+        for role, rule in reversed(list(config.items())):
+            # Percorrer de trás para frente faz o papel de maior prioridade prevalecer
+            for group_id in rule.get('group_ids', []):
+                self.group_roles[group_id] = role
+            for email in rule.get('emails', []):
+                self.email_roles[email.lower()] = role
+        for role, rule in config.items():
+            patterns = '|'.join(re.escape(p.lower()) for p in rule.get('name_patterns', []))
+            if patterns:
+                alternatives.append(f'(?P<{role}>{patterns})')
+        self.name_regex = re.compile('|'.join(alternatives)) if alternatives else None
+        self._name_roles = {}
+
+    def role_for_email(self, email):
+        return self.email_roles.get((email or '').lower())
+
+    def role_for_name(self, display_name):
+        """Papel de maior prioridade cujo padrão aparece no nome do grupo"""
+        if display_name in self._name_roles:
+            return self._name_roles[display_name]
+        role = None
+        if self.name_regex is not None:
+            for match in self.name_regex.finditer(display_name.lower()):
+                matched = match.lastgroup
+                if role is None or self.priority[matched] < self.priority[role]:
+                    role = matched
+                    if self.priority[role] == 0:
+                        break
+        if len(self._name_roles) >= MAX_MEMOIZED_NAMES:
+            self._name_roles.clear()
+        self._name_roles[display_name] = role
+        return role
+
+    def role_for_group(self, group):
+        role = self.group_roles.get(group.get('id'))
+        if role is None and group.get('displayName'):
+            role = self.role_for_name(group['displayName'])
+        return role
+
+    def resolve(self, groups, user_email, app_roles=(), inherited_roles=()):
+        """Calcular o dicionário de permissões para os grupos e o email do usuário
+
+        `app_roles` são papéis vindos da claim `roles` do token (app roles);
+        `inherited_roles` são papéis concedidos por grupos que contêm os grupos
+        do usuário (grupos aninhados, ver GroupGraph).
+        """
+        granted = {role for role in (*app_roles, *inherited_roles) if role in self.priority}
+        email_role = self.role_for_email(user_email)
+        if email_role:
+            granted.add(email_role)
+        for group in groups:
+            role = self.role_for_group(group)
+            if role:
+                granted.add(role)
+                if len(granted) == len(self.roles):
+                    break
+
+        permissions = {role: role in granted for role in self.roles}
+        if not granted:
+            permissions[DEFAULT_ROLE] = True
+            permissions['pages_access'] = list(DEFAULT_PAGES)
+            return permissions
+
+        pages_access = []
+        for role in self.roles:
+            if role in granted:
+                for page in self.pages[role]:
+                    if page not in pages_access:
+                        pages_access.append(page)
+        permissions['pages_access'] = pages_access
+        return permissions
+
+
+_index_lock = threading.Lock()
+_role_index = None
+
+
+def load_role_config():
+    """ROLE_CONFIG com as substituições de [roles] em secrets.toml, se houver"""
+    try:
+        overrides = st.secrets.get("roles", {})
+    except FileNotFoundError:
+        overrides = {}
+    config = {role: dict(rule) for role, rule in ROLE_CONFIG.items()}
+    for role, rule in overrides.items():
+        config.setdefault(role, {}).update(dict(rule))
+    return config
+
+
+def get_role_index():
+    """Obter o índice de papéis do processo (compilado na primeira chamada)"""
+    global _role_index
+    if _role_index is None:
+        with _index_lock:
+            if _role_index is None:
+                _role_index = RoleIndex(load_role_config())
+    return _role_index
@@ -0,0 +1,250 @@
+import base64
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import streamlit as st
+import streamlit.components.v1 as components
+from cryptography.fernet import Fernet, InvalidToken
+
+from msal_client import get_config, get_token_cache
+from token_refresh import get_token_scheduler
+
+# Nome do cookie que identifica a sessão no navegador
+COOKIE_NAME = "auth_session"
+# Duração padrão (segundos) e limite de sessões guardadas
+SESSION_TTL = 8 * 3600
+MAX_SESSIONS = 10000
+
+# Chaves de st.session_state persistidas junto com o cache de tokens
+PERSISTED_KEYS = ("tenant_id", "home_account_id", "account_id", "permissions", "user_name", "user_email",
+                  "id_token_claims")
+
+
+class SessionConfig:
+    """Configuração do armazenamento de sessões (seção [session] opcional em secrets.toml)"""
+
+    def __init__(self):
+        try:
+            settings = st.secrets.get("session", {})
+        except FileNotFoundError:
+            settings = {}
+        self.BACKEND = settings.get("backend", "memory")
+        self.PATH = settings.get("path", os.path.join(".streamlit", "sessions.sqlite3"))
+        self.TTL = int(settings.get("ttl", SESSION_TTL))
+        self.MAX_SESSIONS = int(settings.get("max_sessions", MAX_SESSIONS))
+        # Sem chave dedicada, deriva uma do client secret (estável entre reinícios)
+        secret_key = settings.get("secret_key") or get_config().CLIENT_SECRET
+        self.SECRET_KEY = hashlib.sha256(f"session:{secret_key}".encode()).digest()
+        # Chave Fernet (distinta da de assinatura) para cifrar as sessões gravadas em disco
+        self.ENCRYPTION_KEY = base64.urlsafe_b64encode(
+            hashlib.sha256(f"session_store:{secret_key}".encode()).digest())
+
+
+class MemorySessionBackend:
+    """Sessões em memória com expiração e despejo LRU"""
+
+    def __init__(self, max_sessions=MAX_SESSIONS):
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session_id):
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                return None
+            expires_at, data = entry
+            if expires_at < time.time():
+                del self._sessions[session_id]
+                return None
+            self._sessions.move_to_end(session_id)
+            return data
+
+    def set(self, session_id, data, ttl):
+        with self._lock:
+            self._sessions[session_id] = (time.time() + ttl, data)
+            self._sessions.move_to_end(session_id)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+
+    def delete(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+
+class SQLiteSessionBackend:
+    """Sessões em um arquivo SQLite local (sobrevivem a reinícios do processo)
+
+    Os dados (incluindo os refresh tokens do cache MSAL) são cifrados com
+    Fernet; linhas ilegíveis (adulteradas ou de outra chave) contam como
+    ausentes.
+    """
+
+    def __init__(self, path, encryption_key, max_sessions=MAX_SESSIONS):
+        self.path = path
+        self.max_sessions = max_sessions
+        self._fernet = Fernet(encryption_key)
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=5, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                " id TEXT PRIMARY KEY, data TEXT NOT NULL,"
+                " expires_at REAL NOT NULL, last_access REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS sessions_expires ON sessions (expires_at)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS sessions_access ON sessions (last_access)")
+        # O arquivo guarda refresh tokens: restringir ao usuário do processo
+        os.chmod(path, 0o600)
+
+    def get(self, session_id):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data FROM sessions WHERE id = ? AND expires_at >= ?",
+                (session_id, time.time())
+            ).fetchone()
+        if row is None:
+            return None
+        try:
+            return json.loads(self._fernet.decrypt(row[0].encode()))
+        except (InvalidToken, ValueError):
+            return None
+
+    def set(self, session_id, data, ttl):
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sessions (id, data, expires_at, last_access) VALUES (?, ?, ?, ?)",
+                (session_id, self._fernet.encrypt(json.dumps(data).encode()).decode(), now + ttl, now)
+            )
+            self._conn.execute("DELETE FROM sessions WHERE expires_at < ?", (now,))
+            self._conn.execute(
+                "DELETE FROM sessions WHERE id IN (SELECT id FROM sessions"
+                " ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                (self.max_sessions,)
+            )
+
+    def delete(self, session_id):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+
+
+_store_lock = threading.Lock()
+_store = None
+_session_config = None
+
+
+def get_session_config():
+    global _session_config
+    if _session_config is None:
+        _session_config = SessionConfig()
+    return _session_config
+
+
+def get_session_store():
+    """Obter o backend de sessões configurado (um por processo)"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                config = get_session_config()
+                if config.BACKEND == "sqlite":
+                    _store = SQLiteSessionBackend(config.PATH, config.ENCRYPTION_KEY, config.MAX_SESSIONS)
+                else:
+                    _store = MemorySessionBackend(config.MAX_SESSIONS)
+    return _store
+
+
+def sign(session_id):
+    signature = hmac.new(get_session_config().SECRET_KEY, session_id.encode(), hashlib.sha256).hexdigest()
+    return f"{session_id}.{signature}"
+
+
+def verify(cookie_value):
+    """Retornar o ID da sessão se a assinatura do cookie for válida"""
+    if not cookie_value or "." not in cookie_value:
+        return None
+    session_id, _, _ = cookie_value.partition(".")
+    if hmac.compare_digest(sign(session_id), cookie_value):
+        return session_id
+    return None
+
+
+def set_cookie(value, max_age):
+    """Gravar o cookie no navegador (o Streamlit não envia Set-Cookie próprio)
+
+    Gravado por JavaScript, o cookie não pode ser HttpOnly: scripts da página
+    conseguem lê-lo. Ele só identifica a sessão; os tokens ficam no servidor.
+    """
+    components.html(
+        f"<script>window.parent.document.cookie = "
+        f"'{COOKIE_NAME}={value}; Max-Age={max_age}; Path=/; SameSite=Strict; Secure';</script>",
+        height=0
+    )
+
+
+def persist_session():
+    """Salvar a sessão autenticada atual (permissões e tokens) no backend
+
+    Só grava quando os dados persistidos mudaram desde a última gravação.
+    """
+    data = {key: st.session_state.get(key) for key in PERSISTED_KEYS}
+    session_id = st.session_state.get("session_id")
+    if session_id is not None and st.session_state.get("persisted_session") == data:
+        return
+    if session_id is None:
+        session_id = secrets.token_urlsafe(32)
+        st.session_state["session_id"] = session_id
+        # O cookie é gravado na próxima renderização (após o st.rerun do login)
+        st.session_state["session_cookie_pending"] = sign(session_id)
+    st.session_state["persisted_session"] = json.loads(json.dumps(data))
+    data["token_cache"] = get_token_cache(data["tenant_id"]).export_account(data["home_account_id"])
+    get_session_store().set(session_id, data, get_session_config().TTL)
+
+
+def flush_session_cookie():
+    """Gravar o cookie pendente da sessão, se houver"""
+    pending = st.session_state.pop("session_cookie_pending", None)
+    if pending:
+        set_cookie(pending, get_session_config().TTL)
+
+
+def restore_session():
+    """Restaurar a sessão a partir do cookie assinado; retorna True se conseguir"""
+    session_id = verify(st.context.cookies.get(COOKIE_NAME))
+    if session_id is None:
+        return False
+    data = get_session_store().get(session_id)
+    if not data or not data.get("account_id") or data.get("tenant_id") not in get_config().TENANT_IDS:
+        return False
+    get_token_cache(data["tenant_id"]).import_account(data["home_account_id"], data.get("token_cache") or {})
+    access_token = get_token_scheduler().get_token(data["account_id"])
+    if not access_token:
+        # Tokens expirados ou revogados: é preciso autenticar de novo
+        get_session_store().delete(session_id)
+        return False
+    st.session_state["access_token"] = access_token
+    for key in PERSISTED_KEYS:
+        st.session_state[key] = data.get(key)
+    st.session_state["session_id"] = session_id
+    st.session_state["authenticated"] = True
+    return True
+
+
+def destroy_session():
+    """Remover a sessão do backend e expirar o cookie (logout)"""
+    session_id = st.session_state.get("session_id")
+    if session_id:
+        get_session_store().delete(session_id)
+        set_cookie("", 0)
@@ -0,0 +1,189 @@
+import heapq
+import threading
+import time
+
+import streamlit as st
+
+from graph_cache import invalidate_session_cache
+from instrumentation import register_collector
+from msal_client import acquire_token_silent, get_config
+
+# Contas sem nenhuma renderização nesse intervalo (segundos) deixam de ser renovadas
+IDLE_TIMEOUT = 8 * 3600
+# Espera (segundos) antes de tentar de novo uma renovação em segundo plano que falhou
+RETRY_DELAY = 30
+# Validade assumida quando a resposta não informa expires_in
+DEFAULT_EXPIRES_IN = 3600
+
+
+class TokenRefreshScheduler:
+    """Renova os access tokens em segundo plano antes que expirem
+
+    Guarda, por conta (account_id de msal_client.account_key: tenant e
+    home_account_id), o token atual e o instante em que expira.
+    Uma única thread mantém um heap com o próximo instante de renovação de
+    cada conta (expiração menos `window`) e usa o refresh token do cache MSAL
+    do tenant. As renovações são agrupadas por conta: reruns simultâneos
+    da mesma sessão esperam a renovação em voo em vez de repetir a chamada.
+    """
+
+    def __init__(self, window, idle_timeout=IDLE_TIMEOUT):
+        self.window = window
+        self.idle_timeout = idle_timeout
+        self._counters = dict.fromkeys(('cached', 'refreshes', 'background_refreshes', 'coalesced', 'failed'), 0)
+        self._tokens = {}
+        self._last_used = {}
+        self._account_locks = {}
+        self._heap = []
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._thread = None
+
+    def _incr(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    def _account_lock(self, account_id):
+        with self._lock:
+            lock = self._account_locks.get(account_id)
+            if lock is None:
+                lock = self._account_locks[account_id] = threading.Lock()
+            return lock
+
+    def _fresh(self, entry):
+        return entry is not None and entry[1] - time.time() > self.window
+
+    def _fresh_enough(self, entry):
+        return entry is not None and entry[1] - time.time() > RETRY_DELAY
+
+    def _schedule(self, account_id, refresh_at):
+        with self._wakeup:
+            heapq.heappush(self._heap, (refresh_at, account_id))
+            self._wakeup.notify()
+        self._start()
+
+    def track(self, account_id, token_result):
+        """Registrar um token recém-obtido (ex.: resgate do código de autorização)"""
+        if not account_id or not token_result or "access_token" not in token_result:
+            return
+        expires_at = time.time() + int(token_result.get("expires_in") or DEFAULT_EXPIRES_IN)
+        with self._lock:
+            self._tokens[account_id] = (token_result["access_token"], expires_at)
+            self._last_used[account_id] = time.time()
+        self._schedule(account_id, expires_at - self.window)
+
+    def get_token(self, account_id):
+        """Access token válido da conta, renovando na hora só se a janela já passou"""
+        if not account_id:
+            return None
+        with self._lock:
+            entry = self._tokens.get(account_id)
+            self._last_used[account_id] = time.time()
+        if self._fresh(entry):
+            self._incr('cached')
+            return entry[0]
+        return self.refresh(account_id)
+
+    def refresh(self, account_id, background=False):
+        """Renovar o token da conta; chamadas concorrentes compartilham o resultado"""
+        lock = self._account_lock(account_id)
+        with lock:
+            entry = self._tokens.get(account_id)
+            if self._fresh(entry):
+                # Outra thread renovou enquanto esperávamos o lock
+                self._incr('coalesced')
+                return entry[0]
+            result = acquire_token_silent(account_id)
+            if result and int(result.get("expires_in") or 0) <= self.window:
+                # O token em cache no MSAL também está na janela: forçar o refresh token
+                result = acquire_token_silent(account_id, force_refresh=True)
+            if not result or "access_token" not in result:
+                self._incr('failed')
+                if background and self._fresh_enough(entry):
+                    # Token atual ainda vale: tentar de novo mais tarde
+                    self._schedule(account_id, time.time() + RETRY_DELAY)
+                return None
+            self._incr('background_refreshes' if background else 'refreshes')
+            self.track(account_id, result)
+            return result["access_token"]
+
+    def forget(self, account_id):
+        """Parar de renovar a conta (logout ou sessão ociosa)"""
+        with self._lock:
+            self._tokens.pop(account_id, None)
+            self._last_used.pop(account_id, None)
+            self._account_locks.pop(account_id, None)
+
+    def stats(self):
+        with self._lock:
+            return {'accounts': len(self._tokens), 'scheduled': len(self._heap), **self._counters}
+
+    def _start(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True,
+                                                name="token-refresh")
+                self._thread.start()
+
+    def _next_due(self):
+        with self._wakeup:
+            while True:
+                if not self._heap:
+                    self._wakeup.wait()
+                    continue
+                refresh_at, account_id = self._heap[0]
+                delay = refresh_at - time.time()
+                if delay > 0:
+                    self._wakeup.wait(timeout=delay)
+                    continue
+                heapq.heappop(self._heap)
+                return account_id
+
+    def _run(self):
+        while True:
+            account_id = self._next_due()
+            with self._lock:
+                entry = self._tokens.get(account_id)
+                last_used = self._last_used.get(account_id)
+            if entry is None or self._fresh(entry):
+                # Conta removida ou já renovada (entrada duplicada no heap)
+                continue
+            if last_used is None or time.time() - last_used > self.idle_timeout:
+                self.forget(account_id)
+                continue
+            try:
+                self.refresh(account_id, background=True)
+            except Exception:
+                self._incr('failed')
+
+
+_scheduler_lock = threading.Lock()
+_scheduler = None
+
+
+def get_token_scheduler():
+    """Obter o agendador de renovação de tokens do processo"""
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = TokenRefreshScheduler(get_config().REFRESH_WINDOW)
+                register_collector('token_refresh', _scheduler.stats)
+    return _scheduler
+
+
+def sync_session_token():
+    """Atualizar st.session_state["access_token"] com o token vigente da conta
+
+    Chamado a cada rerun; normalmente só lê o token já renovado em segundo plano.
+    Retorna o token (ou o anterior, se a renovação falhar).
+    """
+    access_token = get_token_scheduler().get_token(st.session_state.get("account_id"))
+    if access_token:
+        if access_token != st.session_state.get("access_token"):
+            # Token renovado: respostas antigas do Graph não são mais confiáveis
+            invalidate_session_cache()
+        st.session_state["access_token"] = access_token
+    return st.session_state.get("access_token")
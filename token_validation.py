@@ -0,0 +1,82 @@
+import threading
+from collections import OrderedDict
+
+import jwt
+
+from msal_client import get_config
+
+# Tempo (segundos) que as chaves públicas do Azure AD ficam em cache
+JWKS_LIFESPAN = 3600
+# Tolerância de relógio na verificação de exp/nbf/iat
+CLOCK_SKEW = 60
+
+_jwks_lock = threading.Lock()
+# Um cliente por tenant (LRU, no máximo MAX_TENANTS)
+_jwks_clients = OrderedDict()
+
+
+def get_jwks_client(tenant_id=None):
+    """Cliente JWKS do tenant, com as chaves de assinatura em cache no processo"""
+    config = get_config()
+    tenant_id = tenant_id or config.TENANT_ID
+    with _jwks_lock:
+        client = _jwks_clients.get(tenant_id)
+        if client is None:
+            client = _jwks_clients[tenant_id] = jwt.PyJWKClient(
+                f"{config.authority(tenant_id)}/discovery/v2.0/keys",
+                cache_keys=True,
+                lifespan=JWKS_LIFESPAN
+            )
+            while len(_jwks_clients) > config.MAX_TENANTS:
+                _jwks_clients.popitem(last=False)
+        else:
+            _jwks_clients.move_to_end(tenant_id)
+    return client
+
+
+def validate_id_token(id_token, tenant_id=None):
+    """Validar localmente o ID token (assinatura, emissor, audiência e expiração)
+
+    O emissor precisa ser o tenant do login: um token de outro tenant é
+    recusado. Retorna as claims do token; levanta jwt.InvalidTokenError se
+    for inválido.
+    """
+    config = get_config()
+    tenant_id = tenant_id or config.TENANT_ID
+    signing_key = get_jwks_client(tenant_id).get_signing_key_from_jwt(id_token)
+    return jwt.decode(
+        id_token,
+        signing_key.key,
+        algorithms=["RS256"],
+        audience=config.CLIENT_ID,
+        issuer=f"{config.authority(tenant_id)}/v2.0",
+        leeway=CLOCK_SKEW,
+        options={"require": ["exp", "iat", "iss", "aud", "oid"]}
+    )
+
+
+def has_group_overage(claims):
+    """O token omite os grupos quando o usuário pertence a grupos demais"""
+    return "groups" in (claims.get("_claim_names") or {}) or bool(claims.get("hasgroups"))
+
+
+def user_info_from_claims(claims):
+    """Montar o equivalente de /me a partir das claims do ID token"""
+    return {
+        'id': claims.get('oid'),
+        'displayName': claims.get('name', 'Usuário'),
+        'userPrincipalName': claims.get('upn') or claims.get('preferred_username', '')
+    }
+
+
+def groups_from_claims(claims, directory=None):
+    """Equivalente de /me/memberOf a partir da claim `groups` (IDs de objeto)
+
+    Se o diretório de grupos compartilhado estiver carregado, os nomes são
+    completados a partir dele, sem chamadas ao Graph.
+    """
+    groups = []
+    for group_id in claims.get('groups', []):
+        group = directory.get(group_id) if directory is not None else None
+        groups.append(dict(group) if group else {'id': group_id})
+    return {'value': groups}